@@ -5,6 +5,7 @@ import argparse
 import pickle
 import os
 import shutil
+import sys
 import time
 
 import hpbandster.core.nameserver as hpns
@@ -12,25 +13,68 @@ import hpbandster.core.result as hpres
 from hpbandster.optimizers import BOHB as BOHB
 from hpbandster.core.worker import Worker
 
-import hpolib.benchmarks.rl.cartpole as cartpole
-
-import tensorflow as tf
+import numpy as np
 import ConfigSpace.configuration_space as cs
 import ConfigSpace.read_and_write.json as pcs_out
 
-session_conf = tf.ConfigProto(
-      intra_op_parallelism_threads=1,
-      inter_op_parallelism_threads=1)
-sess = tf.Session(config=session_conf)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from scripts.accounting import UsageMeter, USAGE
+from scripts.resources import ResourceManager
+from scripts.benchmark_pool import BenchmarkPool
+from scripts.spool import SpoolingResultLogger
+
 MOAB_JOBID=4598620
 
 
+def configure_threads(workers_per_node):
+    """ Sizes the BLAS and TensorFlow thread pools to this worker's share of the node.
+
+    Called before TensorFlow and hpolib are imported, so that they pick up the limits. The benchmark creates its
+    sessions internally, without a config, so the default config of TensorFlow sessions is changed.
+    """
+    resource_manager = ResourceManager(workers_per_node=workers_per_node)
+    resource_manager.apply()
+    resource_manager.limit_tf_sessions()
+    return resource_manager.layout
+
+
+def reset_cartpole(b, seed=1):
+    """ Brings a used benchmark back into the state of a fresh CartpoleReduced(rng=seed). """
+    import tensorflow as tf
+    # Drop the graphs of previous evaluations and reseed like the benchmark's constructor does. This mirrors
+    # CartpoleBase.__init__ in hpolib/benchmarks/rl/cartpole.py of HPOlib2@new_benchmarks (see
+    # icml2018requirements.txt); check it again when updating hpolib.
+    tf.reset_default_graph()
+    b.rng = np.random.RandomState(seed)
+    tf.set_random_seed(b.rng.randint(1, 100000))
+    np.random.seed(b.rng.randint(1, 100000))
+
+
 class MyWorker(Worker):
 
+    def __init__(self, *args, resources=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.resources = resources
+        import hpolib.benchmarks.rl.cartpole as cartpole
+        # the benchmark and its configuration space are only set up once per worker
+        self.pool = BenchmarkPool(lambda: cartpole.CartpoleReduced(rng=1), reset=reset_cartpole)
+        self.configspace = self.get_configspace()
+
     def compute(self, config, budget, **kwargs):
-        b = cartpole.CartpoleReduced(rng=1)
-        config = cs.Configuration(b.get_configuration_space(), config)
-        res_val = b.objective_function(configuration=config, budget=int(budget))
+        with self.pool.lease() as (b, setup_time):
+            start = time.time()
+            config = cs.Configuration(self.configspace, config)
+            # one worker per process; a growing rss_mb shows graphs piling up in the reused benchmark
+            with UsageMeter(scope='process') as meter:
+                res_val = b.objective_function(configuration=config, budget=int(budget))
+            compute_time = time.time() - start
+
+        # setup and compute time are reported separately, so that the setup overhead is not
+        # attributed to the evaluation
+        res_val['setup_time'] = setup_time
+        res_val['compute_time'] = compute_time
+        res_val['resources'] = self.resources
+        res_val[USAGE] = meter.usage
 
         return({
             'loss': res_val['function_value'],
@@ -39,6 +83,7 @@ class MyWorker(Worker):
 
     @staticmethod
     def get_configspace():
+        import hpolib.benchmarks.rl.cartpole as cartpole
         return cartpole.CartpoleReduced.get_configuration_space()
 
 
@@ -50,6 +95,12 @@ def main():
                                                    ' the job id of the clusters scheduler.')
     parser.add_argument('--shared_directory', type=str, help='A directory that is accessible for all processes, e.g. a NFS share.')
     parser.add_argument('--interface', type=str, help='Which network interface to use', default="eth1")
+    parser.add_argument('--workers_per_node', type=int, help='Number of worker processes sharing the cores of a node', default=1)
+    parser.add_argument('--spool_directory', type=str, default=None,
+                        help='Directory on a local disk, to which the results are logged first. They are flushed to '
+                             'the shared directory in batches (see scripts/spool.py).')
+    parser.add_argument('--spool_flush_interval', type=float, help='Seconds between two flushes of the spool',
+                        default=30)
 
     args = parser.parse_args()
 
@@ -60,10 +111,11 @@ def main():
 
     # Every process has to lookup the hostname
     host = hpns.nic_name_to_host(args.interface)
+    resources = configure_threads(args.workers_per_node)
 
     if args.worker:
         time.sleep(60)   # short artificial delay to make sure the nameserver is already running
-        w = MyWorker(run_id=args.run_id, host=host)
+        w = MyWorker(run_id=args.run_id, host=host, resources=resources)
         w.load_nameserver_credentials(working_directory=args.shared_directory)
         w.run(background=False)
         exit(0)
@@ -75,11 +127,15 @@ def main():
             pcs_out.write(cs)
         )
 
-    result_logger = hpres.json_result_logger(directory=args.shared_directory, overwrite=True)
+    if args.spool_directory is not None:
+        result_logger = SpoolingResultLogger(args.shared_directory, args.spool_directory, overwrite=True,
+                                             flush_interval=args.spool_flush_interval)
+    else:
+        result_logger = hpres.json_result_logger(directory=args.shared_directory, overwrite=True)
     NS = hpns.NameServer(run_id=args.run_id, host=host, port=0, working_directory=args.shared_directory)
     ns_host, ns_port = NS.start()
 
-    w = MyWorker(run_id=args.run_id, host=host, nameserver=ns_host, nameserver_port=ns_port)
+    w = MyWorker(run_id=args.run_id, host=host, nameserver=ns_host, nameserver_port=ns_port, resources=resources)
     w.run(background=True)
 
     # Run an optimizer
@@ -94,6 +150,8 @@ def main():
                 min_budget=1, max_budget=9
                 )
     res = bohb.run(n_iterations=args.n_iterations, min_n_workers=1)
+    if args.spool_directory is not None:
+        result_logger.close()
 
     # In a cluster environment, you usually want to store the results for later analysis.
     # One option is to simply pickle the Result object
@@ -2,24 +2,48 @@
 # Use the script with the --help flag to receive info on usage.
 
 import os
+import sys
+import json
+import time
 import pickle
 import argparse
 import copy
-
-import numpy as np
+import importlib
+import subprocess
 
 import hpbandster.core.nameserver as hpns
-from hpbandster.optimizers import RandomSearch, BOHB, HyperBand
 import hpbandster.core.result as hpres
 
-from workers.bnn_worker import BNNWorker
-from workers.cartpole_worker import CartpoleReducedWorker as CartpoleWorker
-from workers.paramnet_surrogates import ParamNetSurrogateWorker
-from workers.svm_surrogate import SVMSurrogateWorker
+# make the shared tooling in BOAH/scripts importable (also used by the workers)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+
+from scripts.checkpoint import CheckpointMaster, ResumableResultLogger
+from scripts.curves import CurveMaster, hyperband_budgets
+from scripts.elastic import ElasticMaster
+from scripts.limits import ComputeLimit, LimitedMaster, hyperband_total_budget
+from scripts.optimizers import get_optimizer_class
+from scripts.packing import CostModel, PackingMaster
+from scripts.payloads import PayloadStore
+from scripts.prefilter import PrefilterMaster, SurrogatePrefilter
+from scripts.resources import ResourceManager, limit_tf_sessions
+from scripts.result_store import ResultStore, StoreResultLogger
+from scripts.spool import SpoolingResultLogger
+
+# experiment name -> module and class of its worker. The modules are imported on first use, so that a process only
+# loads the libraries of its own experiment (hpolib, theano, TensorFlow, ...).
+WORKERS = {
+    'bnn': ('workers.bnn_worker', 'BNNWorker'),
+    'cartpole': ('workers.cartpole_worker', 'CartpoleReducedWorker'),
+    'svm_surrogate': ('workers.svm_surrogate', 'SVMSurrogateWorker'),
+    'paramnet_surrogates': ('workers.paramnet_surrogates', 'ParamNetSurrogateWorker'),
+}
 
 def standard_parser_args(parser):
-    parser.add_argument('--exp_name', type=str, required=True, help='Possible choices: bnn, cartpole, svm_surrogate, paramnet_surrogates')
-    parser.add_argument('--opt_method', type=str, default='bohb', help='Possible choices: randomsearch, bohb, hyperband, smac')
+    parser.add_argument('--exp_name', type=str, help='Possible choices: bnn, cartpole, svm_surrogate, paramnet_surrogates')
+    parser.add_argument('--import_report', action='store_true',
+                        help='Print the time and memory it takes to import the worker of every experiment, and exit.')
+    parser.add_argument('--opt_method', type=str, default='bohb', help='Possible choices: randomsearch, bohb, hyperband, asha, smac. '
+                                                                           'asha is BOHB with asynchronous promotions.')
 
     parser.add_argument('--dest_dir', type=str, help='the destination directory. A new subfolder is created for each benchmark/dataset.',
                         default='../opt_results')
@@ -27,66 +51,193 @@ def standard_parser_args(parser):
     parser.add_argument('--min_budget', type=float, help='Minimum budget for Hyperband and BOHB.')
     parser.add_argument('--max_budget', type=float, help='Maximum budget for all methods.')
     parser.add_argument('--eta', type=float, help='Eta value for Hyperband/BOHB.', default=3)
+    # Hard limits for all methods. Without them, the black-box methods get the total budget of num_iterations
+    # Hyperband iterations.
+    parser.add_argument('--max_total_budget', type=float, default=None,
+                        help='Stop once the budgets of all evaluations sum up to this. Running evaluations finish.')
+    parser.add_argument('--max_time', type=float, default=None,
+                        help='Stop after this many seconds. Running evaluations finish.')
+    parser.add_argument('--max_evaluations', type=int, default=None, help='Stop after this many evaluations.')
     # Network / cluster args for HpBandSter-methods
     parser.add_argument('--n_workers', type=int, help='Number of workers to run in parallel.', default=1)
     parser.add_argument('--worker', help='Flag to turn this into a worker process', action='store_true')
     parser.add_argument('--no_worker', help='Flag to turn this into a worker process',
                         dest='worker', action='store_false')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run from the master checkpoint in the working directory.')
+    parser.add_argument('--checkpoint_interval', type=float, default=300,
+                        help='Minimum number of seconds between two checkpoints of the master.')
+    parser.add_argument('--elastic', action='store_true',
+                        help='Start with the first worker instead of waiting for n_workers. Workers may join and leave '
+                             'during the run; their uptime and utilization is stored in workers.json.')
+    parser.add_argument('--cost_aware', action='store_true',
+                        help='Start the jobs expected to take longest first and promote configurations early. The '
+                             'makespan and idle time of every iteration are stored in packing.json.')
+    parser.add_argument('--cost_history', type=str, nargs='*', default=[],
+                        help='Result directories of earlier runs to warm start the cost model of --cost_aware with.')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Fit a random forest on the results and evaluate only the configurations on min_budget it '
+                             'predicts to be best. The skip rate and prediction error are stored in prefilter.json.')
+    parser.add_argument('--prefilter_keep', type=float, default=0.5,
+                        help='Fraction of the configurations on min_budget the prefilter lets through.')
+    parser.add_argument('--prefilter_history', type=str, nargs='*', default=[],
+                        help='Result directories of earlier runs to warm start the model of --prefilter with.')
     parser.add_argument('--nic_name', type=str, default='lo', help='name of the network interface used for communication. Note: default is only for local execution on *nix!')
     parser.add_argument('--run_id', type=str, default=0)
+    parser.add_argument('--workers_per_node', type=int, default=1,
+                        help='Number of worker processes sharing the cores of a node. The BLAS/OpenMP thread pools of '
+                             'each worker are sized to its share of the cores.')
     parser.add_argument('--working_directory', type=str, help='Directory holding live rundata. Should be shared across all nodes for parallel optimization.',
                         default='./tmp/')
+    # Only relevant for BOHB and ASHA, except for --vectorized_sampling
+    parser.add_argument('--max_history', type=int, default=None,
+                        help='Maximum number of results per budget used to fit the BOHB models. Default: all results.')
+    parser.add_argument('--history_subsampling', choices=['recency', 'quality'], default='recency',
+                        help='Which results are dropped beyond max_history: the oldest ones (recency) or the oldest '
+                             'ones that are not among the best (quality).')
+    parser.add_argument('--vectorized_sampling', action='store_true',
+                        help='Score all BOHB candidates for a new configuration at once, and draw random '
+                             'configurations in batches (also for randomsearch and hyperband).')
     # Only relevant for some experiments
     parser.add_argument('--dataset_bnn', choices=['toyfunction', 'bostonhousing', 'proteinstructure'], help='Only for bnn. ', default=None)
     parser.add_argument('--dataset_paramnet_surrogates', choices=['adult', 'higgs', 'letter', 'mnist', 'optdigits', 'poker'],
                         help="Only for paramnet_surrogates. ", default=None)
+    parser.add_argument('--dataset_cache_dir', type=str, default=None,
+                        help='Node-local directory for preprocessed datasets (bnn only). Defaults to a directory in the '
+                             'temporary directory of the node.')
+    parser.add_argument('--learning_curves', action='store_true',
+                        help='Record the learning curve of every evaluation on all lower budgets (paramnet_surrogates '
+                             'only), and skip evaluations an earlier curve covered.')
+    parser.add_argument('--payload_threshold', type=int, default=None,
+                        help='Info fields of a result larger than this many bytes are written to the payloads '
+                             'directory in the working directory, instead of being sent to the master and logged '
+                             'inline. Default: all fields are logged inline.')
+    parser.add_argument('--trace_allocations', type=int, default=0,
+                        help='Number of source lines allocating most memory, that are recorded with the CPU time and '
+                             'memory of every evaluation (see scripts/accounting.py).')
+    parser.add_argument('--trace_gc', action='store_true',
+                        help='Record the garbage collections during every evaluation.')
+    parser.add_argument('--spool_directory', type=str, default=None,
+                        help='Directory on a local disk of the master, to which the results are logged first. They '
+                             'are flushed to dest_dir in batches (see scripts/spool.py).')
+    parser.add_argument('--spool_flush_interval', type=float, default=30,
+                        help='Seconds between two flushes of the spool.')
+    parser.add_argument('--result_db', type=str, default=None,
+                        help='SQLite database the results are added to as well, see scripts/result_store.py. It must '
+                             'be on a local disk of the master.')
     parser.add_argument('--surrogate_path', type=str, help="Path to the pickled surrogate models. If None, HPOlib2 "
                                                            "will automatically download the surrogates to the .hpolib "
                                                            "directory in your home directory.", default=None)
     return parser
 
-def get_optimizer(parsed_args, config_space, **kwargs):
+def get_optimizer(parsed_args, config_space, extensions=(), **kwargs):
     """ Get the right hpbandster-optimizer """
     eta = parsed_args.eta
-    opt = None
-    if parsed_args.opt_method == 'randomsearch':
-        opt = RandomSearch
-    if parsed_args.opt_method == 'bohb':
-        opt = BOHB
-    if parsed_args.opt_method == 'hyperband':
-        opt = HyperBand
-    if opt is None:
-        raise ValueError("Unknown method %s" % parsed_args.method)
+    opt = get_optimizer_class(parsed_args.opt_method, extensions)
+    if parsed_args.opt_method in ['bohb', 'asha']:
+        kwargs.update(max_history=parsed_args.max_history,
+                      history_subsampling=parsed_args.history_subsampling,
+                      vectorized_sampling=parsed_args.vectorized_sampling)
+    elif parsed_args.opt_method in ['randomsearch', 'hyperband']:
+        kwargs.update(vectorized_sampling=parsed_args.vectorized_sampling)
     return opt(config_space, eta=eta, **kwargs)
 
-def get_worker(args, host=None):
+def get_worker_class(exp_name):
+    """ Imports the worker class of an experiment """
+    if exp_name not in WORKERS:
+        raise ValueError("{} not a valid experiment name".format(exp_name))
+    module, name = WORKERS[exp_name]
+    start = time.time()
+    worker_class = getattr(importlib.import_module(module), name)
+    print("Imported %s in %.1fs" % (name, time.time() - start))
+    return worker_class
+
+def import_report(exp_names=None):
+    """
+        Import time and peak memory of the worker of every experiment, each measured in a fresh interpreter.
+        The cost of the interpreter itself is reported as 'python'.
+
+        Returns a dict: experiment -> 'seconds', 'max_rss_mb' and 'num_modules', or 'error' if the import failed
+    """
+    # The peak memory is read from /proc, ru_maxrss keeps the peak of the parent process across exec on Linux.
+    code = ("import importlib, json, sys, time; sys.path.insert(0, %r); start = time.time(); "
+            "module = sys.argv[1]; module and importlib.import_module(module); seconds = time.time() - start; "
+            "peak = [l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')]; "
+            "print(json.dumps({'seconds': seconds, 'max_rss_mb': int(peak[0]) / 1024. if peak else None, "
+            "'num_modules': len(sys.modules)}))") % os.path.dirname(os.path.abspath(__file__))
+    report = {}
+    for exp_name in ['python'] + list(exp_names or WORKERS):
+        module = WORKERS[exp_name][0] if exp_name != 'python' else ''
+        proc = subprocess.run([sys.executable, '-c', code, module], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+        if proc.returncode == 0:
+            report[exp_name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        else:
+            report[exp_name] = {'error': (proc.stderr.strip().splitlines() or ['failed'])[-1]}
+    return report
+
+def get_worker(args, host=None, resources=None):
+    # large info fields go to the shared working directory instead of over Pyro
+    payload_store = None
+    if args.payload_threshold is not None:
+        payload_store = PayloadStore(os.path.join(args.working_directory, 'payloads'),
+                                     threshold=args.payload_threshold)
+
+    # The workers are imported here, so that their libraries (theano, TensorFlow, hpolib) are loaded after the
+    # thread pools were sized in run_experiment, and only the one of this experiment.
+    # a pure worker process measures the CPU time of the whole process, the master shares its process
+    usage = {'usage_scope': 'process' if args.worker else 'thread', 'trace_allocations': args.trace_allocations,
+             'trace_gc': args.trace_gc}
+
     exp_name = args.exp_name
+    worker_class = get_worker_class(exp_name)
     if exp_name == 'bnn':
         if not args.dataset_bnn:
             raise ValueError("Specify a dataset for bnn experiment!")
-        worker = BNNWorker(dataset=args.dataset_bnn, measure_test_loss=False, run_id=args.run_id,
-                           max_budget=args.max_budget, host=host)
+        worker = worker_class(dataset=args.dataset_bnn, measure_test_loss=False, run_id=args.run_id,
+                              max_budget=args.max_budget, host=host, resources=resources,
+                              cache_dir=args.dataset_cache_dir, payload_store=payload_store, **usage)
     elif exp_name == 'cartpole':
-        worker = CartpoleWorker(measure_test_loss=False, run_id=args.run_id, host=host)
+        # the benchmark creates its TensorFlow sessions without a config
+        if resources is not None:
+            limit_tf_sessions(resources['threads'])
+        worker = worker_class(measure_test_loss=False, run_id=args.run_id, host=host, resources=resources,
+                              payload_store=payload_store, **usage)
     elif exp_name == 'svm_surrogate':
         # this is a synthetic benchmark, so we will use the run_id to separate the independent runs (JM: what's that supposed to mean?)
-        worker = SVMSurrogateWorker(surrogate_path=args.surrogate_path, measure_test_loss=True, run_id=args.run_id, host=host)
+        worker = worker_class(surrogate_path=args.surrogate_path, measure_test_loss=True, run_id=args.run_id, host=host,
+                              resources=resources, payload_store=payload_store, **usage)
     elif exp_name == 'paramnet_surrogates':
         if not args.dataset_paramnet_surrogates:
             raise ValueError("Specify a dataset for paramnet surrogates experiment!")
-        worker = ParamNetSurrogateWorker(dataset=args.dataset_paramnet_surrogates, surrogate_path=args.surrogate_path,
-                                         measure_test_loss=False, run_id=args.run_id, host=host)
-    else:
-        raise ValueError("{} not a valid experiment name".format(exp_name))
+        curve_budgets = None
+        if args.learning_curves:
+            curve_budgets = hyperband_budgets(*worker_class.budgets[args.dataset_paramnet_surrogates], eta=args.eta)
+        worker = worker_class(dataset=args.dataset_paramnet_surrogates, surrogate_path=args.surrogate_path,
+                              measure_test_loss=False, run_id=args.run_id, host=host, resources=resources,
+                              payload_store=payload_store, curve_budgets=curve_budgets, **usage)
     return worker
 
+def store_experiment(args):
+    # name of the experiment in the result store, e.g. paramnet_surrogates/adult
+    dataset = {'bnn': args.dataset_bnn, 'paramnet_surrogates': args.dataset_paramnet_surrogates}.get(args.exp_name)
+    return args.exp_name if dataset is None else '%s/%s' % (args.exp_name, dataset)
+
+
 def run_experiment(args, worker, dest_dir, smac_deterministic, store_all_runs=False):
     print("Running experiment (args: %s)" % str(args))
     # make sure the working and dest directory exist
     os.makedirs(args.working_directory, exist_ok=True)
     os.makedirs(dest_dir, exist_ok=True)
 
-    if args.opt_method in ['randomsearch', 'bohb', 'hyperband']:
+    # size the BLAS/OpenMP thread pools to this process' share of the node, before the benchmarks are imported
+    resources = ResourceManager(workers_per_node=args.workers_per_node).apply()
+    print("Thread layout: %s" % str(resources))
+
+    compute_limit = ComputeLimit(max_total_budget=args.max_total_budget, max_time=args.max_time,
+                                 max_evaluations=args.max_evaluations)
+
+    if args.opt_method in ['randomsearch', 'bohb', 'hyperband', 'asha']:
         print("Using hpbandster-optimizer (%s)" % args.opt_method)
         # Every process has to lookup the hostname
         host = hpns.nic_name_to_host(args.nic_name)
@@ -103,14 +254,14 @@ def run_experiment(args, worker, dest_dir, smac_deterministic, store_all_runs=Fa
 
         if args.worker:
             print("This is a pure worker-thread.")
-            worker = get_worker(args, host=host)
+            worker = get_worker(args, host=host, resources=resources)
             worker.load_nameserver_credentials(working_directory=args.working_directory)
             worker.run(background=False)
             print("Exiting...")
             exit(0)
 
         print("This is the name-server thread, however there will be a worker running in the background.")
-        worker = get_worker(args, host=host)
+        worker = get_worker(args, host=host, resources=resources)
 
         # start worker in the background
         worker.load_nameserver_credentials(working_directory=args.working_directory)
@@ -125,11 +276,53 @@ def run_experiment(args, worker, dest_dir, smac_deterministic, store_all_runs=Fa
               "(with dest_dir %s)" % dest_dir)
         configspace = worker.configspace
 
-        result_logger = hpres.json_result_logger(directory=dest_dir, overwrite=True)
+        # when resuming, the results logged so far are kept
+        logger_classes = []
+        logger_kwargs = {'overwrite': True, 'resume': args.resume}
+        if args.result_db:
+            logger_classes.append(StoreResultLogger)
+            logger_kwargs.update(store=ResultStore(args.result_db), experiment=store_experiment(args),
+                                 optimizer=args.opt_method, run_id=args.run_id)
+        if args.spool_directory:
+            logger_classes.append(SpoolingResultLogger)
+            logger_kwargs.update(spool_directory=args.spool_directory, flush_interval=args.spool_flush_interval)
+        if len(logger_classes) > 1:
+            logger_class = type('SpoolingStoreResultLogger', tuple(logger_classes), {})
+        else:
+            logger_class = logger_classes[0] if logger_classes else ResumableResultLogger
+        result_logger = logger_class(dest_dir, **logger_kwargs)
 
         print("Getting optimizer.")
 
-        opt = get_optimizer(args, configspace, working_directory=args.working_directory,
+        # the master writes checkpoints to the working directory, so a preempted run can be resumed
+        extensions = [CheckpointMaster]
+        master_kwargs = {'checkpoint_interval': args.checkpoint_interval, 'resume': args.resume}
+        if args.elastic:
+            extensions.append(ElasticMaster)
+            master_kwargs['worker_log'] = os.path.join(dest_dir, 'workers.json')
+        if args.prefilter:
+            # before the PackingMaster, so the prefilter samples for its iterations
+            prefilter = SurrogatePrefilter(configspace, keep=args.prefilter_keep)
+            for directory in args.prefilter_history:
+                print("Read %i results from %s" % (prefilter.load_results(directory), directory))
+            extensions.append(PrefilterMaster)
+            master_kwargs['prefilter'] = prefilter
+            master_kwargs['prefilter_report'] = os.path.join(dest_dir, 'prefilter.json')
+        if args.cost_aware:
+            cost_model = CostModel(configspace)
+            for directory in args.cost_history:
+                print("Read %i costs from %s" % (cost_model.load_results(directory), directory))
+            extensions.append(PackingMaster)
+            master_kwargs['cost_model'] = cost_model
+            master_kwargs['packing_report'] = os.path.join(dest_dir, 'packing.json')
+        if args.learning_curves:
+            extensions.append(CurveMaster)
+        if compute_limit:
+            # after the CheckpointMaster, so the final checkpoint has the results of the last evaluations
+            extensions.append(LimitedMaster)
+            master_kwargs['compute_limit'] = compute_limit
+
+        opt = get_optimizer(args, configspace, extensions=extensions, working_directory=args.working_directory,
                             run_id=args.run_id,
                             min_budget=args.min_budget, max_budget=args.max_budget,
                             host=host,
@@ -137,6 +330,7 @@ def run_experiment(args, worker, dest_dir, smac_deterministic, store_all_runs=Fa
                             nameserver_port = ns_port,
                             ping_interval=30,
                             result_logger=result_logger,
+                            **master_kwargs
                            )
 
         print("Initialization successful, starting optimization.")
@@ -146,6 +340,8 @@ def run_experiment(args, worker, dest_dir, smac_deterministic, store_all_runs=Fa
             fh.write(pcs_new.write(opt.config_generator.configspace))
 
         result = opt.run(n_iterations=args.num_iterations, min_n_workers=args.n_workers)
+        if args.spool_directory:
+            result_logger.close()
 
         print("Finished optimization")
         # shutdown the worker and the dispatcher
@@ -156,17 +352,24 @@ def run_experiment(args, worker, dest_dir, smac_deterministic, store_all_runs=Fa
         # This if block is necessary to set budgets for paramnet_surrogates - for nothing else
         args_tmp = copy.deepcopy(args)
         args_tmp.opt_method = 'bohb'
-        worker = get_worker(args_tmp)
+        worker = get_worker(args_tmp, resources=resources)
         args.min_budget, args.max_budget = worker.budgets[args.dataset_paramnet_surrogates]
 
-    # the number of iterations for the blackbox optimizers must be increased so they have comparable total budgets
-    bb_iterations = int(args.num_iterations * (1+(np.log(args.max_budget) - np.log(args.min_budget))/np.log(args.eta)))
+    # Every evaluation of the blackbox optimizers runs on max_budget. Without a budget or evaluation limit, they get
+    # the total budget of num_iterations Hyperband iterations.
+    if compute_limit.max_total_budget is None and compute_limit.max_evaluations is None:
+        compute_limit.max_total_budget = hyperband_total_budget(args.min_budget, args.max_budget, args.eta,
+                                                                args.num_iterations)
+    bb_iterations = compute_limit.num_evaluations(args.max_budget)
 
     #if args.opt_method == 'tpe':
-    #    result = worker.run_tpe(bb_iterations)
+    #    result = worker.run_tpe(bb_iterations, max_time=compute_limit.max_time)
 
     if args.opt_method == 'smac':
-        result = worker.run_smac(bb_iterations, deterministic=smac_deterministic, working_directory=args.dest_dir)
+        result = worker.run_smac(bb_iterations, deterministic=smac_deterministic, working_directory=args.dest_dir,
+                                 max_time=compute_limit.max_time)
+        if args.result_db:
+            ResultStore(args.result_db).import_result(result, store_experiment(args), args.opt_method, args.run_id)
 
     if result is None:
         raise ValueError("Unknown method %s!"%args.method)
@@ -180,6 +383,21 @@ if __name__ == "__main__":
 
     # Parsing args and creating sub-folders for experiments
     args = parser.parse_args()
+    if args.import_report:
+        print('{:20s} {:>8s} {:>11s} {:>8s}'.format('experiment', 'seconds', 'max_rss_mb', 'modules'))
+        for exp_name, entry in import_report().items():
+            if 'error' in entry:
+                print('{:20s} {}'.format(exp_name, entry['error']))
+            else:
+                print('{:20s} {:8.2f} {:>11s} {:8d}'.format(exp_name, entry['seconds'],
+                                                            '%.1f' % entry['max_rss_mb']
+                                                            if entry['max_rss_mb'] is not None else '-',
+                                                            entry['num_modules']))
+        sys.exit(0)
+    if args.exp_name is None:
+        parser.error('--exp_name is required')
+    if args.cost_aware and args.opt_method == 'asha':
+        parser.error('--cost_aware can\'t be combined with the asynchronous promotions of asha')
     args.dest_dir = os.path.join(args.dest_dir, args.exp_name)
     if args.exp_name == 'bnn':
         if args.dataset_bnn is None:
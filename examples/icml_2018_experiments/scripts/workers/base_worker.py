@@ -6,15 +6,38 @@ from hpbandster.workers.hpolibbenchmark import HPOlib2Worker
 from hpbandster.core.base_iteration import Datum
 from hpbandster.core.result import Result
 
+from scripts.accounting import UsageMeter, USAGE
+
 
 class BaseWorker(HPOlib2Worker):
 
-    def __init__(self, max_budget, **kwargs):
+    def __init__(self, max_budget, resources=None, payload_store=None, usage_scope='thread', trace_allocations=0,
+                 trace_gc=False, **kwargs):
         super().__init__(**kwargs)
 
         self.time_ref = time.time()
         self.max_budget=max_budget
         self.run_data = {}
+        # thread layout of this worker (see scripts/resources.py), recorded with every result
+        self.resources = resources
+        # large info fields are written to this store, only their handles are sent to the master (scripts/payloads.py)
+        self.payload_store = payload_store
+        # CPU time and memory of every evaluation, recorded as 'usage' in its info (see scripts/accounting.py)
+        self.usage_scope = usage_scope
+        self.trace_allocations = trace_allocations
+        self.trace_gc = trace_gc
+
+
+    def compute(self, config, budget, **kwargs):
+        # also measures the evaluations of evaluate_and_log for TPE and SMAC
+        with UsageMeter(scope=self.usage_scope, num_allocations=self.trace_allocations,
+                        trace_gc=self.trace_gc) as meter:
+            res = super().compute(config, budget=budget, **kwargs)
+        res['info']['resources'] = self.resources
+        res['info'][USAGE] = meter.usage
+        if self.payload_store is not None:
+            res['info'] = self.payload_store.offload_info(res['info'])
+        return(res)
 
 
     def tpe_configspace(self):
@@ -52,16 +75,21 @@ class BaseWorker(HPOlib2Worker):
     def get_result(self):
 
         # mock minial HB_config to have meaningful output
-        mock_HB_config = {'min_budget': self.max_budget, 'max_budget': self.max_budget, 'time_ref': self.time_ref}
+        mock_HB_config = {'min_budget': self.max_budget, 'max_budget': self.max_budget, 'time_ref': self.time_ref,
+                          'compute': {'total_budget': self.max_budget * len(self.run_data),
+                                      'num_evaluations': len(self.run_data)}}
 
         # get Result by pretending to be a HB-run with one iteration
         res = Result([self.run_data, ], mock_HB_config)
 
         return(res)
 
-    def run_tpe(self, num_iterations):
+    def run_tpe(self, num_iterations, max_time=None):
         """
             Wrapper around TPE to return a HpBandSter Result object to integrate better with the other methods
+
+            TPE stops after num_iterations evaluations, or after the evaluation running max_time seconds after the start
+            (see scripts/limits.py for a matching limit of the HpBandSter methods).
         """
         try:
             from hyperopt import fmin, tpe, hp, STATUS_OK, Trials
@@ -85,14 +113,18 @@ class BaseWorker(HPOlib2Worker):
                 space=space,
                 algo=tpe.suggest,
                 max_evals=num_iterations,
+                timeout=max_time,
                 trials=trials)
         return(self.get_result())
 
 
 
-    def run_smac(self, num_iterations, deterministic=True, working_directory='/tmp'):
+    def run_smac(self, num_iterations, deterministic=True, working_directory='/tmp', max_time=None):
         """
             Wrapper around SMAC to return a HpBandSter Result object to integrate better with the other methods
+
+            SMAC stops after num_iterations evaluations, or after the evaluation running max_time seconds after the
+            start (see scripts/limits.py for a matching limit of the HpBandSter methods).
         """
 
         try:
@@ -125,12 +157,15 @@ class BaseWorker(HPOlib2Worker):
 
             return loss, []
 
-        scenario = Scenario({   "run_obj": "quality",
-                                "runcount-limit": num_iterations,
-                                "cs": self.configspace,
-                                "deterministic": deterministic,
-                                "initial_incumbent": "RANDOM",
-                                "output_dir": working_directory})
+        scenario = {    "run_obj": "quality",
+                        "runcount-limit": num_iterations,
+                        "cs": self.configspace,
+                        "deterministic": deterministic,
+                        "initial_incumbent": "RANDOM",
+                        "output_dir": working_directory}
+        if max_time is not None:
+            scenario["wallclock-limit"] = max_time
+        scenario = Scenario(scenario)
 
 
         smac = SMAC(scenario=scenario, tae_runner=smac_objective)
@@ -1,23 +1,53 @@
+import hpolib
 from hpolib.benchmarks.ml.bnn_benchmark import BNNOnToyFunction, BNNOnBostonHousing, BNNOnProteinStructure, BNNOnYearPrediction
 
+from scripts.dataset_cache import DatasetCache
 from .base_worker import BaseWorker
 
 from hyperopt import fmin, tpe, hp, STATUS_OK, Trials
 
 
+DATA_SPLITS = ('train', 'train_targets', 'valid', 'valid_targets', 'test', 'test_targets')
+
+
+def cached_benchmark(benchmark_class, cache):
+    """
+        Returns a subclass of the given BNN benchmark that loads its (preprocessed) data through the dataset cache.
+
+        The hpolib BNN benchmarks load and preprocess their data in get_data(), which is called by the constructor.
+        With the cache this happens once per node, every further worker attaches to the stored arrays.
+        The entries are keyed by the benchmark, its constructor arguments and the hpolib version, so a changed split
+        or preprocessing in hpolib doesn't reuse stale arrays.
+    """
+    class CachedBenchmark(benchmark_class):
+        def __init__(self, *args, **kwargs):
+            # set before the constructor of the benchmark calls get_data()
+            self.cache_params = {'benchmark': '%s.%s' % (benchmark_class.__module__, benchmark_class.__name__),
+                                 'hpolib_version': getattr(hpolib, '__version__', 'unknown'),
+                                 'args': list(args), 'kwargs': kwargs}
+            super(CachedBenchmark, self).__init__(*args, **kwargs)
+
+        def get_data(self):
+            load = lambda **params: dict(zip(DATA_SPLITS, super(CachedBenchmark, self).get_data()))
+            data = cache.get(benchmark_class.__name__, load, **self.cache_params)
+            return(tuple(data[split] for split in DATA_SPLITS))
+
+    CachedBenchmark.__name__ = benchmark_class.__name__
+    return(CachedBenchmark)
+
+
 class BNNWorker(BaseWorker):
-    def __init__(self, dataset, path=None, **kwargs):
-
-        if dataset == 'toyfunction':
-            b = BNNOnToyFunction()
-        elif dataset == 'bostonhousing':
-            b = BNNOnBostonHousing()
-        elif dataset == 'proteinstructure':
-            b = BNNOnProteinStructure()
-        elif dataset == 'yearprediction':
-            b = BNNOnYearPrediction()
-        else:
+    def __init__(self, dataset, path=None, cache_dir=None, **kwargs):
+
+        benchmarks = {
+            'toyfunction': BNNOnToyFunction,
+            'bostonhousing': BNNOnBostonHousing,
+            'proteinstructure': BNNOnProteinStructure,
+            'yearprediction': BNNOnYearPrediction,
+        }
+        if dataset not in benchmarks:
             raise ValueError('Unknown dataset %s!'%dataset)
+        b = cached_benchmark(benchmarks[dataset], DatasetCache(cache_dir))()
         #cs = b.get_configuration_space()
         #super().__init__(benchmark=b, configspace=cs, **kwargs)
 
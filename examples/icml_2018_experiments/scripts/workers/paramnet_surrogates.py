@@ -15,12 +15,15 @@ class ParamNetSurrogateWorker(BaseWorker):
         'poker'      : (81, 2187),
         }
 
-    def __init__(self, dataset, surrogate_path,*args, sleep=False, **kwargs):
+    def __init__(self, dataset, surrogate_path,*args, sleep=False, curve_budgets=None, **kwargs):
 
         b = surrogate(dataset=dataset,path=surrogate_path)
         cs = surrogate.get_configuration_space()
         super().__init__(benchmark=b, configspace=cs, max_budget=self.budgets[dataset][1], **kwargs)
         self.sleep = sleep
+        # the surrogate predicts the whole learning curve, so the losses on these budgets are returned for free
+        # (see scripts/curves.py)
+        self.curve_budgets = curve_budgets
 
 
     def compute(self, config, budget, **kwargs):
@@ -29,9 +32,15 @@ class ParamNetSurrogateWorker(BaseWorker):
                           config["x3"],    config["x4"], config["x5"]])
         if self.sleep:    time.sleep(budget)
 
+        info = dict(config)
+        info['resources'] = self.resources
+        if self.curve_budgets is not None:
+            info['learning_curve'] = [[float(b), self.benchmark(x, budget=b)]
+                                      for b in self.curve_budgets if b <= budget]
+
         return({
                     'loss': self.benchmark(x, budget=budget),
-                    'info': config
+                    'info': info
                 })
 
 
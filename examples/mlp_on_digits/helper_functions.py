@@ -1,21 +1,28 @@
+import numpy as np
 from sklearn import datasets, neural_network, metrics
 from hpbandster.core.worker import Worker
 
+from scripts.resources import ResourceManager
+from scripts.dataset_cache import DatasetCache
+from scripts.pruning import EarlyStopped, early_stopped_info, get_reporter
+
 # inherit from the hpbandster.core.worker class
 class MyWorker(Worker):
     """ This is a worker for the jupyter-notebook that shows how to connect BOHB to CAVE. """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, workers_per_node=1, cache_dir=None, prune=False, learning_curve=False, **kwargs):
         super(MyWorker, self).__init__(*args, **kwargs)
-        digits = datasets.load_digits()  # load the digits dataset
-        n_samples = len(digits.images)
-        data = digits.images.reshape((n_samples, -1))
-
-        # split it into training and validation set.
-        split = n_samples // 2
-        self.train_x, self.valid_x = data[:split], data[split:]
-        self.train_y, self.valid_y = digits.target[:split], digits.target[split:]
-
-    def compute(self, config, budget, *args, **kwargs):
+        # limit the BLAS threads of the MLP to this worker's share of the cores
+        self.resources = ResourceManager(workers_per_node=workers_per_node).apply()
+        # report the validation loss after every epoch to the pruner of the run (see scripts/pruning.py)
+        self.prune = prune
+        # return the validation loss after every epoch, which the master records for the lower budgets
+        # (see scripts/curves.py)
+        self.learning_curve = learning_curve
+
+        # the split data is shared between all workers of a node
+        (self.train_x, self.train_y), (self.valid_x, self.valid_y) = load_digits(cache_dir=cache_dir)
+
+    def compute(self, config, budget, *args, config_id=None, **kwargs):
         """ overwrite the *compute* methode: the training of the model happens here """
         beta_1 = 0  if 'beta_1' not in config else config['beta_1']
         beta_2 = 0  if 'beta_2' not in config else config['beta_2']
@@ -28,7 +35,23 @@ class MyWorker(Worker):
                                            beta_1=beta_1,
                                            beta_2=beta_2
                                           )
-        clf.fit(self.train_x, self.train_y)
+        report = get_reporter(self, config_id, budget) if self.prune else None
+        curve = []
+        if self.learning_curve:
+            prune_report = report
+
+            def report(loss, epoch):
+                curve.append([float(epoch), loss])
+                if prune_report is not None:
+                    prune_report(loss, epoch)
+        try:
+            fit_mlp(clf, (self.train_x, self.train_y), (self.valid_x, self.valid_y), budget, report)
+        except EarlyStopped as e:
+            # log the partial result as an early-stopped evaluation
+            return ({
+                'loss': e.loss,
+                'info': dict(early_stopped_info(e), resources=self.resources)
+            })
 
         predicted = clf.predict(self.valid_x)
         loss_train = metrics.log_loss(self.train_y, clf.predict_proba(self.train_x))
@@ -37,14 +60,19 @@ class MyWorker(Worker):
         accuracy_train = clf.score(self.train_x, self.train_y)
         accuracy_valid = clf.score(self.valid_x, self.valid_y)
 
+        info = {'loss_train': loss_train,
+                'loss_test': loss_valid,
+                'accuracy_train': accuracy_train,
+                'accuracy_test': accuracy_valid,
+                'resources': self.resources,
+               }
+        if self.learning_curve:
+            info['learning_curve'] = curve
+
         # make sure that the returned dictionary contains the fields *loss* and *info*
         return ({
             'loss': loss_valid,  # this is the a mandatory field to run hyperband
-            'info': {'loss_train': loss_train,
-                     'loss_test': loss_valid,
-                     'accuracy_train': accuracy_train,
-                     'accuracy_test': accuracy_valid,
-                    }  # can be used for any user-defined information - also mandatory
+            'info': info  # can be used for any user-defined information - also mandatory
         })
 
 
@@ -77,7 +105,46 @@ def get_configspace():
     return config_space
 
 
-def optimize_mlp_on_digits(train, valid, budget, **config):
+def fit_mlp(clf, train, valid, budget, report=None):
+    """
+    Trains the MLP for int(budget) epochs
+
+    Args:
+        clf : (neural_network.MLPClassifier)
+            the classifier to train, with max_iter=int(budget)
+        train : (tuple(np.ndarray, npndarray)
+            data and labels for training
+        valid (tuple(np.ndarray, npndarray)
+            data and labels for validation
+        budget : (float)
+            number of epochs
+        report : (callable)
+            if given, the training runs epoch by epoch and report(loss, epoch)
+            is called with the validation loss after every epoch. The training
+            stops with the same criterion as fit(): once the training loss
+            did not improve by tol for n_iter_no_change epochs. Only the
+            shuffling of the mini-batches differs
+
+    Returns:
+        neural_network.MLPClassifier: the trained classifier
+    """
+    train_x, train_y = train
+    valid_x, valid_y = valid
+
+    if report is None:
+        return clf.fit(train_x, train_y)
+
+    classes = np.unique(train_y)
+    for epoch in range(1, int(budget) + 1):
+        clf.partial_fit(train_x, train_y, classes=classes)
+        report(metrics.log_loss(valid_y, clf.predict_proba(valid_x)), epoch)
+        # partial_fit keeps the counter of fit(), but doesn't stop by itself
+        if clf._no_improvement_count > clf.n_iter_no_change:
+            break
+    return clf
+
+
+def optimize_mlp_on_digits(train, valid, budget, report=None, **config):
     """
     Overwrite BOHB'S *compute* method: the training of the model happens here
 
@@ -91,6 +158,9 @@ def optimize_mlp_on_digits(train, valid, budget, **config):
             configuration space
         budget : (float) 
 			budget, which is passed by the BOHB optimizer
+        report : (callable)
+			passed by fmin if pruning is enabled; receives the
+            validation loss after every epoch
 
     Returns:
         float: validation loss
@@ -110,20 +180,40 @@ def optimize_mlp_on_digits(train, valid, budget, **config):
                                        beta_1=beta_1,
                                        beta_2=beta_2
                                        )
-    clf.fit(train_x, train_y, )
+    fit_mlp(clf, train, valid, budget, report)
 
     loss_valid = metrics.log_loss(valid_y, clf.predict_proba(valid_x))
     return loss_valid
 
 
-def load_digits():
+def split_digits(train_fraction=0.5):
+    """ Loads the digits dataset and splits it into training and validation set. """
     digits = datasets.load_digits()  # load the digits dataset
     n_samples = len(digits.images)
     data = digits.images.reshape((n_samples, -1))
 
     # split it into training and validation set.
-    split = n_samples // 2
-    train_x, valid_x = data[:split], data[split:]
-    train_y, valid_y = digits.target[:split], digits.target[split:]
+    split = int(n_samples * train_fraction)
+    return {'train_x': data[:split], 'train_y': digits.target[:split],
+            'valid_x': data[split:], 'valid_y': digits.target[split:]}
+
 
-    return (train_x, train_y), (valid_x, valid_y)
+def load_digits(cache_dir=None):
+    """
+    Returns the split digits data.
+
+    The split is computed once per node and stored in a
+    :class:`scripts.dataset_cache.DatasetCache`, all further calls attach to
+    the cached arrays as read-only memory maps.
+
+    Args:
+        cache_dir : (str)
+            directory of the dataset cache, see
+            :func:`scripts.dataset_cache.default_cache_dir` for the default
+
+    Returns:
+        tuple(tuple(np.ndarray, np.ndarray), tuple(np.ndarray, np.ndarray)):
+            training and validation data with their labels
+    """
+    data = DatasetCache(cache_dir).get('digits', split_digits, train_fraction=0.5)
+    return (data['train_x'], data['train_y']), (data['valid_x'], data['valid_y'])
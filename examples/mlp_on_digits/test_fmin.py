@@ -20,6 +20,7 @@ class TestFMin(unittest.TestCase):
         self.cs.add_hyperparameter(
             CS.CategoricalHyperparameter('w', [0, 1])
         )
+        self.cs.seed(123)
 
     def test_predict(self):
 
@@ -45,6 +46,54 @@ class TestFMin(unittest.TestCase):
         for i in range(len(budgets)):
             self.assertTrue(min_budget <= budgets[i] <= max_budget)
 
+        # Every result records the thread layout of its worker
+        for run in result.get_all_runs():
+            self.assertIn('resources', run.info)
+
+    def test_remote_worker(self):
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        import FMin
+
+        with tempfile.TemporaryDirectory() as working_directory:
+            func_file = os.path.join(working_directory, 'opt_func.py')
+            with open(func_file, 'w') as f:
+                f.write('def opt_func(offset, w, budget):\n'
+                        '    return float(w != 1) + offset / budget\n')
+
+            worker = subprocess.Popen([sys.executable, FMin.__file__,
+                                       '--worker', '--func', func_file,
+                                       '--working_directory',
+                                       working_directory,
+                                       '--run_id', 'remote'],
+                                      stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.DEVNULL)
+            try:
+                # the remote worker loads func_args from the working directory
+                inc_best, inc_best_cfg, result = fmin(
+                    load_func(func_file), self.cs, func_args=(1.,),
+                    min_budget=3,
+                    max_budget=12, num_workers=0, wait_for_remote_workers=1,
+                    working_directory=working_directory, run_id='remote',
+                    output_dir=working_directory)
+                # the remote worker is shut down by the master
+                self.assertEqual(worker.wait(timeout=60), 0)
+            finally:
+                worker.kill()
+
+        self.assertEqual(inc_best_cfg['w'], 1)
+        self.assertGreater(len(result.get_all_runs()), 0)
+
+        # func_args that can't be sent to remote workers
+        with tempfile.TemporaryDirectory() as working_directory:
+            with self.assertRaises(ValueError):
+                fmin(self.opt_func, self.cs, func_args=(lambda: None,),
+                     wait_for_remote_workers=1,
+                     working_directory=working_directory,
+                     output_dir=working_directory)
+
     def test_parse_cmd_args(self):
         import argparse
         from pathlib import Path
@@ -14,19 +14,61 @@ To call it from commandline, you must:
 - make sure to satisfy the conditions described in the docstring of
     :method:: fmin
 
+To let workers on other hosts join a run, start the run with
+``--nic_name``, a shared ``--working_directory`` and
+``--wait_for_remote_workers``, and on every other host::
+
+    python FMin.py --worker --func <path> --working_directory <dir>
+
+The remote workers listen on the address of their hostname, or on the
+interface given with ``--nic_name``. The ``func_args`` of the run are pickled
+to the working directory, from where the remote workers load them.
+
 """
 
 
 import argparse
+import inspect
+import os
+import pickle
+import socket
+import sys
 from pathlib import Path
 
+# FMin is used as a script as well as a module of the ``scripts`` package.
+# Make sure the repository root is importable in both cases.
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
 import hpbandster.core.nameserver as hpns
 import hpbandster.core.result as hpres
-from hpbandster.optimizers import BOHB
 from hpbandster.core.worker import Worker
 
 from ConfigSpace.read_and_write import pcs_new, json
 
+from scripts.accounting import UsageMeter, USAGE
+from scripts.curves import CurveMaster, LEARNING_CURVE
+from scripts.elastic import ElasticMaster
+from scripts.forkserver import ForkServer, func_location
+from scripts.limits import ComputeLimit, LimitedMaster
+from scripts.optimizers import get_optimizer_class
+from scripts.packing import PackingMaster
+from scripts.prefilter import PrefilterMaster, SurrogatePrefilter
+from scripts.result_store import ResultStore, StoreResultLogger
+from scripts.pruning import (RungPruner, PruningMaster, EarlyStopped,
+                             early_stopped_info, get_reporter)
+from scripts.resources import ResourceManager
+from scripts.subsets import DataSubsets, budget_schedule
+
+def func_args_path(working_directory, run_id):
+    """
+    File of the pickled ``func_args`` of the run ``run_id``.
+    """
+    return os.path.join(str(working_directory),
+                        'HPB_run_%s_func_args.pkl' % run_id)
+
+
 class FMinWorker(Worker):
     """
     The worker is responsible for evaluating a single configuration on a
@@ -44,21 +86,104 @@ class FMinWorker(Worker):
         func_args (tuple): arguments, passed to the function by the user,
             e.g., the data (X,y). These arguments don't include optimized
              parameters. Those are defined in the configuration space object.
+        resources (dict, optional): thread layout of this worker, as chosen
+            by :class:`scripts.resources.ResourceManager`. It is recorded in
+            the info of every result.
+        pruner (scripts.pruning.RungPruner, optional): if given, the function
+            receives a ``report(loss, step)`` callback to report intermediate
+            losses, and is stopped early if it can't make the top 1/eta of its
+            rung anymore.
+        lookup_pruner (bool, optional): if True and no ``pruner`` is given,
+            the pruner of the run is looked up at the nameserver for every
+            evaluation. Used by workers in other processes than the master.
+        usage_scope (str, optional): whether the CPU time of an evaluation
+            is measured for the 'thread' of the worker (default) or the whole
+            'process', see :mod:`scripts.accounting`.
+        trace_allocations (int, optional): number of the source lines
+            allocating most memory, that are recorded for every evaluation.
+            Default: 0.
+        trace_gc (bool, optional): record the garbage collections during
+            every evaluation. Default: False.
+        fork_server (scripts.forkserver.ForkServer, optional): if given, the
+            function is evaluated in a forked child of this server, which
+            has loaded ``func`` and ``func_args`` already. Can't be used with
+            a pruner.
+        data_subsets (scripts.subsets.DataSubsets, optional): if given, the
+            function receives the subset of the data for the budget of the
+            evaluation instead of ``func_args``.
     """
 
-    def __init__(self, func, func_args,  *args, **kwargs):
+    def __init__(self, func, func_args, *args, resources=None, pruner=None,
+                 lookup_pruner=False, usage_scope='thread',
+                 trace_allocations=0, trace_gc=False, fork_server=None,
+                 data_subsets=None, **kwargs):
         super(FMinWorker, self).__init__(*args, **kwargs)
         self.func = func
         self.func_args = func_args
-
-    def compute(self, config, budget, **kwargs):
-        return {'loss': self.func(budget=budget, *self.func_args, **config),
-                'info': {'budget': budget}}
+        self.resources = resources
+        self.pruner = pruner
+        self.lookup_pruner = lookup_pruner
+        self.usage_scope = usage_scope
+        self.trace_allocations = trace_allocations
+        self.trace_gc = trace_gc
+        self.fork_server = fork_server
+        self.data_subsets = data_subsets
+
+    def compute(self, config, budget, config_id=None, **kwargs):
+        # the worker is logged, for the utilization analysis of the run
+        info = {'budget': budget, 'worker': self.worker_id}
+        if self.resources is not None:
+            info['resources'] = self.resources
+
+        func_kwargs = dict(config)
+        func_args = self.func_args
+        if self.data_subsets is not None:
+            func_args = self.data_subsets.args(budget)
+            info['num_samples'] = self.data_subsets.size(budget)
+        if self.pruner is not None or self.lookup_pruner:
+            report = get_reporter(self, config_id, budget, pruner=self.pruner)
+            if report is not None:
+                func_kwargs['report'] = report
+        meter = UsageMeter(scope=self.usage_scope,
+                           num_allocations=self.trace_allocations,
+                           trace_gc=self.trace_gc)
+        try:
+            if self.fork_server is not None:
+                # the child meters itself
+                loss, info[USAGE] = self.fork_server.evaluate(
+                    func_kwargs, budget,
+                    num_allocations=self.trace_allocations,
+                    trace_gc=self.trace_gc)
+            else:
+                with meter:
+                    loss = self.func(budget=budget, *func_args,
+                                     **func_kwargs)
+                info[USAGE] = meter.usage
+            if isinstance(loss, dict):
+                # the losses on the lower budgets come for free
+                info[LEARNING_CURVE] = sorted([float(b), l]
+                                              for b, l in loss.items())
+                loss = loss[budget]
+        except EarlyStopped as e:
+            # The partial result is logged as an early-stopped evaluation
+            loss = e.loss
+            info.update(early_stopped_info(e))
+            info[USAGE] = meter.usage
+
+        return {'loss': loss, 'info': info}
 
 
 def fmin(func, config_space, func_args=(),
           eta=2, min_budget=2, max_budget=4, num_iterations=1,
-          num_workers=1, output_dir='.'):
+          num_workers=1, output_dir='.', manage_threads=True, prune=False,
+          max_history=None, history_subsampling='recency',
+          vectorized_sampling=False, nic_name=None, working_directory=None,
+          wait_for_remote_workers=0, run_id='fmin', elastic=False,
+          cost_aware=False, max_total_budget=None, max_time=None,
+          max_evaluations=None, learning_curves=False, asynchronous=False,
+          prefilter=False, prefilter_keep=0.5, trace_allocations=0,
+          trace_gc=False, result_db=None, fork_server=False, preload=(),
+          evaluation_timeout=None, data_subsets=False, stratify=None):
     """
     Starts a local BOHB optimization run for a function over a hyperparameter
     search space, which is referred to as configuration space.
@@ -162,6 +287,132 @@ def fmin(func, config_space, func_args=(),
             Also, we store the configuration space definition for later use to
             this directory. It may be used for further analysis via
             `CAVE <https://automl.github.io/CAVE/stable/>`_.
+        manage_threads (bool, optional): If True (default), the cores
+            available to this process are split between the workers and the
+            BLAS/OpenMP thread pools are limited to each worker's share for
+            the duration of the run. The chosen layout is stored in the info
+            of every result.
+        prune (bool, optional): If True, ``func`` must accept a ``report``
+            argument. It is a function ``report(loss, step)``, which ``func``
+            calls with intermediate losses, e.g. after every epoch. Once the
+            run can't make it into the best 1/``eta`` of the finished runs on
+            the same budget anymore, ``report`` raises
+            :class:`scripts.pruning.EarlyStopped`. The last reported loss is
+            then logged with ``early_stopped`` set in its info.
+            By default, pruning is disabled.
+        max_history (int, optional): Maximum number of results per budget,
+            on which BOHB fits its models. Keeps the time to sample a new
+            configuration flat in long runs. By default, all results are used.
+        history_subsampling (str, optional): Which results are dropped once
+            there are more than ``max_history``: 'recency' (default) drops the
+            oldest ones, 'quality' keeps the best ones and drops the oldest of
+            the others.
+        vectorized_sampling (bool, optional): If True, BOHB scores all
+            candidates for a new configuration at once, and draws its random
+            configurations in batches. By default, they are scored and drawn
+            one after the other, as in HpBandSter.
+            Either way, the time it took to sample a configuration is stored
+            as ``sampling_time`` in its info in 'configs.json'.
+        nic_name (str, optional): Network interface, on which the nameserver
+            and the master listen, e.g. 'eth0'. Must be reachable from other
+            hosts if remote workers join the run. By default, only local
+            workers can connect.
+        working_directory (str, optional): Directory, in which the nameserver
+            credentials are stored. Remote workers find the run through it,
+            so it has to be on a filesystem shared with their hosts. Defaults
+            to ``output_dir``.
+        wait_for_remote_workers (int, optional): Number of workers in other
+            processes, that must have joined before the optimization starts.
+            They are started with
+            ``python FMin.py --worker --func <file> --working_directory <dir>``
+            (see :func:`fmin_worker`). Further workers may join later on.
+            ``func_args`` are pickled to the working directory for them.
+            By default, only the ``num_workers`` local workers are used.
+        run_id (str, optional): Name of the run at the nameserver. Remote
+            workers have to use the same one. Defaults to 'fmin'.
+        elastic (bool, optional): If True, the optimization starts as soon as
+            the first worker is there, instead of waiting for all local and
+            remote workers. Workers may join and leave during the run; the
+            evaluations of workers that left are run again. The uptime and
+            utilization of every worker are stored in 'workers.json' in
+            ``output_dir``. By default, the run waits for all workers.
+        cost_aware (bool, optional): If True, the queued evaluations
+            expected to take longest are started first, and configurations
+            whose promotion to the next budget is certain are started on it
+            before their rung is complete. New configurations are still
+            sampled one at a time, so the order mostly changes on the larger
+            budgets. The costs are learned from the run. The makespan and
+            idle time of every iteration are stored in 'packing.json' in
+            ``output_dir``.
+        max_total_budget (float, optional): The run stops once the budgets of
+            all started evaluations sum up to this. Running evaluations
+            finish, no further ones start. By default, the run ends after
+            ``num_iterations``, as do the two limits below.
+        max_time (float, optional): The run stops after this many seconds.
+        max_evaluations (int, optional): The run stops after this many
+            evaluations. The limits and the compute used are stored as
+            'compute' in the config of the result, see
+            :class:`scripts.limits.LimitedMaster`.
+        learning_curves (bool, optional): If True, ``func`` may return a
+            dict ``{budget: loss}`` with its losses on the requested and on
+            lower budgets, e.g. after every epoch. The losses on the budgets
+            of the run are recorded for all lower rungs, and evaluations that
+            an earlier curve covered aren't run again. See
+            :mod:`scripts.curves`. By default, only the loss on the requested
+            budget is recorded.
+        asynchronous (bool, optional): If True, a configuration is promoted
+            to the next budget as soon as it is among the best 1/``eta`` of
+            the results on its budget so far, instead of once all evaluations
+            on the budget have finished, see :mod:`scripts.asha`. Workers
+            don't wait for the slowest evaluation of a budget then. The
+            configurations are sampled by BOHB either way. Can't be combined
+            with ``cost_aware``. By default, promotions are synchronous.
+        prefilter (bool, optional): If True, a random forest is fitted on
+            the results of the run, and the brackets starting on
+            ``min_budget`` only evaluate the configurations it predicts to be
+            best, see :mod:`scripts.prefilter`. The skip rate and the error
+            of the predictions are stored in 'prefilter.json' in
+            ``output_dir``. Requires scikit-learn. By default, all sampled
+            configurations are evaluated.
+        prefilter_keep (float, optional): Fraction of the configurations
+            on ``min_budget`` that the prefilter lets through, but at least
+            as many as are promoted. Default: 0.5.
+        trace_allocations (int, optional): Every result records the CPU
+            time and memory of its evaluation as 'usage' in its info, see
+            :mod:`scripts.accounting`. If greater than 0, as many source lines
+            that allocated the most memory during the evaluation are
+            recorded as well, with ``tracemalloc``. This slows the
+            evaluations down. Default: 0.
+        trace_gc (bool, optional): If True, the garbage collections during
+            every evaluation and their pauses are recorded as well.
+        result_db (str, optional): SQLite database, to which the sampled
+            configurations and the results are added as well, see
+            ``scripts/result_store.py``. The run is stored under the name of
+            ``output_dir``, the optimizer and ``run_id``.
+        fork_server (bool, optional): If True, every evaluation runs in a
+            process of its own, forked from a server that has imported the
+            file of ``func`` and the ``preload`` modules once, see
+            ``scripts/forkserver.py``. Crashes of an evaluation don't take
+            down the run. ``func`` has to be defined at the top level of a
+            file, e.g. loaded with ``load_func``. Can't be combined with
+            pruning.
+        preload (list of str, optional): Modules the fork server imports
+            before it loads ``func``, e.g. ['sklearn.neural_network'].
+        evaluation_timeout (float, optional): With a fork server, the
+            evaluations are killed after this many seconds and count as
+            crashed.
+        data_subsets (bool, optional): If True, the budget is the fraction
+            ``budget / max_budget`` of the samples in the arrays of
+            ``func_args``. Nested, stratified and shuffled subsets are drawn
+            once for all budgets of the run, and ``func`` receives the
+            subset for its budget instead of ``func_args``, without a copy,
+            see ``scripts/subsets.py``. Its number of samples is recorded as
+            'num_samples' in the info of every result. By default,
+            ``func_args`` are passed as they are.
+        stratify (int, optional): With ``data_subsets``, the index of the
+            labels in ``func_args`` to stratify by, e.g. 1 for ``(X, y)``.
+            Float labels are stratified by quantile bins. By default, the
+            subsets are only shuffled.
 
     Returns:
         hpbandster.core.result.Run - Best run.
@@ -181,30 +432,114 @@ def fmin(func, config_space, func_args=(),
             configuration are extracted from this results-object.
 
     """
+    if prune and 'report' not in inspect.signature(func).parameters:
+        raise ValueError('Pruning requires the function to accept a '
+                         '\'report\' argument.')
+    if cost_aware and asynchronous:
+        raise ValueError('Cost-aware packing and asynchronous promotions '
+                         'can\'t be combined.')
+    if fork_server:
+        if prune:
+            raise ValueError('Pruning can\'t be combined with a fork server, '
+                             'its reports can\'t reach a forked process.')
+        func_file, func_name = func_location(func)
+    elif preload or evaluation_timeout is not None:
+        raise ValueError('preload and evaluation_timeout need a fork server.')
+    if stratify is not None and not data_subsets:
+        raise ValueError('stratify needs data_subsets.')
+
+    # The subsets of the data are drawn once, from the random state of the
+    # configuration space, so seeding the space seeds them
+    subsets = None
+    if data_subsets:
+        subsets = DataSubsets(func_args,
+                              budget_schedule(min_budget, max_budget, eta),
+                              stratify=stratify,
+                              seed=config_space.random.randint(2 ** 31 - 1))
+
     output_dir = Path(output_dir)
     output_dir.mkdir(exist_ok=True)
-
-    # Set up a local nameserver and start it
-    ns = hpns.NameServer(run_id='fmin',
-                         nic_name=None,
-                         working_directory=output_dir)
+    if working_directory is None:
+        working_directory = output_dir
+
+    # Set up a nameserver and start it. Its credentials are written to the
+    # working directory, where remote workers pick them up.
+    ns = hpns.NameServer(run_id=run_id,
+                         nic_name=nic_name,
+                         working_directory=str(working_directory))
     ns_host, ns_port = ns.start()
 
+    # Remote workers load the function arguments from the working directory
+    args_file = None
+    if wait_for_remote_workers > 0 or elastic:
+        args_file = func_args_path(working_directory, run_id)
+        try:
+            with open(args_file, 'wb') as f:
+                # the subsets include the permuted arguments
+                pickle.dump(subsets if subsets is not None
+                            else tuple(func_args), f)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            ns.shutdown()
+            os.remove(args_file)
+            raise ValueError('Remote workers need func_args that can be '
+                             'pickled: %s' % e)
+
+    # The workers are threads of this process and share its thread pools, so
+    # the pools are sized to one worker's share of the cores during the run.
+    resource_manager = None
+    if manage_threads:
+        resource_manager = ResourceManager(workers_per_node=num_workers,
+                                           worker_index=0)
+
+    # The pruner decides whether running evaluations are stopped early. The
+    # workers run in this process, so they can use it directly.
+    pruner = RungPruner() if prune else None
+    if pruner is not None and wait_for_remote_workers > 0:
+        # Remote workers look up the pruner at the nameserver
+        pruner.start(run_id=run_id, host=ns_host, nameserver=ns_host,
+                     nameserver_port=ns_port)
+
     # Create ``num_workers`` workers and pass the function as well as the
     # function arguments to each of them.
+    # Each worker needs its own ``id``, otherwise the threads register under
+    # the same name at the nameserver and only one of them is found.
+    # The local workers share one fork server.
+    server = None
+    if fork_server:
+        server = ForkServer(func_file, func_name=func_name,
+                            func_args=(subsets if subsets is not None
+                                       else func_args),
+                            preload=preload, timeout=evaluation_timeout,
+                            threads=(resource_manager.threads
+                                     if resource_manager else None)).start()
     workers = []
-    for _ in range(num_workers):
-        worker = FMinWorker(func=func, func_args=func_args,
+    for i in range(num_workers):
+        worker = FMinWorker(func=func, func_args=func_args, id=i,
+                               resources=(resource_manager.layout
+                                          if resource_manager else None),
+                               pruner=pruner,
+                               trace_allocations=trace_allocations,
+                               trace_gc=trace_gc,
+                               fork_server=server,
+                               data_subsets=subsets,
                                nameserver=ns_host,
                                nameserver_port=ns_port,
-                               run_id='fmin')
+                               run_id=run_id)
         worker.run(background=True)
         workers.append(worker)
 
     # The result logger will store the intermediate results and the sampled
     # configurations in the passed directory.
-    result_logger = hpres.json_result_logger(directory=output_dir,
-                                             overwrite=True)
+    if result_db is not None:
+        # the run is named after the output directory in the store
+        result_logger = StoreResultLogger(
+            str(output_dir), ResultStore(result_db),
+            experiment=output_dir.resolve().name,
+            optimizer='asha' if asynchronous else 'bohb', run_id=run_id,
+            overwrite=True)
+    else:
+        result_logger = hpres.json_result_logger(directory=output_dir,
+                                                 overwrite=True)
 
     # For hyperparameter importance analysis via CAVE we store the configuration
     # space definition to file.
@@ -212,47 +547,191 @@ def fmin(func, config_space, func_args=(),
         f.write(json.write(config_space))
 
     # Set up a master, which is book keeping and decides what to run next.
-    opt = BOHB(configspace=config_space,
-               run_id='fmin',
-               min_budget=min_budget,
-               max_budget=max_budget,
-               eta=eta,
-               host=ns_host,
-               nameserver=ns_host,
-               nameserver_port=ns_port,
-               result_logger=result_logger)
+    extensions = []
+    master_kwargs = {'max_history': max_history,
+                     'history_subsampling': history_subsampling,
+                     'vectorized_sampling': vectorized_sampling}
+    if elastic:
+        extensions.append(ElasticMaster)
+        master_kwargs['worker_log'] = output_dir / 'workers.json'
+        # notice workers that left within seconds, not a minute
+        master_kwargs['ping_interval'] = 5
+    if prune:
+        extensions.append(PruningMaster)
+        master_kwargs['pruner'] = pruner
+    if prefilter:
+        # before the mixins that replace the iterations, so it samples for
+        # theirs
+        extensions.append(PrefilterMaster)
+        master_kwargs['prefilter'] = SurrogatePrefilter(config_space,
+                                                        keep=prefilter_keep)
+        master_kwargs['prefilter_report'] = output_dir / 'prefilter.json'
+    if cost_aware:
+        extensions.append(PackingMaster)
+        master_kwargs['packing_report'] = output_dir / 'packing.json'
+    if learning_curves:
+        extensions.append(CurveMaster)
+    compute_limit = ComputeLimit(max_total_budget=max_total_budget,
+                                 max_time=max_time,
+                                 max_evaluations=max_evaluations)
+    if compute_limit:
+        extensions.append(LimitedMaster)
+        master_kwargs['compute_limit'] = compute_limit
+
+    optimizer = get_optimizer_class('asha' if asynchronous else 'bohb',
+                                    extensions)
+    opt = optimizer(configspace=config_space,
+                    run_id=run_id,
+                    min_budget=min_budget,
+                    max_budget=max_budget,
+                    eta=eta,
+                    host=ns_host,
+                    nameserver=ns_host,
+                    nameserver_port=ns_port,
+                    result_logger=result_logger,
+                    **master_kwargs)
 
     # The result object stores run information, e.g. the incumbent trajectory.
-    # Force the master to wait until all workers are ready.
-    result = opt.run(n_iterations=num_iterations, min_n_workers=num_workers)
-
-    # After the run has finished, shut down the master and the workers
-    opt.shutdown(shutdown_workers=True)
-    ns.shutdown()
+    # Force the master to wait until all local and remote workers are ready.
+    if resource_manager is not None:
+        resource_manager.apply()
+    try:
+        result = opt.run(n_iterations=num_iterations,
+                         min_n_workers=num_workers + wait_for_remote_workers)
+    finally:
+        # After the run has finished (or failed), shut down the master and
+        # the workers and give the caller its thread pools back
+        opt.shutdown(shutdown_workers=True)
+        if pruner is not None:
+            pruner.shutdown()
+        ns.shutdown()
+        if resource_manager is not None:
+            resource_manager.restore()
+        if args_file is not None and os.path.exists(args_file):
+            os.remove(args_file)
+        if server is not None:
+            server.shutdown()
 
     # Save to result object to file.
     with open(output_dir / 'results.pkl', 'wb') as f:
-        import pickle
         pickle.dump(result, f)
 
     # Return the optimal value and the responding configuration, as well as the
     # result object. The result object can be used in a second step for further
     # hyperparameter importance analysis with CAVE.
+    inc_value, inc_cfg = get_incumbent(result)
+    return inc_value, inc_cfg, result
+
+
+def get_incumbent(result):
+    """
+    Loss and configuration of the incumbent of a run.
+
+    Returns:
+        float, dict - the loss of the incumbent on the largest budget and
+            its configuration
+    """
     id2config = result.get_id2config_mapping()
     incumbent = result.get_incumbent_id()
-    inc_value = result.get_runs_by_id(incumbent)[-1]['loss']
+    if incumbent is not None:
+        inc_value = result.get_runs_by_id(incumbent)[-1]['loss']
+    else:
+        # A compute limit stopped the run before a configuration finished on
+        # max_budget, so the best run on the largest budget is returned.
+        runs = [r for r in result.get_all_runs() if r.loss is not None]
+        best = max(runs, key=lambda r: (r.budget, -r.loss))
+        incumbent, inc_value = best.config_id, best.loss
     inc_cfg = id2config[incumbent]['config']
+    return inc_value, inc_cfg
 
-    return inc_value, inc_cfg, result
 
+def fmin_worker(func, working_directory, func_args=None, run_id='fmin',
+                nic_name=None, workers_per_node=1, manage_threads=True,
+                trace_allocations=0, trace_gc=False, fork_server=False,
+                preload=(), evaluation_timeout=None):
+    """
+    Runs a worker for an ``fmin`` run in another process or on another host.
+
+    The worker reads the nameserver credentials and the ``func_args`` of the
+    run from ``working_directory`` and evaluates configurations until the
+    master shuts it down. If the run uses pruning, the worker looks up the
+    pruner at the nameserver.
 
-def load_func(path_to_function_file):
+    Args:
+        func (function): the same function as passed to ``fmin``.
+        working_directory (str): the ``working_directory`` of the ``fmin``
+            run. Must be shared between the hosts.
+        func_args (tuple, optional): arguments passed to the function. By
+            default, the ``func_args`` of the ``fmin`` run are used, or its
+            data subsets if it has some.
+        run_id (str, optional): the ``run_id`` of the ``fmin`` run.
+        nic_name (str, optional): network interface of this host, on which
+            the master can reach the worker. By default, the worker listens
+            on the address of the hostname of this host.
+        workers_per_node (int, optional): number of worker processes on this
+            host. The BLAS/OpenMP thread pools are sized to this worker's
+            share of the cores.
+        manage_threads (bool, optional): If False, the thread pools are left
+            as they are.
+        trace_allocations (int, optional): see ``fmin``.
+        trace_gc (bool, optional): see ``fmin``.
+        fork_server (bool, optional): see ``fmin``. The server of the worker
+            is started after the thread pools are sized.
+        preload (list of str, optional): see ``fmin``.
+        evaluation_timeout (float, optional): see ``fmin``.
+    """
+    resources = None
+    if manage_threads:
+        resources = ResourceManager(workers_per_node=workers_per_node).apply()
+
+    if func_args is None:
+        args_file = func_args_path(working_directory, run_id)
+        func_args = ()
+        if os.path.exists(args_file):
+            with open(args_file, 'rb') as f:
+                func_args = pickle.load(f)
+    subsets = None
+    if isinstance(func_args, DataSubsets):
+        subsets, func_args = func_args, func_args.func_args
+
+    # Pyro binds to localhost without a host, where no master on another
+    # host can reach the worker
+    host = hpns.nic_name_to_host(nic_name) if nic_name is not None \
+        else socket.gethostname()
+    server = None
+    if fork_server:
+        func_file, func_name = func_location(func)
+        server = ForkServer(func_file, func_name=func_name,
+                            func_args=(subsets if subsets is not None
+                                       else func_args),
+                            preload=preload,
+                            timeout=evaluation_timeout).start()
+    worker = FMinWorker(func=func, func_args=func_args, run_id=run_id,
+                        host=host, resources=resources,
+                        # the only worker of the process
+                        usage_scope='process',
+                        trace_allocations=trace_allocations,
+                        trace_gc=trace_gc,
+                        fork_server=server,
+                        data_subsets=subsets,
+                        lookup_pruner=server is None and 'report' in
+                        inspect.signature(func).parameters)
+    worker.load_nameserver_credentials(working_directory=working_directory)
+    try:
+        worker.run(background=False)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+def load_func(path_to_function_file, name='opt_func'):
     """
     Parse optimization function
 
     Args:
         path_to_function_file (str): Path to the file, in which the function
             with the name 'opt_func' is
+        name (str, optional): Name of the function, if it is not 'opt_func'
 
     Returns:
         optimize function
@@ -260,7 +739,7 @@ def load_func(path_to_function_file):
     from importlib.machinery import SourceFileLoader
     loader = SourceFileLoader('opt_func', path_to_function_file)
     module = loader.load_module()
-    function = getattr(module, 'opt_func')
+    function = getattr(module, name)
     return function
 
 
@@ -310,15 +789,121 @@ if __name__ == "__main__":
                         type=int, default=1)
     parser.add_argument('--output_dir', help='Output directory',
                         type=str, default='.')
+    parser.add_argument('--nic_name',
+                        help='Network interface for communication between '
+                             'the master and remote workers, e.g. eth0',
+                        type=str, default=None)
+    parser.add_argument('--working_directory',
+                        help='Shared directory for the nameserver '
+                             'credentials. Defaults to the output directory',
+                        type=str, default=None)
+    parser.add_argument('--run_id', help='Name of the run',
+                        type=str, default='fmin')
+    parser.add_argument('--wait_for_remote_workers',
+                        help='Number of remote workers to wait for',
+                        type=int, default=0)
+    parser.add_argument('--elastic',
+                        help='Start with the first worker and let workers '
+                             'join and leave during the run',
+                        action='store_true')
+    parser.add_argument('--cost_aware',
+                        help='Start the most expensive evaluations first and '
+                             'promote configurations early',
+                        action='store_true')
+    parser.add_argument('--asynchronous',
+                        help='Promote configurations as soon as they are '
+                             'among the best 1/eta on their budget',
+                        action='store_true')
+    parser.add_argument('--prefilter',
+                        help='Evaluate only the configurations on min_budget '
+                             'a random forest predicts to be best',
+                        action='store_true')
+    parser.add_argument('--prefilter_keep',
+                        help='Fraction of the configurations on min_budget '
+                             'the prefilter lets through', type=float,
+                        default=0.5)
+    parser.add_argument('--trace_allocations',
+                        help='Number of source lines allocating most memory '
+                             'recorded for every evaluation', type=int,
+                        default=0)
+    parser.add_argument('--trace_gc',
+                        help='Record the garbage collections of every '
+                             'evaluation', action='store_true')
+    parser.add_argument('--result_db',
+                        help='SQLite database the results are added to',
+                        type=str, default=None)
+    parser.add_argument('--fork_server',
+                        help='Run every evaluation in a process forked from '
+                             'a server that has imported the function',
+                        action='store_true')
+    parser.add_argument('--preload',
+                        help='Modules the fork server imports in advance',
+                        type=str, nargs='*', default=[])
+    parser.add_argument('--evaluation_timeout',
+                        help='Seconds after which the fork server kills an '
+                             'evaluation', type=float, default=None)
+    parser.add_argument('--worker',
+                        help='Run a worker, which joins the run in the '
+                             'working directory', action='store_true')
+    parser.add_argument('--workers_per_node',
+                        help='Number of worker processes on this host',
+                        type=int, default=1)
+    parser.add_argument('--max_history',
+                        help='Maximum number of results per budget used to '
+                             'fit the BOHB models', type=int, default=None)
+    parser.add_argument('--history_subsampling',
+                        help='Results dropped beyond max_history',
+                        choices=['recency', 'quality'], default='recency')
+    parser.add_argument('--vectorized_sampling',
+                        help='Score all BOHB candidates at once and draw '
+                             'random configurations in batches',
+                        action='store_true')
+    parser.add_argument('--learning_curves',
+                        help='The function returns a dict of the losses on '
+                             'the budget and lower ones',
+                        action='store_true')
+    parser.add_argument('--max_total_budget',
+                        help='Stop once the budgets of all evaluations sum '
+                             'up to this', type=float, default=None)
+    parser.add_argument('--max_time', help='Stop after this many seconds',
+                        type=float, default=None)
+    parser.add_argument('--max_evaluations',
+                        help='Stop after this many evaluations', type=int,
+                        default=None)
     args = parser.parse_args()
 
     func = load_func(args.func)
+
+    if args.worker:
+        fmin_worker(func, args.working_directory or args.output_dir,
+                    run_id=args.run_id, nic_name=args.nic_name,
+                    workers_per_node=args.workers_per_node,
+                    trace_allocations=args.trace_allocations,
+                    trace_gc=args.trace_gc, fork_server=args.fork_server,
+                    preload=args.preload,
+                    evaluation_timeout=args.evaluation_timeout)
+        sys.exit(0)
+
     config = load_configspace(args.config_space)
 
     inc_value, inc_cfg, result = fmin(func=func, config_space=config, eta=args.eta,
              min_budget=args.min_budget, max_budget=args.max_budget,
              num_iterations=args.num_iterations, num_workers=args.num_workers,
-             output_dir=args.output_dir)
+             output_dir=args.output_dir, max_history=args.max_history,
+             history_subsampling=args.history_subsampling,
+             vectorized_sampling=args.vectorized_sampling,
+             nic_name=args.nic_name, working_directory=args.working_directory,
+             wait_for_remote_workers=args.wait_for_remote_workers,
+             run_id=args.run_id, elastic=args.elastic,
+             cost_aware=args.cost_aware,
+             max_total_budget=args.max_total_budget, max_time=args.max_time,
+             max_evaluations=args.max_evaluations,
+             learning_curves=args.learning_curves,
+             asynchronous=args.asynchronous, prefilter=args.prefilter,
+             prefilter_keep=args.prefilter_keep,
+             trace_allocations=args.trace_allocations, trace_gc=args.trace_gc,
+             result_db=args.result_db, fork_server=args.fork_server,
+             preload=args.preload, evaluation_timeout=args.evaluation_timeout)
 
     print('Found best value {} with the configuration {}\n'.format(inc_value,
                                                                  inc_cfg))
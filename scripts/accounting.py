@@ -0,0 +1,362 @@
+"""
+Resource usage of every evaluation.
+
+HpBandSter only logs when an evaluation started and finished. Which
+hyperparameters make evaluations memory hungry or CPU inefficient, and
+whether a long-lived worker leaks memory from one evaluation to the next
+(e.g. graphs piling up in a process-global TensorFlow session), doesn't show.
+
+A :class:`UsageMeter` measures one evaluation. :class:`scripts.FMin.FMinWorker`
+and the workers of the ICML 2018 experiments store its measurements as
+``'usage'`` in the info of every result:
+
+- 'cpu_user' and 'cpu_sys': CPU seconds of the evaluation, of the calling
+  thread ('cpu_scope' 'thread', for workers that share a process) or of the
+  whole process ('cpu_scope' 'process', for one worker per process). Threads
+  started by the evaluation, e.g. of BLAS, only count in the latter.
+- 'wall_time' and 'cpu_utilization', the CPU time per second.
+- 'rss_mb', the resident memory of the process after the evaluation, and
+  'rss_growth_mb', its change during the evaluation. Memory that is never
+  given back shows as a growing 'rss_mb' over the evaluations of a worker.
+- 'peak_rss_mb', the peak resident memory of the process. With the 'process'
+  scope on Linux, the peak is reset before every evaluation, so it's the
+  peak of the evaluation.
+- optionally 'allocations', the source lines that allocated most of the
+  memory still held after the evaluation (with ``tracemalloc``), and 'gc',
+  the garbage collections and their pauses during the evaluation. Both slow
+  evaluations down and cover the whole process.
+
+:func:`usage_by_hyperparameter` aggregates a measurement by the values of
+every hyperparameter, and :func:`worker_memory_trends` fits the growth of
+the memory of every worker over its evaluations. From the command line::
+
+    python accounting.py NEMO_OUTPUT/BC_* --metric peak_rss_mb
+"""
+
+import argparse
+import gc
+import json
+import numbers
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+import numpy as np
+import hpbandster.core.result as hpres
+
+
+USAGE = 'usage'
+SCOPES = ('thread', 'process')
+
+# number of meters using tracemalloc, which is started and stopped for the
+# whole process, and whether they started it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def rss_mb():
+    """
+    Resident memory of this process in MB, None where /proc isn't available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2. ** 20
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM'):
+                    return int(line.split()[1]) / 1024.
+    except (OSError, ValueError):
+        pass
+    # kB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2. ** 20 if sys.platform == 'darwin' else peak / 1024.
+
+
+def reset_peak_rss():
+    """
+    Resets the peak resident memory of this process (Linux only).
+
+    Returns:
+        bool - whether it was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+class UsageMeter(object):
+    """
+    Measures the resources used by the code run in the ``with`` block. The
+    measurements are in :attr:`usage` afterwards.
+
+    Args:
+        scope (str, optional): 'thread' (default) measures the CPU time of
+            the calling thread, 'process' of the whole process, and resets
+            its peak memory first.
+        num_allocations (int, optional): number of the source lines with the
+            most memory allocated during the block, that are recorded with
+            ``tracemalloc``. Default: 0, no tracing.
+        trace_gc (bool, optional): record the garbage collections during
+            the block. Default: False.
+    """
+
+    def __init__(self, scope='thread', num_allocations=0, trace_gc=False):
+        if scope not in SCOPES:
+            raise ValueError('Unknown scope %s' % scope)
+        # RUSAGE_THREAD is Linux only
+        if scope == 'thread' and not hasattr(resource, 'RUSAGE_THREAD'):
+            scope = 'process'
+        self.scope = scope
+        self.num_allocations = num_allocations
+        self.trace_gc = trace_gc
+        self.usage = None
+
+    def _rusage(self):
+        return resource.getrusage(resource.RUSAGE_THREAD
+                                  if self.scope == 'thread'
+                                  else resource.RUSAGE_SELF)
+
+    def _gc_callback(self, phase, info):
+        if phase == 'start':
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            pause = time.perf_counter() - self._gc_start
+            self._gc_pauses.append(pause)
+            self._gc_start = None
+
+    def __enter__(self):
+        global _tracemalloc_users, _tracemalloc_started
+        if self.trace_gc:
+            self._gc_start = None
+            self._gc_pauses = []
+            gc.callbacks.append(self._gc_callback)
+        self._snapshot = None
+        if self.num_allocations > 0:
+            with _tracemalloc_lock:
+                if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_started = True
+                _tracemalloc_users += 1
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.scope == 'process':
+            reset_peak_rss()
+
+        self._rss = rss_mb()
+        self._start = time.time()
+        self._start_usage = self._rusage()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        global _tracemalloc_users, _tracemalloc_started
+        end_usage = self._rusage()
+        wall_time = time.time() - self._start
+        rss = rss_mb()
+
+        cpu_user = end_usage.ru_utime - self._start_usage.ru_utime
+        cpu_sys = end_usage.ru_stime - self._start_usage.ru_stime
+        self.usage = {
+            'cpu_user': cpu_user, 'cpu_sys': cpu_sys,
+            'cpu_scope': self.scope, 'wall_time': wall_time,
+            'cpu_utilization': ((cpu_user + cpu_sys) / wall_time
+                                if wall_time > 0 else None),
+            'rss_mb': rss,
+            'rss_growth_mb': (rss - self._rss if rss is not None and
+                              self._rss is not None else None),
+            'peak_rss_mb': peak_rss_mb()}
+
+        if self._snapshot is not None:
+            diff = tracemalloc.take_snapshot().compare_to(self._snapshot,
+                                                          'lineno')
+            grown = [stat for stat in diff if stat.size_diff > 0]
+            self.usage['allocations'] = [
+                {'location': str(stat.traceback),
+                 'size_kb': stat.size_diff / 1024., 'count': stat.count_diff}
+                for stat in grown[:self.num_allocations]]
+            self._snapshot = None
+            with _tracemalloc_lock:
+                _tracemalloc_users -= 1
+                if _tracemalloc_users == 0 and _tracemalloc_started:
+                    tracemalloc.stop()
+                    _tracemalloc_started = False
+        if self.trace_gc:
+            gc.callbacks.remove(self._gc_callback)
+            self.usage['gc'] = {'collections': len(self._gc_pauses),
+                                'pause': float(sum(self._gc_pauses)),
+                                'max_pause': float(max(self._gc_pauses,
+                                                       default=0.))}
+        return False
+
+
+def load_usage(directory):
+    """
+    Measurements of all evaluations logged to the run directory
+    ``directory``.
+
+    Returns:
+        list of dict - one per evaluation with a measurement, with
+            'config_id', 'config', 'budget', 'started', 'worker' and 'usage'
+    """
+    result = hpres.logged_results_to_HBS_result(str(directory))
+    id2config = result.get_id2config_mapping()
+    runs = []
+    for run in result.get_all_runs():
+        info = run.info if isinstance(run.info, dict) else {}
+        if not isinstance(info.get(USAGE), dict):
+            continue
+        runs.append({'config_id': run.config_id,
+                     'config': id2config[run.config_id]['config'],
+                     'budget': run.budget,
+                     'started': run.time_stamps['started'],
+                     'worker': info.get('worker'),
+                     'usage': info[USAGE]})
+    return runs
+
+
+def _summary(values):
+    return {'num_evaluations': len(values),
+            'mean': float(np.mean(values)), 'max': float(np.max(values))}
+
+
+def usage_by_hyperparameter(runs, metric='peak_rss_mb', num_bins=4):
+    """
+    A measurement of the evaluations, grouped by the value of every
+    hyperparameter.
+
+    Args:
+        runs (list of dict): evaluations, see :func:`load_usage`.
+        metric (str, optional): key of the measurement, e.g. 'cpu_user',
+            'cpu_utilization' or 'rss_growth_mb'. Default: 'peak_rss_mb'.
+        num_bins (int, optional): numerical hyperparameters with more values
+            than this are grouped into as many quantile bins. Default: 4.
+
+    Returns:
+        dict - hyperparameter -> list of groups, each with 'value' (a value,
+            or [lower, upper] of a bin), 'num_evaluations', 'mean' and 'max'.
+            Evaluations in which a hyperparameter is inactive are left out
+            of its groups.
+    """
+    measured = [r for r in runs
+                if isinstance(r['usage'].get(metric), numbers.Number)]
+    names = sorted(set(name for r in measured for name in r['config']))
+
+    report = {}
+    for name in names:
+        pairs = [(r['config'][name], r['usage'][metric]) for r in measured
+                 if name in r['config']]
+        values = [v for v, _ in pairs]
+        numerical = all(isinstance(v, numbers.Number) and
+                        not isinstance(v, bool) for v in values)
+        groups = []
+        if numerical and len(set(values)) > num_bins:
+            edges = np.unique(np.quantile(values, np.linspace(0, 1,
+                                                              num_bins + 1)))
+            # every value falls into one bin, the largest into the last
+            index = np.clip(np.searchsorted(edges, values, side='right') - 1,
+                            0, len(edges) - 2)
+            for i in range(len(edges) - 1):
+                in_bin = [m for (_, m), j in zip(pairs, index) if j == i]
+                if in_bin:
+                    group = {'value': [float(edges[i]), float(edges[i + 1])]}
+                    group.update(_summary(in_bin))
+                    groups.append(group)
+        else:
+            for value in sorted(set(values), key=str):
+                group = {'value': value}
+                group.update(_summary([m for v, m in pairs if v == value]))
+                groups.append(group)
+        report[name] = groups
+    return report
+
+
+def worker_memory_trends(runs):
+    """
+    Resident memory of every worker over its evaluations. A worker whose
+    memory grows with every evaluation leaks.
+
+    Args:
+        runs (list of dict): evaluations, see :func:`load_usage`.
+
+    Returns:
+        dict - worker -> 'num_evaluations', 'first_rss_mb', 'last_rss_mb'
+            and 'growth_per_evaluation_mb', the slope of a linear fit
+    """
+    by_worker = {}
+    for r in sorted(runs, key=lambda r: r['started']):
+        if isinstance(r['usage'].get('rss_mb'), numbers.Number):
+            by_worker.setdefault(str(r['worker']), []).append(
+                r['usage']['rss_mb'])
+
+    trends = {}
+    for worker, rss in by_worker.items():
+        slope = float(np.polyfit(np.arange(len(rss)), rss, 1)[0]) \
+            if len(rss) > 1 else 0.
+        trends[worker] = {'num_evaluations': len(rss),
+                          'first_rss_mb': rss[0], 'last_rss_mb': rss[-1],
+                          'growth_per_evaluation_mb': slope}
+    return trends
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resource usage of the '
+                                                 'evaluations of HpBandSter '
+                                                 'runs')
+    parser.add_argument('directories', help='Run directories with '
+                                            'results.json and configs.json',
+                        type=str, nargs='+')
+    parser.add_argument('--metric', help='Measurement to aggregate',
+                        type=str, default='peak_rss_mb')
+    parser.add_argument('--num_bins', help='Bins of numerical '
+                                           'hyperparameters',
+                        type=int, default=4)
+    parser.add_argument('--output', help='Json file for the full report',
+                        type=str, default=None)
+    args = parser.parse_args()
+
+    runs = []
+    for directory in args.directories:
+        runs.extend(load_usage(directory))
+    by_hyperparameter = usage_by_hyperparameter(runs, args.metric,
+                                                args.num_bins)
+    trends = worker_memory_trends(runs)
+
+    print('{} of {} evaluations'.format(args.metric, len(runs)))
+    for name, groups in by_hyperparameter.items():
+        print(name)
+        for group in groups:
+            print('  {:30s} {:6d} {:12.3f} {:12.3f}'.format(
+                str(group['value'])[:30], group['num_evaluations'],
+                group['mean'], group['max']))
+    print('{:30s} {:>6s} {:>12s} {:>12s}'.format(
+        'worker', 'evals', 'last rss', 'MB/eval'))
+    for worker, trend in trends.items():
+        print('{:30s} {:6d} {:12.1f} {:12.3f}'.format(
+            worker[-30:], trend['num_evaluations'], trend['last_rss_mb'],
+            trend['growth_per_evaluation_mb']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'metric': args.metric,
+                       'by_hyperparameter': by_hyperparameter,
+                       'workers': trends}, f, indent=2)
@@ -0,0 +1,165 @@
+"""
+Asynchronous successive halving (ASHA).
+
+Successive halving only promotes the best configurations of a rung once every
+evaluation of the rung has finished. Workers that are done early idle behind
+the slowest evaluation, or start the next iteration. ASHA (Li et al., 2018)
+promotes a configuration as soon as it is among the best 1/eta of the
+results that came in on its budget so far, so a worker never waits for a
+rung to complete.
+
+- :class:`AsynchronousSuccessiveHalving` runs one bracket of successive
+  halving with asynchronous promotions. It does as many evaluations per
+  budget as ``SuccessiveHalving`` at most, so iterations cost the same
+  compute as before. A configuration promoted early may turn out not to be
+  among the best of the complete rung; that's the price of not waiting.
+- :class:`AsynchronousMaster` is a master mixin that runs every iteration
+  with asynchronous promotions. The configurations are still sampled by the
+  optimizer, e.g. with BOHB's model.
+- :class:`AsynchronousBOHB` is BOHB with asynchronous promotions, the
+  optimizer 'asha' of :func:`scripts.optimizers.get_optimizer_class`.
+
+The results are logged and returned as by the synchronous optimizers. The
+number of asynchronous promotions is stored as 'asynchronous_promotions' in
+the config of the result.
+"""
+
+import numpy as np
+from hpbandster.optimizers.iterations import SuccessiveHalving
+
+from scripts.bounded_bohb import BoundedBOHB
+from scripts.packing import PackingMaster
+
+
+class AsynchronousSuccessiveHalving(SuccessiveHalving):
+    """
+    Successive halving that promotes configurations as soon as they rank in
+    the best 1/eta of the finished evaluations on their budget.
+
+    Whenever a worker asks for a job, the best promotable configuration of
+    the largest budget is promoted. If there is none, a new configuration is
+    sampled, until ``num_configs[0]`` are. Crashed evaluations count as
+    results of their rung, but are never promoted. The iteration is finished
+    once nothing runs and nothing can be promoted anymore.
+
+    Args:
+        eta (float): the fraction of the results of a rung, that is
+            promoted.
+        **kwargs: passed on to ``SuccessiveHalving``.
+    """
+
+    def __init__(self, *args, eta, **kwargs):
+        super(AsynchronousSuccessiveHalving, self).__init__(*args, **kwargs)
+        self.eta = eta
+
+    @property
+    def num_promotions(self):
+        # every configuration on a larger budget was promoted, also in the
+        # iterations restored from a checkpoint
+        return sum(self.actual_num_configs[1:])
+
+    def get_next_run(self):
+        if self.is_finished:
+            return None
+
+        # queued jobs, e.g. the running ones of a resumed checkpoint
+        for k, v in self.data.items():
+            if v.status == 'QUEUED':
+                v.status = 'RUNNING'
+                self.num_running += 1
+                return k, v.config, v.budget
+
+        promotion = self._next_promotion()
+        if promotion is not None:
+            k, stage = promotion
+            v = self.data[k]
+            v.budget = self.budgets[stage + 1]
+            v.status = 'RUNNING'
+            self.actual_num_configs[stage + 1] += 1
+            self.num_running += 1
+            self.logger.debug('ITERATION: Advancing config %s asynchronously '
+                              'to budget %f' % (k, v.budget))
+            return k, v.config, v.budget
+
+        # All new configurations start on the smallest budget, ``stage``
+        # stays 0.
+        if self.actual_num_configs[0] < self.num_configs[0]:
+            self.add_configuration()
+            return self.get_next_run()
+
+        if self.num_running == 0:
+            self.finish_up()
+        return None
+
+    def rung_losses(self, stage):
+        """
+        Losses of the finished evaluations on the budget of ``stage``.
+
+        Returns:
+            dict - config_id -> loss, inf for crashed evaluations
+        """
+        budget = self.budgets[stage]
+        losses = {}
+        for k, v in self.data.items():
+            if budget not in v.results:
+                continue
+            result = v.results[budget]
+            loss = result['loss'] if result is not None else None
+            losses[k] = loss if loss is not None and np.isfinite(loss) \
+                else np.inf
+        return losses
+
+    def _next_promotion(self):
+        # the largest budget first, so the best configurations finish soonest
+        for stage in reversed(range(len(self.budgets) - 1)):
+            if self.actual_num_configs[stage + 1] >= \
+                    self.num_configs[stage + 1]:
+                continue
+            losses = self.rung_losses(stage)
+            num_promoted = int(np.floor(len(losses) / self.eta))
+            best = sorted(losses, key=lambda k: losses[k])[:num_promoted]
+            for k in best:
+                v = self.data[k]
+                if v.status == 'REVIEW' and v.budget == self.budgets[stage]:
+                    return k, stage
+        return None
+
+
+class AsynchronousMaster(object):
+    """
+    Master mixin that runs every iteration with asynchronous promotions,
+    see :class:`AsynchronousSuccessiveHalving`.
+
+    It doesn't combine with :class:`scripts.packing.PackingMaster`, whose
+    early promotions are the synchronous counterpart.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if isinstance(self, PackingMaster):
+            raise ValueError('Cost-aware packing and asynchronous promotions '
+                             'can\'t be combined.')
+        super(AsynchronousMaster, self).__init__(*args, **kwargs)
+        self.config['asynchronous'] = True
+
+    def get_next_iteration(self, iteration, iteration_kwargs={}):
+        it = super(AsynchronousMaster, self).get_next_iteration(
+            iteration, iteration_kwargs)
+        return AsynchronousSuccessiveHalving(
+            HPB_iter=it.HPB_iter, num_configs=it.num_configs,
+            budgets=it.budgets, config_sampler=it.config_sampler,
+            eta=self.eta, **iteration_kwargs)
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        result = super(AsynchronousMaster, self).run(
+            n_iterations=n_iterations, min_n_workers=min_n_workers,
+            iteration_kwargs=iteration_kwargs)
+        result.HB_config['asynchronous_promotions'] = sum(
+            getattr(it, 'num_promotions', 0) for it in self.iterations)
+        return result
+
+
+class AsynchronousBOHB(AsynchronousMaster, BoundedBOHB):
+    """
+    BOHB with asynchronous promotions. The configurations are sampled from
+    BOHB's model, as in :class:`scripts.bounded_bohb.BoundedBOHB`.
+    """
@@ -0,0 +1,209 @@
+"""
+Vectorized sampling of random configurations.
+
+HpBandSter's RandomSearch and HyperBand, and the random fraction of BOHB,
+sample one ``ConfigSpace.Configuration`` at a time. For conditional spaces,
+like the MLP space with ``beta_1`` and ``beta_2`` only active for the
+'adam' solver, every sample evaluates the conditions and forbidden clauses
+of the space again, object by object. With surrogate benchmarks, whose
+evaluations take milliseconds, this becomes the bottleneck of the master.
+
+A :class:`BatchSampler` draws a batch of configurations at once as a matrix
+in ConfigSpace's vector representation, with one column per
+hyperparameter. Each hyperparameter is sampled by its own vectorized
+sampler. Inactive values are set to NaN with masks computed from the
+conditions, and rows hit by a forbidden clause are drawn again. A row
+becomes a configuration only when it is handed out.
+
+:class:`BatchRandomSampling` is the config generator of RandomSearch and
+HyperBand based on it, used by :class:`BatchRandomSearch` and
+:class:`BatchHyperBand` with ``vectorized_sampling``. With the same option,
+:class:`scripts.bounded_bohb.BoundedKDE` draws its random configurations
+from a :class:`BatchSampler` and deactivates the inactive hyperparameters
+of its model-based picks with the same masks.
+"""
+
+import numpy as np
+import ConfigSpace
+from hpbandster.optimizers import RandomSearch, HyperBand
+from hpbandster.optimizers.config_generators.random_sampling import \
+    RandomSampling
+
+
+class BatchSampler(object):
+    """
+    Draws random configurations of a configuration space in batches.
+
+    Args:
+        configspace (ConfigSpace.ConfigurationSpace): the search space.
+        batch_size (int, optional): number of configurations drawn at once.
+            Default: 100.
+        seed (int, optional): seed of the sampler. By default, it is drawn
+            from the random state of ``configspace``, so seeding the space
+            seeds the sampler.
+    """
+
+    def __init__(self, configspace, batch_size=100, seed=None):
+        self.configspace = configspace
+        self.batch_size = batch_size
+        if seed is None:
+            seed = configspace.random.randint(2 ** 31 - 1)
+        self.rng = np.random.RandomState(seed)
+        # parents come before their children
+        self.hyperparameters = configspace.get_hyperparameters()
+        self.index = {hp.name: configspace.get_idx_by_hyperparameter_name(
+            hp.name) for hp in self.hyperparameters}
+        self.conditions = {hp.name: configspace.get_parent_conditions_of(
+            hp.name) for hp in self.hyperparameters}
+        self.forbiddens = configspace.get_forbiddens()
+        self._batch = np.empty((0, len(self.hyperparameters)))
+
+    def sample(self):
+        """
+        The next random configuration.
+
+        Returns:
+            dict - the configuration, without inactive hyperparameters
+        """
+        if len(self._batch) == 0:
+            self._batch = self.sample_array(self.batch_size)
+        vector, self._batch = self._batch[0], self._batch[1:]
+        return self.to_dict(vector)
+
+    def sample_array(self, num_samples):
+        """
+        Draws ``num_samples`` valid configurations at once.
+
+        Returns:
+            np.ndarray - the configurations in vector representation, one per
+                row, NaN for inactive hyperparameters
+        """
+        batches, num_valid = [], 0
+        while num_valid < num_samples:
+            batch = self._draw(num_samples - num_valid)
+            batch = batch[~self.forbidden(batch)]
+            batches.append(batch)
+            num_valid += len(batch)
+        return np.concatenate(batches)[:num_samples]
+
+    def _draw(self, num_samples):
+        batch = np.empty((num_samples, len(self.hyperparameters)))
+        for hp in self.hyperparameters:
+            batch[:, self.index[hp.name]] = hp._sample(self.rng, num_samples)
+        return self.deactivate(batch)
+
+    def deactivate(self, batch):
+        """
+        Sets the inactive hyperparameters of the configurations in ``batch``
+        to NaN, in place.
+
+        Returns:
+            np.ndarray - ``batch``
+        """
+        for hp in self.hyperparameters:
+            conditions = self.conditions[hp.name]
+            if not conditions:
+                continue
+            # a child of an inactive parent is inactive, since its parents
+            # were deactivated before
+            active = np.logical_and.reduce([self._evaluate(c, batch)
+                                            for c in conditions])
+            batch[~active, self.index[hp.name]] = np.nan
+        return batch
+
+    def _evaluate(self, condition, batch):
+        if isinstance(condition, ConfigSpace.AndConjunction):
+            return np.logical_and.reduce([self._evaluate(c, batch)
+                                          for c in condition.components])
+        if isinstance(condition, ConfigSpace.OrConjunction):
+            return np.logical_or.reduce([self._evaluate(c, batch)
+                                         for c in condition.components])
+        parent = batch[:, self.index[condition.parent.name]]
+        # comparisons with NaN, i.e. an inactive parent, are False
+        if isinstance(condition, ConfigSpace.EqualsCondition):
+            return parent == condition.vector_value
+        if isinstance(condition, ConfigSpace.NotEqualsCondition):
+            return (parent != condition.vector_value) & ~np.isnan(parent)
+        if isinstance(condition, ConfigSpace.InCondition):
+            return np.isin(parent, list(condition.vector_values))
+        if isinstance(condition, ConfigSpace.LessThanCondition):
+            return parent < condition.vector_value
+        if isinstance(condition, ConfigSpace.GreaterThanCondition):
+            return parent > condition.vector_value
+        raise ValueError('Unsupported condition %s' % condition)
+
+    def forbidden(self, batch):
+        """
+        Which configurations in ``batch`` are forbidden.
+
+        Returns:
+            np.ndarray - True for the forbidden rows
+        """
+        forbidden = np.zeros(len(batch), dtype=bool)
+        for clause in self.forbiddens:
+            forbidden |= self._is_forbidden(clause, batch)
+        return forbidden
+
+    def _is_forbidden(self, clause, batch):
+        if isinstance(clause, ConfigSpace.ForbiddenAndConjunction):
+            return np.logical_and.reduce([self._is_forbidden(c, batch)
+                                          for c in clause.components])
+        if isinstance(clause, ConfigSpace.ForbiddenEqualsClause):
+            return batch[:, clause.vector_id] == clause.vector_value
+        if isinstance(clause, ConfigSpace.ForbiddenInClause):
+            return np.isin(batch[:, clause.vector_id],
+                           list(clause.vector_values))
+        # relations between two hyperparameters, row by row
+        return np.array([clause.is_forbidden_vector(row, strict=False)
+                         for row in batch], dtype=bool)
+
+    def to_dict(self, vector):
+        """
+        The configuration with the vector representation ``vector``.
+        """
+        return ConfigSpace.Configuration(self.configspace,
+                                         vector=vector).get_dictionary()
+
+
+class BatchRandomSampling(RandomSampling):
+    """
+    Config generator drawing random configurations in batches.
+
+    Args:
+        configspace (ConfigSpace.ConfigurationSpace): the search space.
+        batch_size (int, optional): see :class:`BatchSampler`.
+    """
+
+    def __init__(self, configspace, batch_size=100, **kwargs):
+        super(BatchRandomSampling, self).__init__(configspace, **kwargs)
+        self.sampler = BatchSampler(configspace, batch_size=batch_size)
+
+    def get_config(self, budget):
+        return self.sampler.sample(), {}
+
+
+class BatchSamplingMaster(object):
+    """
+    Master mixin for RandomSearch and HyperBand, that draws the random
+    configurations with a :class:`BatchRandomSampling` config generator.
+
+    Args:
+        vectorized_sampling (bool, optional): if False (default), the
+            optimizer samples as in HpBandSter.
+    """
+
+    def __init__(self, configspace=None, *args, vectorized_sampling=False,
+                 **kwargs):
+        super(BatchSamplingMaster, self).__init__(configspace, *args,
+                                                  **kwargs)
+        if vectorized_sampling:
+            self.config_generator = BatchRandomSampling(configspace)
+        self.config['vectorized_sampling'] = vectorized_sampling
+
+
+class BatchRandomSearch(BatchSamplingMaster, RandomSearch):
+    pass
+
+
+class BatchHyperBand(BatchSamplingMaster, HyperBand):
+    pass
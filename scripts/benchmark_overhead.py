@@ -0,0 +1,405 @@
+"""
+Micro-benchmarks for the overhead of fmin and the worker stack.
+
+The objectives used here cost nothing (or sleep for a fixed time), so all
+measured time is spent in the framework itself:
+
+- startup of the nameserver and of the workers
+- latency of dispatching a single evaluation
+- evaluations per second for different numbers of workers, through fmin
+  and through the master stack of the icml 2018 ``run_experiment.py`` entry
+  point (checkpointing master and resumable result logger)
+- time of the BOHB config generator for fitting and sampling as its history
+  of results grows
+- cost of logging a result with the json result logger
+
+The results are written as json, so that two versions can be compared::
+
+    python benchmark_overhead.py --output old.json
+    # ... change the code ...
+    python benchmark_overhead.py --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+import numpy as np
+import ConfigSpace as CS
+import hpbandster
+import hpbandster.core.nameserver as hpns
+import hpbandster.core.result as hpres
+from hpbandster.core.dispatcher import Job
+
+from scripts.FMin import fmin, FMinWorker
+from scripts.checkpoint import CheckpointMaster, ResumableResultLogger
+from scripts.bounded_bohb import BoundedKDE
+from scripts.optimizers import get_optimizer_class
+
+
+def get_configspace(num_continuous=4, num_categorical=2):
+    """
+    Configuration space of the benchmark objectives.
+    """
+    cs = CS.ConfigurationSpace()
+    for i in range(num_continuous):
+        cs.add_hyperparameter(
+            CS.UniformFloatHyperparameter('x%i' % i, lower=0, upper=1))
+    for i in range(num_categorical):
+        cs.add_hyperparameter(
+            CS.CategoricalHyperparameter('c%i' % i, ['a', 'b', 'c']))
+    return cs
+
+
+def zero_cost(budget, **config):
+    return 0.
+
+
+def fixed_sleep(duration):
+    def sleep(budget, **config):
+        time.sleep(duration)
+        return 0.
+    return sleep
+
+
+def summarize(values):
+    """
+    Summary statistics (in seconds) of a list of measurements.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {}
+    return {'mean': float(np.mean(values)),
+            'median': float(np.median(values)),
+            'p90': float(np.percentile(values, 90)),
+            'max': float(np.max(values)),
+            'n': int(len(values))}
+
+
+def summarize_runs(runs):
+    """
+    Throughput and dispatch latencies derived from the time stamps of the
+    results of a run.
+    """
+    queued = [r.time_stamps['started'] - r.time_stamps['submitted']
+              for r in runs]
+    round_trip = [r.time_stamps['finished'] - r.time_stamps['started']
+                  for r in runs]
+    first_submit = min(r.time_stamps['submitted'] for r in runs)
+    last_finish = max(r.time_stamps['finished'] for r in runs)
+
+    return {'num_evaluations': len(runs),
+            'run_time': last_finish - first_submit,
+            'evaluations_per_second': len(runs) / (last_finish - first_submit),
+            'queue_latency': summarize(queued),
+            'round_trip_latency': summarize(round_trip)}
+
+
+def measure_startup(num_workers, repeats=3):
+    """
+    Time to start a nameserver, and for ``num_workers`` workers to be
+    discovered by a master.
+    """
+    ns_times, worker_times = [], []
+    cs = get_configspace()
+    for r in range(repeats):
+        run_id = 'overhead_startup_%i' % r
+        with tempfile.TemporaryDirectory() as working_directory:
+            start = time.time()
+            ns = hpns.NameServer(run_id=run_id,
+                                 working_directory=working_directory)
+            ns_host, ns_port = ns.start()
+            ns_times.append(time.time() - start)
+
+            opt = get_optimizer_class('bohb')(configspace=cs, run_id=run_id,
+                                              min_budget=1, max_budget=1,
+                                              host=ns_host,
+                                              nameserver=ns_host,
+                                              nameserver_port=ns_port)
+            start = time.time()
+            for i in range(num_workers):
+                worker = FMinWorker(func=zero_cost, func_args=(), id=i,
+                                    nameserver=ns_host,
+                                    nameserver_port=ns_port,
+                                    run_id=run_id)
+                worker.run(background=True)
+            opt.wait_for_workers(num_workers)
+            worker_times.append(time.time() - start)
+
+            opt.shutdown(shutdown_workers=True)
+            ns.shutdown()
+
+    return {'num_workers': num_workers,
+            'nameserver': summarize(ns_times),
+            'workers': summarize(worker_times)}
+
+
+def measure_fmin(func, num_workers, num_iterations=1, eta=3, min_budget=1,
+                 max_budget=27):
+    """
+    Runs fmin and derives throughput and dispatch latencies from the
+    time stamps of the results.
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.time()
+        _, _, result = fmin(func, get_configspace(), eta=eta,
+                            min_budget=min_budget, max_budget=max_budget,
+                            num_iterations=num_iterations,
+                            num_workers=num_workers, output_dir=output_dir)
+        wall_time = time.time() - start
+
+    return dict(num_workers=num_workers, wall_time=wall_time,
+                **summarize_runs(result.get_all_runs()))
+
+
+def measure_run_experiment(func, num_workers, num_iterations=1, eta=3,
+                           min_budget=1, max_budget=27,
+                           checkpoint_interval=0):
+    """
+    Like :func:`measure_fmin`, but with the master of the icml 2018
+    ``run_experiment.py`` entry point: the optimizer from its
+    ``get_optimizer``, checkpointing and the resumable result logger. The
+    hpolib benchmarks are replaced by ``func`` on local workers.
+
+    Args:
+        checkpoint_interval (float): seconds between two checkpoints. 0, the
+            default, writes one after every result, the worst case.
+    """
+    experiment_dir = str(Path(_repo_root) / 'examples' /
+                         'icml_2018_experiments' / 'scripts')
+    if experiment_dir not in sys.path:
+        sys.path.append(experiment_dir)
+    import run_experiment
+
+    parser = run_experiment.standard_parser_args(argparse.ArgumentParser())
+    args = parser.parse_args(['--exp_name', 'overhead', '--eta', str(eta)])
+    run_id = 'overhead_run_experiment'
+    with tempfile.TemporaryDirectory() as working_directory:
+        start = time.time()
+        ns = hpns.NameServer(run_id=run_id,
+                             working_directory=working_directory)
+        ns_host, ns_port = ns.start()
+        for i in range(num_workers):
+            worker = FMinWorker(func=func, func_args=(), id=i,
+                                nameserver=ns_host, nameserver_port=ns_port,
+                                run_id=run_id)
+            worker.run(background=True)
+
+        result_logger = ResumableResultLogger(directory=working_directory,
+                                              overwrite=True)
+        opt = run_experiment.get_optimizer(
+            args, get_configspace(), extensions=[CheckpointMaster],
+            working_directory=working_directory, run_id=run_id,
+            min_budget=min_budget, max_budget=max_budget, host=ns_host,
+            nameserver=ns_host, nameserver_port=ns_port,
+            result_logger=result_logger,
+            checkpoint_interval=checkpoint_interval)
+        try:
+            result = opt.run(n_iterations=num_iterations,
+                             min_n_workers=num_workers)
+        finally:
+            opt.shutdown(shutdown_workers=True)
+            ns.shutdown()
+        wall_time = time.time() - start
+
+    return dict(num_workers=num_workers, wall_time=wall_time,
+                **summarize_runs(result.get_all_runs()))
+
+
+def measure_sampling(history_sizes, repeats=10, budget=1., **cg_kwargs):
+    """
+    Time of the BOHB config generator for fitting its model and for sampling
+    a configuration, depending on the number of results it has seen.
+    ``cg_kwargs`` are passed to :class:`scripts.bounded_bohb.BoundedKDE`,
+    e.g. to limit its history.
+    """
+    cs = get_configspace()
+    cg = BoundedKDE(configspace=cs, **cg_kwargs)
+    rng = np.random.RandomState(1)
+    measurements = []
+    n_results = 0
+    for size in sorted(history_sizes):
+        while n_results < size:
+            config = cs.sample_configuration().get_dictionary()
+            job = Job((0, 0, n_results), config=config, budget=budget)
+            job.result = {'loss': float(rng.rand()), 'info': {}}
+            n_results += 1
+            cg.new_result(job, update_model=False)
+
+        start = time.time()
+        cg._fit(budget)
+        fit_time = time.time() - start
+
+        sample_times = []
+        for _ in range(repeats):
+            start = time.time()
+            cg.get_config(budget)
+            sample_times.append(time.time() - start)
+
+        measurements.append({'history_size': size,
+                             'fit': fit_time,
+                             'get_config': summarize(sample_times)})
+    return measurements
+
+
+def measure_logging(num_results=1000):
+    """
+    Time to log one sampled configuration and one result.
+    """
+    cs = get_configspace()
+    with tempfile.TemporaryDirectory() as directory:
+        logger = hpres.json_result_logger(directory=directory, overwrite=True)
+        config_times, result_times = [], []
+        for i in range(num_results):
+            config = cs.sample_configuration().get_dictionary()
+            job = Job((0, 0, i), config=config, budget=1.)
+            for t in ['submitted', 'started', 'finished']:
+                job.time_it(t)
+            job.result = {'loss': 0., 'info': {}}
+
+            start = time.time()
+            logger.new_config(job.id, config, {})
+            config_times.append(time.time() - start)
+
+            start = time.time()
+            logger(job)
+            result_times.append(time.time() - start)
+
+    return {'new_config': summarize(config_times),
+            'result': summarize(result_times)}
+
+
+def run_benchmarks(worker_counts=(1, 2, 4, 8, 16, 32, 64), sleep=0.1,
+                   history_sizes=(10, 100, 1000, 10000), num_iterations=1,
+                   max_history=None, vectorized_sampling=False):
+    """
+    Runs all benchmarks.
+
+    Args:
+        worker_counts (iterable): numbers of workers for the startup and
+            throughput benchmarks, through fmin and run_experiment.
+        sleep (float): duration of the fixed-sleep objective in seconds.
+        history_sizes (iterable): history sizes for the sampling benchmark.
+        num_iterations (int): iterations of the fmin runs.
+        max_history (int, optional): history limit of the config generator
+            in the sampling benchmark.
+        vectorized_sampling (bool): use vectorized candidate scoring in the
+            sampling benchmark.
+
+    Returns:
+        dict - the measurements
+    """
+    return {
+        'meta': {'timestamp': time.time(),
+                 'python': platform.python_version(),
+                 'hpbandster': getattr(hpbandster, '__version__', 'unknown'),
+                 'platform': platform.platform()},
+        'startup': [measure_startup(n) for n in worker_counts],
+        'zero_cost': [measure_fmin(zero_cost, n, num_iterations)
+                      for n in worker_counts],
+        'fixed_sleep': {'sleep': sleep,
+                        'runs': [measure_fmin(fixed_sleep(sleep), n,
+                                              num_iterations)
+                                 for n in worker_counts]},
+        'run_experiment': [measure_run_experiment(zero_cost, n,
+                                                  num_iterations)
+                           for n in worker_counts],
+        'sampling': measure_sampling(history_sizes, max_history=max_history,
+                                     vectorized_sampling=vectorized_sampling),
+        'logging': measure_logging(),
+    }
+
+
+def _flatten(d, prefix=''):
+    flat = {}
+    if isinstance(d, dict):
+        for k, v in d.items():
+            flat.update(_flatten(v, '%s%s/' % (prefix, k)))
+    elif isinstance(d, list):
+        for i, v in enumerate(d):
+            key = v.get('num_workers', v.get('history_size', i)) \
+                if isinstance(v, dict) else i
+            flat.update(_flatten(v, '%s%s/' % (prefix, key)))
+    elif isinstance(d, (int, float)):
+        flat[prefix.rstrip('/')] = d
+    return flat
+
+
+def compare(old, new, threshold=0.1):
+    """
+    Compares two benchmark results.
+
+    Args:
+        old (dict): results of the reference version.
+        new (dict): results of the new version.
+        threshold (float): relative change from which on a measurement is
+            reported.
+
+    Returns:
+        list of (str, float, float, float) - name, old value, new value and
+            relative change of every measurement that changed by more than
+            ``threshold``
+    """
+    old, new = _flatten(old), _flatten(new)
+    changes = []
+    for key in sorted(set(old) & set(new)):
+        if key.startswith('meta/') or old[key] == 0:
+            continue
+        change = (new[key] - old[key]) / abs(old[key])
+        if abs(change) > threshold:
+            changes.append((key, old[key], new[key], change))
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Overhead benchmarks of '
+                                                 'fmin and HpBandSter')
+    parser.add_argument('--output', help='Json file for the results',
+                        type=str, default='overhead.json')
+    parser.add_argument('--workers', help='Numbers of workers to benchmark',
+                        type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--sleep', help='Duration of the fixed-sleep '
+                                        'objective in seconds',
+                        type=float, default=0.1)
+    parser.add_argument('--history_sizes', help='History sizes for the '
+                                                'sampling benchmark',
+                        type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--num_iterations', help='Iterations per fmin run',
+                        type=int, default=1)
+    parser.add_argument('--max_history', help='History limit of the config '
+                                              'generator',
+                        type=int, default=None)
+    parser.add_argument('--vectorized_sampling', help='Score all candidates '
+                                                      'at once',
+                        action='store_true')
+    parser.add_argument('--compare', help='Json file of a previous run to '
+                                          'compare against',
+                        type=str, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    results = run_benchmarks(worker_counts=args.workers, sleep=args.sleep,
+                             history_sizes=args.history_sizes,
+                             num_iterations=args.num_iterations,
+                             max_history=args.max_history,
+                             vectorized_sampling=args.vectorized_sampling)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results are stored to {}'.format(args.output))
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        for key, old_value, new_value, change in compare(previous, results):
+            print('{:60s} {:12.6f} -> {:12.6f} ({:+.1%})'.format(
+                key, old_value, new_value, change))
@@ -0,0 +1,83 @@
+"""
+Reuse of initialized benchmark objects across evaluations.
+
+Creating a benchmark can be expensive, e.g. the cartpole benchmark sets up the
+gym environment, its configuration space and the TensorFlow random state. A
+:class:`BenchmarkPool` creates benchmarks once per worker, hands them out for
+one evaluation at a time and resets their state before they are reused. The
+time spent on getting a ready-to-use benchmark is reported separately, so it
+is not mixed up with the cost of the evaluation itself.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BenchmarkPool(object):
+    """
+    Pool of initialized benchmark objects.
+
+    Example::
+        pool = BenchmarkPool(lambda: cartpole.CartpoleReduced(rng=1),
+                             reset=reset_cartpole)
+
+        with pool.lease() as (b, setup_time):
+            res = b.objective_function(configuration=config, budget=budget)
+
+    Args:
+        factory (callable): creates a new benchmark object. Called without
+            arguments whenever no idle benchmark is available.
+        reset (callable, optional): called with a benchmark before it is
+            reused. Should bring the benchmark into the state of a freshly
+            created one, e.g. by reseeding its random number generators.
+    """
+
+    def __init__(self, factory, reset=None):
+        self.factory = factory
+        self.reset = reset
+        self.num_created = 0
+        self.num_reused = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a benchmark out of the pool, creating one if none is idle.
+
+        Returns:
+            benchmark object - ready to be evaluated
+            float - setup time in seconds (creation or reset)
+        """
+        start = time.time()
+        with self._lock:
+            benchmark = self._idle.pop() if self._idle else None
+
+        if benchmark is None:
+            benchmark = self.factory()
+            self.num_created += 1
+        else:
+            if self.reset is not None:
+                self.reset(benchmark)
+            self.num_reused += 1
+
+        return benchmark, time.time() - start
+
+    def release(self, benchmark):
+        """
+        Puts a benchmark back into the pool for later evaluations.
+        """
+        with self._lock:
+            self._idle.append(benchmark)
+
+    @contextmanager
+    def lease(self):
+        """
+        Context manager around :meth:`acquire` and :meth:`release`.
+
+        If the evaluation raises, the benchmark is discarded instead of being
+        returned to the pool, since its state is unknown.
+        """
+        benchmark, setup_time = self.acquire()
+        yield benchmark, setup_time
+        self.release(benchmark)
@@ -0,0 +1,294 @@
+"""
+BOHB with a bounded history for its kernel density estimators.
+
+The config generator of BOHB refits its KDEs on all results of a budget after
+every result, and scores each of its candidates against all of them. In long
+runs both grow linearly with the number of evaluations, until the master
+can't keep many cheap workers busy anymore. :class:`BoundedKDE` caps the
+observations kept per budget, scores all candidates of a ``get_config`` call at
+once with numpy instead of one at a time, and records how long each call took.
+The summary of these times is stored in ``HB_config['sampling']`` of the
+result.
+
+:class:`BoundedBOHB` is the BOHB master using this config generator. With the
+default arguments it samples like the original BOHB.
+"""
+
+import time
+import traceback
+
+import numpy as np
+import scipy.stats as sps
+import statsmodels.api as sm
+from hpbandster.optimizers import BOHB
+from hpbandster.optimizers.config_generators.bohb import BOHB as CG_BOHB
+
+from scripts.batch_sampling import BatchSampler
+
+
+HISTORY_SUBSAMPLING = ('recency', 'quality')
+
+
+def kde_pdf(kde, points, vartypes):
+    """
+    Density of a statsmodels ``KDEMultivariate`` at many points at once.
+
+    Uses the same kernels as statsmodels for BOHB's variable types (gaussian
+    for continuous, Aitchison-Aitken for categorical parameters), but
+    evaluates all points in one go. Unlike statsmodels, a categorical
+    parameter with a single value in the data doesn't make the density
+    infinite.
+
+    Args:
+        kde (statsmodels.nonparametric.KDEMultivariate): the fitted KDE.
+        points (np.ndarray): points of shape (n_points, n_dims).
+        vartypes (np.ndarray): 0 for continuous parameters, the number of
+            choices for categorical ones.
+
+    Returns:
+        np.ndarray - the density at each of the points
+    """
+    data = kde.data
+    kernel = np.ones((points.shape[0], data.shape[0]))
+    for j, t in enumerate(vartypes):
+        bw = kde.bw[j]
+        diff = points[:, j, None] - data[None, :, j]
+        if t == 0:
+            kernel *= np.exp(-0.5 * (diff / bw) ** 2) / (np.sqrt(2 * np.pi) * bw)
+        else:
+            num_levels = max(np.unique(data[:, j]).size - 1, 1)
+            kernel *= np.where(diff == 0, 1 - bw, bw / num_levels)
+    return kernel.mean(axis=1)
+
+
+class BoundedKDE(CG_BOHB):
+    """
+    BOHB config generator with a bounded history per budget.
+
+    Args:
+        configspace (ConfigSpace.ConfigurationSpace): the search space.
+        max_history (int, optional): maximum number of observations kept per
+            budget. Unbounded if None (default).
+        history_subsampling (str, optional): which observations are dropped
+            once there are more than ``max_history``. 'recency' (default)
+            drops the oldest ones. 'quality' always keeps the best
+            ``top_n_percent`` and drops the oldest of the others.
+        vectorized_sampling (bool, optional): if True, the candidates of a
+            ``get_config`` call are drawn and scored as one array instead of
+            one after the other, and random configurations are drawn in
+            batches by a :class:`scripts.batch_sampling.BatchSampler`.
+        **kwargs: passed on to the BOHB config generator.
+    """
+
+    def __init__(self, configspace, max_history=None,
+                 history_subsampling='recency', vectorized_sampling=False,
+                 **kwargs):
+        super(BoundedKDE, self).__init__(configspace=configspace, **kwargs)
+        if history_subsampling not in HISTORY_SUBSAMPLING:
+            raise ValueError('Unknown history subsampling %s, choose from %s'
+                             % (history_subsampling, HISTORY_SUBSAMPLING))
+        if max_history is not None and max_history <= self.min_points_in_model:
+            raise ValueError('max_history must be larger than '
+                             'min_points_in_model (%i)'
+                             % self.min_points_in_model)
+        self.max_history = max_history
+        self.history_subsampling = history_subsampling
+        self.vectorized_sampling = vectorized_sampling
+        self.batch_sampler = (BatchSampler(configspace)
+                              if vectorized_sampling else None)
+
+        # (duration of the call in seconds, observations of the sampled model)
+        self.sampling_times = []
+        self.fitting_times = []
+
+    def get_config(self, budget):
+        start = time.time()
+        if not self.vectorized_sampling:
+            sample, info_dict = super(BoundedKDE, self).get_config(budget)
+        elif len(self.kde_models) == 0 \
+                or np.random.rand() < self.random_fraction:
+            # the random branch of CG_BOHB.get_config. Deciding here once
+            # keeps the fraction of random configurations at random_fraction.
+            sample = self.batch_sampler.sample()
+            info_dict = {'model_based_pick': False}
+        else:
+            sample, info_dict = self._sample_vectorized()
+        duration = time.time() - start
+
+        model_budget = self.largest_budget_with_model()
+        num_observations = len(self.losses.get(model_budget, []))
+        self.sampling_times.append((duration, num_observations))
+        info_dict['sampling_time'] = duration
+        return sample, info_dict
+
+    def _sample_vectorized(self):
+        info_dict = {}
+        try:
+            budget = self.largest_budget_with_model()
+            kde_good = self.kde_models[budget]['good']
+            kde_bad = self.kde_models[budget]['bad']
+
+            data = kde_good.data
+            idx = np.random.randint(0, len(data), size=self.num_samples)
+            means = data[idx]
+            bw = np.maximum(kde_good.bw, self.min_bandwidth)
+
+            candidates = np.empty_like(means)
+            for j, t in enumerate(self.vartypes):
+                m = means[:, j]
+                if t == 0:
+                    scale = self.bw_factor * bw[j]
+                    candidates[:, j] = sps.truncnorm.rvs(
+                        -m / scale, (1 - m) / scale, loc=m, scale=scale)
+                else:
+                    keep = np.random.rand(self.num_samples) < (1 - bw[j])
+                    candidates[:, j] = np.where(
+                        keep, m, np.random.randint(t, size=self.num_samples))
+
+            l = kde_pdf(kde_good, candidates, self.vartypes)
+            g = kde_pdf(kde_bad, candidates, self.vartypes)
+            scores = np.maximum(g, 1e-32) / np.maximum(l, 1e-32)
+            scores[~np.isfinite(scores)] = np.inf
+            best = int(np.argmin(scores))
+            if not np.isfinite(scores[best]):
+                raise ValueError('No candidate with a finite score')
+
+            vector = candidates[best]
+            vector[self.vartypes > 0] = np.rint(vector[self.vartypes > 0])
+            vector = self.batch_sampler.deactivate(vector[None])[0]
+            sample = self.batch_sampler.to_dict(vector)
+            info_dict['model_based_pick'] = True
+        except Exception:
+            self.logger.warning('Sampling based optimization with %i samples '
+                                'failed\n %s \nUsing random configuration'
+                                % (self.num_samples, traceback.format_exc()))
+            sample = self.batch_sampler.sample()
+            info_dict['model_based_pick'] = False
+        return sample, info_dict
+
+    def new_result(self, job, update_model=True):
+        budget = job.kwargs['budget']
+        num_observations = len(self.losses.get(budget, []))
+
+        # Registers the result, but doesn't fit yet, so the history can be
+        # trimmed first.
+        super(BoundedKDE, self).new_result(job, update_model=False)
+        if len(self.losses[budget]) == num_observations:
+            # the result was skipped, since a larger budget has a model
+            return
+
+        if self.max_history is not None:
+            self._trim_history(budget)
+
+        if update_model:
+            start = time.time()
+            self._fit(budget)
+            self.fitting_times.append((time.time() - start,
+                                       len(self.losses[budget])))
+
+    def _trim_history(self, budget):
+        configs, losses = self.configs[budget], self.losses[budget]
+        while len(losses) > self.max_history:
+            if self.history_subsampling == 'recency':
+                drop = 0
+            else:
+                n_keep = max(self.min_points_in_model,
+                             (self.top_n_percent * self.max_history) // 100)
+                best = set(np.argsort(losses, kind='stable')[:n_keep])
+                # the oldest observation that is not among the best ones
+                drop = next(i for i in range(len(losses)) if i not in best)
+            del configs[drop]
+            del losses[drop]
+
+    def _fit(self, budget):
+        # Same as the model fitting in ``CG_BOHB.new_result``
+        if len(self.configs[budget]) <= self.min_points_in_model - 1:
+            return
+
+        train_configs = np.array(self.configs[budget])
+        train_losses = np.array(self.losses[budget])
+
+        n_good = max(self.min_points_in_model,
+                     (self.top_n_percent * train_configs.shape[0]) // 100)
+        n_bad = max(self.min_points_in_model,
+                    ((100 - self.top_n_percent) * train_configs.shape[0]) // 100)
+
+        idx = np.argsort(train_losses)
+        train_data_good = self.impute_conditional_data(
+            train_configs[idx[:n_good]])
+        train_data_bad = self.impute_conditional_data(
+            train_configs[idx[n_good:n_good + n_bad]])
+
+        if train_data_good.shape[0] <= train_data_good.shape[1]:
+            return
+        if train_data_bad.shape[0] <= train_data_bad.shape[1]:
+            return
+
+        bad_kde = sm.nonparametric.KDEMultivariate(
+            data=train_data_bad, var_type=self.kde_vartypes,
+            bw='normal_reference')
+        good_kde = sm.nonparametric.KDEMultivariate(
+            data=train_data_good, var_type=self.kde_vartypes,
+            bw='normal_reference')
+
+        bad_kde.bw = np.clip(bad_kde.bw, self.min_bandwidth, None)
+        good_kde.bw = np.clip(good_kde.bw, self.min_bandwidth, None)
+
+        self.kde_models[budget] = {'good': good_kde, 'bad': bad_kde}
+
+    def timing_summary(self):
+        """
+        Mean and maximum duration of ``get_config`` and of the model fits.
+
+        Returns:
+            dict - 'get_config' and 'fit', each with 'n', 'mean' and 'max' in
+                seconds
+        """
+        summary = {}
+        for name, times in [('get_config', self.sampling_times),
+                            ('fit', self.fitting_times)]:
+            durations = [t for t, _ in times]
+            summary[name] = {'n': len(durations),
+                             'mean': float(np.mean(durations)) if durations else 0.,
+                             'max': float(np.max(durations)) if durations else 0.}
+        return summary
+
+
+class BoundedBOHB(BOHB):
+    """
+    BOHB using the :class:`BoundedKDE` config generator.
+
+    Args:
+        max_history (int, optional): see :class:`BoundedKDE`.
+        history_subsampling (str, optional): see :class:`BoundedKDE`.
+        vectorized_sampling (bool, optional): see :class:`BoundedKDE`.
+        **kwargs: passed on to ``hpbandster.optimizers.BOHB``.
+    """
+
+    def __init__(self, configspace=None, max_history=None,
+                 history_subsampling='recency', vectorized_sampling=False,
+                 **kwargs):
+        super(BoundedBOHB, self).__init__(configspace=configspace, **kwargs)
+
+        cg = self.config_generator
+        self.config_generator = BoundedKDE(
+            configspace=configspace,
+            max_history=max_history,
+            history_subsampling=history_subsampling,
+            vectorized_sampling=vectorized_sampling,
+            min_points_in_model=self.config['min_points_in_model'],
+            top_n_percent=cg.top_n_percent,
+            num_samples=cg.num_samples,
+            random_fraction=cg.random_fraction,
+            bandwidth_factor=cg.bw_factor,
+            min_bandwidth=cg.min_bandwidth)
+
+        self.config.update({'max_history': max_history,
+                            'history_subsampling': history_subsampling,
+                            'vectorized_sampling': vectorized_sampling})
+
+    def run(self, *args, **kwargs):
+        result = super(BoundedBOHB, self).run(*args, **kwargs)
+        # how long sampling and fitting took, stored with the run
+        result.HB_config['sampling'] = self.config_generator.timing_summary()
+        return result
@@ -0,0 +1,324 @@
+"""
+Checkpoints of the master, to resume a run after it was interrupted.
+
+The master keeps the state of a run in memory until ``opt.run`` returns. If
+its job is preempted or runs into the time limit, the run is lost, although
+the results were already logged. The :class:`CheckpointMaster` mixin
+periodically writes the state of the master to the working directory:
+
+- the iterations, i.e. the sampled configurations, their results and the
+  stage of successive halving they are in
+- the state of the config generator, e.g. BOHB's observations and KDEs
+- the state of the random number generators
+
+A master created with ``resume=True`` continues from the checkpoint. The
+configurations that were sampled after the last checkpoint are read back from
+``configs.json`` and added to their iterations under their config_id again.
+Whenever the master is about to dispatch an evaluation whose result was
+logged to ``results.json`` after the checkpoint, it registers the logged
+result instead. So only the evaluations that didn't finish are run again.
+The result logger must not truncate the existing files in that case, see
+:class:`ResumableResultLogger`.
+"""
+
+import copy
+import json
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+import hpbandster.core.result as hpres
+from hpbandster.core.dispatcher import Job
+
+
+def checkpoint_path(working_directory, run_id):
+    """
+    File of the master checkpoint of the run ``run_id``.
+    """
+    return os.path.join(str(working_directory),
+                        'HPB_run_%s_checkpoint.pkl' % run_id)
+
+
+class ResumableResultLogger(hpres.json_result_logger):
+    """
+    json result logger, that can append to the files of an interrupted run.
+
+    Args:
+        directory (str): directory of 'configs.json' and 'results.json'.
+        overwrite (bool): see ``hpbandster.core.result.json_result_logger``.
+        resume (bool): if True, existing files are kept. The
+            :class:`CheckpointMaster` rewrites them when it resumes, and
+            truncates them if there is no checkpoint to resume from.
+    """
+
+    def __init__(self, directory, overwrite=False, resume=False):
+        if not resume:
+            super(ResumableResultLogger, self).__init__(directory, overwrite)
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.config_fn = os.path.join(directory, 'configs.json')
+        self.results_fn = os.path.join(directory, 'results.json')
+        for fn in [self.config_fn, self.results_fn]:
+            open(fn, 'a').close()
+        self.config_ids = set()
+
+
+class CheckpointMaster(object):
+    """
+    Master mixin that writes checkpoints and resumes from them.
+
+    Args:
+        checkpoint_interval (float, optional): minimum time in seconds
+            between two checkpoints. A checkpoint is written after a result
+            came in, once this much time has passed since the last one.
+            0 writes one after every result. Default: 300.
+        resume (bool, optional): continue from the checkpoint of this run in
+            the working directory. Without a checkpoint, the run starts from
+            scratch and the files of the result logger are truncated.
+    """
+
+    def __init__(self, *args, checkpoint_interval=300, resume=False,
+                 **kwargs):
+        super(CheckpointMaster, self).__init__(*args, **kwargs)
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_file = checkpoint_path(self.working_directory,
+                                               kwargs.get('run_id'))
+        self.last_checkpoint = time.time()
+        # checkpoints are written by the master and the dispatcher thread
+        self.checkpoint_lock = threading.Lock()
+        # (config_id, budget) -> logged result, registered instead of
+        # dispatching the job again
+        self.logged_results = {}
+
+        self.resume = resume
+        self.resume_state = None
+        if resume and os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, 'rb') as f:
+                self.resume_state = pickle.load(f)
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        if self.resume_state is not None:
+            iteration_kwargs = dict(iteration_kwargs)
+            iteration_kwargs['result_logger'] = self.result_logger
+            self._restore(self.resume_state, iteration_kwargs)
+            self.resume_state = None
+            n_iterations -= len(self.iterations)
+        elif self.resume:
+            # nothing to resume, the logged entries would be duplicated
+            self.logger.info('CHECKPOINT: no checkpoint in %s, starting from '
+                             'scratch' % self.working_directory)
+            self._prune_logged_results()
+        self.resume = False
+
+        result = super(CheckpointMaster, self).run(
+            n_iterations=max(n_iterations, 0), min_n_workers=min_n_workers,
+            iteration_kwargs=iteration_kwargs)
+        self.checkpoint()
+        return result
+
+    def job_callback(self, job):
+        super(CheckpointMaster, self).job_callback(job)
+        if time.time() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def _submit_job(self, config_id, config, budget):
+        entry = self.logged_results.pop((config_id, budget), None)
+        if entry is None:
+            super(CheckpointMaster, self)._submit_job(config_id, config,
+                                                      budget)
+            return
+        # finished after the checkpoint, its result is registered instead
+        job = Job(config_id, config=config, budget=budget,
+                  working_directory=self.working_directory)
+        job.timestamps, job.result, job.exception = entry
+        with self.thread_cond:
+            self.num_running_jobs += 1
+        self.job_callback(job)
+
+    def checkpoint(self):
+        """
+        Writes the current state of the master to the checkpoint file.
+        """
+        # Held until the file is replaced, so two threads checkpointing at
+        # once don't share a temporary file or replace a newer checkpoint
+        # with an older one.
+        with self.checkpoint_lock:
+            with self.thread_cond:
+                iterations = [{'HPB_iter': it.HPB_iter,
+                               'data': copy.deepcopy(it.data),
+                               'stage': it.stage,
+                               'num_configs': list(it.num_configs),
+                               'actual_num_configs':
+                                   list(it.actual_num_configs),
+                               'is_finished': it.is_finished,
+                               'early': self._finished_early_jobs(it),
+                               'num_early_promotions':
+                                   getattr(it, 'num_early_promotions', 0)}
+                              for it in self.iterations]
+                cg_state = {k: v for k, v
+                            in self.config_generator.__dict__.items()
+                            if k != 'logger'}
+                state = pickle.dumps({'time_ref': self.time_ref,
+                                      'iterations': iterations,
+                                      'config_generator': cg_state,
+                                      'np_random': np.random.get_state(),
+                                      'random': random.getstate()})
+                self.last_checkpoint = time.time()
+
+            # A logger that writes in batches, like scripts.spool, has to
+            # contain the results of the checkpoint first
+            flush = getattr(self.result_logger, 'flush', None)
+            if flush is not None:
+                flush()
+
+            # written to a temporary file first, so an interruption while
+            # writing doesn't destroy the previous checkpoint
+            fd, tmp_file = tempfile.mkstemp(
+                dir=os.path.dirname(self.checkpoint_file),
+                prefix=os.path.basename(self.checkpoint_file), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(state)
+                os.replace(tmp_file, self.checkpoint_file)
+            except BaseException:
+                os.remove(tmp_file)
+                raise
+        self.logger.debug('CHECKPOINT: written to %s' % self.checkpoint_file)
+
+    def _restore(self, state, iteration_kwargs):
+        self.time_ref = state['time_ref']
+        self.config['time_ref'] = self.time_ref
+        self.config_generator.__dict__.update(state['config_generator'])
+        np.random.set_state(state['np_random'])
+        random.setstate(state['random'])
+
+        for saved in state['iterations']:
+            it = self.get_next_iteration(saved['HPB_iter'], iteration_kwargs)
+            it.data = saved['data']
+            it.stage = saved['stage']
+            # e.g. reduced by scripts.prefilter
+            it.num_configs = saved.get('num_configs', it.num_configs)
+            it.actual_num_configs = saved['actual_num_configs']
+            it.is_finished = saved['is_finished']
+            it.num_running = 0
+            if hasattr(it, 'early'):
+                # the running early promotions are started again
+                it.early = dict(saved.get('early', {}))
+                it.num_early_promotions = saved.get('num_early_promotions', 0)
+            self.iterations.append(it)
+
+            for datum in it.data.values():
+                if datum.status == 'RUNNING':
+                    # dispatched again, or replayed if it finished
+                    datum.status = 'QUEUED'
+
+        # The logs are rewritten to the state of the checkpoint. The entries
+        # after it are logged again as they are added and replayed.
+        logged_configs = self._read_logged_configs()
+        self.logged_results = self._read_logged_results()
+        self._prune_logged_results()
+
+        num_added = 0
+        for config_id in sorted(logged_configs):
+            iteration = config_id[0]
+            while len(self.iterations) <= iteration:
+                # started after the checkpoint
+                self.iterations.append(self.get_next_iteration(
+                    len(self.iterations), iteration_kwargs))
+            it = self.iterations[iteration]
+            if config_id in it.data or it.is_finished or \
+                    config_id != (it.HPB_iter, it.stage,
+                                  it.actual_num_configs[it.stage]):
+                continue
+            it.add_configuration(*logged_configs[config_id])
+            num_added += 1
+
+        self.logger.info('CHECKPOINT: resumed %i iterations, added %i '
+                         'configurations and %i results from the log'
+                         % (len(self.iterations), num_added,
+                            len(self.logged_results)))
+
+    @staticmethod
+    def _finished_early_jobs(it):
+        # finished jobs of the early promotions of scripts.packing, which
+        # the iteration registers once their rung is complete
+        return {k: copy.deepcopy(job)
+                for k, job in getattr(it, 'early', {}).items()
+                if job is not None}
+
+    def _checkpointed_results(self):
+        # (config_id, budget) of the results in the checkpoint
+        results = set()
+        for it in self.iterations:
+            for config_id, datum in it.data.items():
+                results.update((config_id, b) for b in datum.results)
+            results.update((k, job.kwargs['budget'])
+                           for k, job in self._finished_early_jobs(it).items())
+        return results
+
+    def _read_logged_configs(self):
+        # config_id -> (config, config_info) of the configurations, that
+        # were sampled after the checkpoint
+        sampled = set()
+        for it in self.iterations:
+            sampled.update(it.data)
+        logged = {}
+        for entry in self._read_log('config_fn'):
+            config_id = tuple(entry[0])
+            if config_id not in sampled:
+                logged[config_id] = (entry[1], entry[2])
+        return logged
+
+    def _read_logged_results(self):
+        # (config_id, budget) -> (timestamps, result, exception) of the
+        # results, that were logged after the checkpoint
+        checkpointed = self._checkpointed_results()
+        logged = {}
+        for config_id, budget, timestamps, result, exception \
+                in self._read_log('results_fn'):
+            if (tuple(config_id), budget) not in checkpointed:
+                logged[(tuple(config_id), budget)] = (timestamps, result,
+                                                      exception)
+        return logged
+
+    def _read_log(self, name):
+        fn = getattr(self.result_logger, name, None)
+        if fn is None or not os.path.exists(fn):
+            return []
+        entries = []
+        with open(fn) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # the last line may be incomplete
+                    continue
+        return entries
+
+    def _prune_logged_results(self):
+        # Drops the configurations and results, that were logged after the
+        # checkpoint. They are logged again when they are added back.
+        if not isinstance(self.result_logger, hpres.json_result_logger):
+            return
+        data = {}
+        for it in self.iterations:
+            data.update(it.data)
+
+        checkpointed = self._checkpointed_results()
+        configs = [entry for entry in self._read_log('config_fn')
+                   if tuple(entry[0]) in data]
+        results = [entry for entry in self._read_log('results_fn')
+                   if (tuple(entry[0]), entry[1]) in checkpointed]
+
+        for fn, entries in [(self.result_logger.config_fn, configs),
+                            (self.result_logger.results_fn, results)]:
+            with open(fn + '.tmp', 'w') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry))
+                    f.write('\n')
+            os.replace(fn + '.tmp', fn)
+        self.result_logger.config_ids = set(tuple(c[0]) for c in configs)
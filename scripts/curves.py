@@ -0,0 +1,165 @@
+"""
+Results for several budgets from one learning curve.
+
+Many evaluations give their loss on every lower budget for free: an MLP
+trained for 27 epochs had a validation loss after 1, 3 and 9 epochs, and
+the ParamNet surrogates predict the whole learning curve in one call.
+HpBandSter only records the loss on the requested budget.
+
+Workers return the learning curve as ``[[budget, loss], ...]`` in the info
+of a result, under ``'learning_curve'``. The :class:`CurveMaster` mixin
+then
+
+- records the losses on all lower rungs of the run for the configuration,
+  e.g. for a configuration that started on a larger budget in a HyperBand
+  bracket. They are logged and fed to BOHB's models like any other result,
+  with the budget of the evaluation as ``'learning_curve_of'`` in their info.
+- keeps the curves of all configurations. An evaluation on a budget that an
+  earlier curve of the same configuration covered, e.g. of a configuration
+  BOHB sampled again in a later iteration, is registered from the curve
+  instead of being run.
+
+Only the rung budgets of the run are recorded. The curve has to contain
+them, e.g. budgets that are whole epochs.
+"""
+
+import time
+
+import numpy as np
+from hpbandster.core.dispatcher import Job
+
+
+# info key of the learning curve returned by the workers
+LEARNING_CURVE = 'learning_curve'
+# info key of the results taken from a learning curve
+FROM_CURVE = 'learning_curve_of'
+
+
+def hyperband_budgets(min_budget, max_budget, eta):
+    """
+    The rung budgets of HpBandSter's HyperBand and BOHB.
+
+    Returns:
+        numpy.ndarray - the budgets in increasing order
+    """
+    max_sh_iter = -int(np.log(min_budget / max_budget) / np.log(eta)) + 1
+    return max_budget * np.power(eta, -np.linspace(max_sh_iter - 1, 0,
+                                                   max_sh_iter))
+
+
+def get_learning_curve(result):
+    """
+    The learning curve in a result returned by a worker.
+
+    Returns:
+        dict - budget -> loss, empty if the result has no learning curve
+    """
+    if result is None or not isinstance(result.get('info'), dict):
+        return {}
+    return {float(b): loss
+            for b, loss in result['info'].get(LEARNING_CURVE) or []}
+
+
+def is_from_curve(result):
+    """
+    Whether a result was taken from the learning curve of another
+    evaluation, instead of being evaluated.
+    """
+    return result is not None and isinstance(result.get('info'), dict) \
+        and FROM_CURVE in result['info']
+
+
+def config_key(config):
+    # configurations sampled twice are equal dicts
+    return tuple(sorted(config.items()))
+
+
+class CurveMaster(object):
+    """
+    Master mixin that records the learning curves returned by the workers
+    on all rungs.
+
+    The number of results recorded from curves on lower rungs and of the
+    evaluations that were registered from an earlier curve are stored as
+    'learning_curves' in the config of the result.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CurveMaster, self).__init__(*args, **kwargs)
+        # config key -> rung budget -> (loss, budget of the evaluation)
+        self.curves = {}
+        self.num_filled = 0
+        self.num_cached = 0
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        result = super(CurveMaster, self).run(
+            n_iterations=n_iterations, min_n_workers=min_n_workers,
+            iteration_kwargs=iteration_kwargs)
+        result.HB_config['learning_curves'] = {'num_filled': self.num_filled,
+                                               'num_cached': self.num_cached}
+        return result
+
+    def _rung_losses(self, curve):
+        # the losses of the curve on the rung budgets of the run
+        losses = {}
+        for budget in self.budgets:
+            matches = [b for b in curve if np.isclose(b, budget)]
+            if matches:
+                losses[float(budget)] = curve[matches[0]]
+        return losses
+
+    def job_callback(self, job):
+        budget = job.kwargs['budget']
+        losses = self._rung_losses(get_learning_curve(job.result))
+        if losses:
+            with self.thread_cond:
+                cached = self.curves.setdefault(
+                    config_key(job.kwargs['config']), {})
+                for b, loss in losses.items():
+                    cached.setdefault(b, (loss, budget))
+        super(CurveMaster, self).job_callback(job)
+        if losses:
+            with self.thread_cond:
+                self._fill_lower_rungs(job, losses)
+
+    def _fill_lower_rungs(self, job, losses):
+        budget = job.kwargs['budget']
+        datum = self.iterations[job.id[0]].data[job.id]
+        for b, loss in sorted(losses.items()):
+            if b >= budget or b in datum.results:
+                continue
+            filled = Job(job.id, config=job.kwargs['config'], budget=b,
+                         working_directory=self.working_directory)
+            filled.timestamps = dict(job.timestamps)
+            filled.result = {'loss': loss, 'info': {FROM_CURVE: budget}}
+            datum.results[b] = filled.result
+            datum.time_stamps[b] = filled.timestamps
+            if self.result_logger is not None:
+                self.result_logger(filled)
+            self.config_generator.new_result(filled)
+            self.num_filled += 1
+
+    def _submit_job(self, config_id, config, budget):
+        with self.thread_cond:
+            loss, curve_budget = self.curves.get(config_key(config), {}).get(
+                float(budget), (None, None))
+            if loss is None:
+                super(CurveMaster, self)._submit_job(config_id, config, budget)
+                return
+            # an earlier evaluation of the configuration covered the budget
+            job = Job(config_id, config=config, budget=budget,
+                      working_directory=self.working_directory)
+            now = time.time()
+            job.timestamps = {'submitted': now, 'started': now,
+                              'finished': now}
+            # with the curve up to the budget, so the lower rungs are filled
+            curve = [[b, l] for b, (l, _) in sorted(
+                self.curves[config_key(config)].items()) if b <= budget]
+            job.result = {'loss': loss, 'info': {FROM_CURVE: curve_budget,
+                                                 LEARNING_CURVE: curve}}
+            self.num_running_jobs += 1
+            self.num_cached += 1
+            self.logger.debug('CURVES: %s on budget %f taken from the curve '
+                              'on budget %f' % (config_id, budget,
+                                                curve_budget))
+        self.job_callback(job)
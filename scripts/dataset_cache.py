@@ -0,0 +1,119 @@
+"""
+Node-local cache of preprocessed datasets.
+
+Workers that load and preprocess the same data in every process (the BNN
+benchmarks, the MLP on digits example) pay for it at every start and keep one
+copy per process in memory. The :class:`DatasetCache` runs the loading and
+preprocessing once per node and stores the resulting arrays as ``.npy`` files,
+keyed by the dataset name and the preprocessing parameters. Every further
+process attaches to these files as read-only memory maps, so the data is
+shared through the page cache instead of being copied.
+"""
+
+import getpass
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def default_cache_dir():
+    """
+    Directory of the cache if none is given.
+
+    Uses ``$BOAH_DATASET_CACHE`` if set, otherwise a directory of the user in
+    the temporary directory of the node. The cache is meant to live on
+    node-local storage, not on a shared filesystem.
+    """
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        user = str(os.getuid()) if hasattr(os, 'getuid') else 'default'
+    return os.environ.get('BOAH_DATASET_CACHE',
+                          os.path.join(tempfile.gettempdir(),
+                                       'boah_dataset_cache-%s' % user))
+
+
+class DatasetCache(object):
+    """
+    Stores preprocessed datasets as memory-mappable ``.npy`` files.
+
+    Example::
+        def load(split):
+            ...
+            return {'train_x': train_x, 'train_y': train_y}
+
+        cache = DatasetCache()
+        data = cache.get('digits', load, split=0.5)
+        data['train_x']  # np.memmap, opened read-only
+
+    Args:
+        directory (str, optional): where the datasets are stored. Defaults to
+            :func:`default_cache_dir`.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory if directory is not None \
+            else default_cache_dir()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name, params):
+        """
+        Directory of the dataset ``name`` preprocessed with ``params``.
+        """
+        key = json.dumps([name, params], sort_keys=True, default=str)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.directory, '%s-%s' % (name, digest))
+
+    def get(self, name, loader, **params):
+        """
+        Returns the arrays of a dataset, preprocessing it if it isn't cached.
+
+        Args:
+            name (str): name of the dataset.
+            loader (callable): called as ``loader(**params)`` if the dataset is
+                not cached yet. Must return a dict mapping array names to
+                numpy arrays.
+            **params: preprocessing parameters. Together with ``name`` they
+                form the key of the cache entry. Must be json-serializable.
+
+        Returns:
+            dict - array name -> read-only ``np.memmap``
+        """
+        path = self.path(name, params)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            self._store(path, name, params, loader(**params))
+        return self._attach(path)
+
+    def _store(self, path, name, params, arrays):
+        # Write into a temporary directory and rename it afterwards. The
+        # rename is atomic, so other processes either see the complete entry
+        # or none at all. If another process was faster, its entry is kept.
+        tmp_path = None
+        try:
+            tmp_path = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+            for array_name, array in arrays.items():
+                np.save(os.path.join(tmp_path, array_name + '.npy'),
+                        np.ascontiguousarray(array))
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump({'name': name,
+                           'params': params,
+                           'arrays': list(arrays.keys())},
+                          f, default=str)
+            os.rename(tmp_path, path)
+        except OSError:
+            if not os.path.exists(os.path.join(path, 'meta.json')):
+                raise
+        finally:
+            if tmp_path is not None:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _attach(self, path):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        return {array_name: np.load(os.path.join(path, array_name + '.npy'),
+                                    mmap_mode='r')
+                for array_name in meta['arrays']}
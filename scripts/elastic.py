@@ -0,0 +1,137 @@
+"""
+Elastic worker pools.
+
+HpBandSter's master waits until ``min_n_workers`` workers are up before it
+dispatches anything. On a shared cluster, where the workers are e.g. SLURM
+array tasks starting minutes apart, the first workers idle until the last one
+arrived. The :class:`ElasticMaster` mixin starts dispatching as soon as the
+first worker is there. Its queue grows and shrinks with the pool, as workers
+join or leave. Jobs of workers that left in the middle of an evaluation are
+dispatched again instead of being logged as crashed.
+
+For every worker the master records when it joined and left, how long it was
+busy and how many jobs it ran. The statistics are written to ``workers.json``
+and added to the config of the returned result.
+"""
+
+import json
+import threading
+import time
+
+
+# Set by HpBandSter's dispatcher for the job of a worker that disappeared
+LOST_JOB_EXCEPTION = 'Worker died unexpectedly.'
+
+
+class ElasticMaster(object):
+    """
+    Master mixin that runs with however many workers are available.
+
+    Args:
+        worker_log (str, optional): json file the worker statistics are
+            written to at the end of the run.
+        max_redispatches (int, optional): how often the job of a worker that
+            left is dispatched again, before it is logged as crashed. Guards
+            against configurations that kill their workers. Default: 1.
+    """
+
+    def __init__(self, *args, worker_log=None, max_redispatches=1, **kwargs):
+        # The dispatcher starts in the master's constructor and may report
+        # workers right away, so the statistics have to exist before.
+        self.worker_log = worker_log
+        self.max_redispatches = max_redispatches
+        self.redispatches = {}
+        # worker name -> statistics
+        self.worker_stats = {}
+        self.worker_stats_lock = threading.Lock()
+        super(ElasticMaster, self).__init__(*args, **kwargs)
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        # ``min_n_workers`` only says how many workers are expected. The run
+        # starts with the first one.
+        result = super(ElasticMaster, self).run(
+            n_iterations=n_iterations, min_n_workers=1,
+            iteration_kwargs=iteration_kwargs)
+
+        stats = self.get_worker_stats()
+        result.HB_config['workers'] = stats
+        if self.worker_log is not None:
+            with open(str(self.worker_log), 'w') as f:
+                json.dump(stats, f, indent=2)
+        return result
+
+    def adjust_queue_size(self, number_of_workers=None):
+        # called by the dispatcher whenever the pool changed
+        self._update_pool()
+        super(ElasticMaster, self).adjust_queue_size(number_of_workers)
+
+    def _update_pool(self):
+        # Take the dispatcher's lock before the own one, never the other way
+        # round. The master holds its lock while submitting jobs.
+        with self.dispatcher.discover_cond:
+            current = set(self.dispatcher.worker_pool.keys())
+
+        now = time.time()
+        with self.worker_stats_lock:
+            for name in current:
+                if name not in self.worker_stats:
+                    self.worker_stats[name] = {'joined': now, 'left': None,
+                                               'busy_time': 0., 'num_jobs': 0,
+                                               'num_lost_jobs': 0}
+            for name, stats in self.worker_stats.items():
+                if name not in current and stats['left'] is None:
+                    stats['left'] = now
+
+    def job_callback(self, job):
+        lost = job.result is None and job.exception == LOST_JOB_EXCEPTION
+        with self.worker_stats_lock:
+            stats = self.worker_stats.get(job.worker_name)
+            if stats is not None:
+                stats['busy_time'] += job.timestamps['finished'] - \
+                    job.timestamps['started']
+                stats['num_jobs'] += 1
+                stats['num_lost_jobs'] += int(lost)
+
+        if lost and self.redispatches.get(job.id, 0) < self.max_redispatches:
+            self.redispatches[job.id] = self.redispatches.get(job.id, 0) + 1
+            self.logger.info('ELASTIC: dispatching job %s of a lost worker '
+                             'again' % str(job.id))
+            # The job counts as running until its second attempt finished, so
+            # the iteration isn't told about it and num_running_jobs is kept.
+            self.dispatcher.submit_job(job.id, **job.kwargs)
+            return
+        super(ElasticMaster, self).job_callback(job)
+
+    def get_worker_stats(self):
+        """
+        Uptime and utilization of every worker that took part in the run.
+
+        Returns:
+            dict - worker name -> dict with
+                - ``joined``, ``left``: times relative to the start of the
+                  run (``left`` is None if it was still there at the end)
+                - ``uptime``: seconds in the pool
+                - ``busy_time``: seconds spent on evaluations
+                - ``utilization``: ``busy_time / uptime``
+                - ``num_jobs``, ``num_lost_jobs``: number of evaluations, and
+                  of those that were lost because the worker left
+        """
+        self._update_pool()
+        now = time.time()
+        time_ref = self.time_ref if self.time_ref is not None else now
+        report = {}
+        with self.worker_stats_lock:
+            for name, stats in self.worker_stats.items():
+                end = stats['left'] if stats['left'] is not None else now
+                uptime = max(end - max(stats['joined'], time_ref), 0.)
+                report[name] = {
+                    'joined': stats['joined'] - time_ref,
+                    'left': (stats['left'] - time_ref
+                             if stats['left'] is not None else None),
+                    'uptime': uptime,
+                    'busy_time': stats['busy_time'],
+                    'utilization': (min(stats['busy_time'] / uptime, 1.)
+                                    if uptime > 0 else 0.),
+                    'num_jobs': stats['num_jobs'],
+                    'num_lost_jobs': stats['num_lost_jobs']}
+        return report
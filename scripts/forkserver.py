@@ -0,0 +1,316 @@
+"""
+Pre-warmed fork server for objectives with heavy imports.
+
+Objectives of the MLP, cartpole or BNN kind import TensorFlow, hpolib or
+scikit-learn, which takes seconds before the first evaluation. A process per
+evaluation isolates crashes, leaks and hung evaluations, but pays this
+cost every time. A :class:`ForkServer` pays it once: it starts a server
+process, which imports the ``preload`` modules and the file of the function
+through ``FMin.load_func``, and loads the function arguments. Every
+evaluation forks a child of this server, which already has all of this in
+memory, runs the function once and exits.
+
+The server is a process of its own rather than the master or the worker,
+because those run the Pyro threads, and forking a process with threads is
+unsafe. The server only forks. Requests come in over a unix socket, one
+connection per evaluation, so the threads of several workers can share
+one server. The child meters its own CPU time and memory with
+:class:`scripts.accounting.UsageMeter`. If the child crashes, e.g. on a
+segfault or out of memory, or exceeds ``timeout``, the evaluation fails
+and the server keeps running.
+
+The function has to be defined at the top level of a file. The file is
+loaded as a module of its own, so it can't use relative imports. Libraries
+that start threads on import, as TensorFlow can, must not be preloaded.
+Their threads are not copied to the children, so import them in the
+function instead.
+
+Example::
+
+    with ForkServer('opt_func.py', func_args=(X, y),
+                    preload=['sklearn.neural_network']) as server:
+        loss, usage = server.evaluate({'lr': 0.1}, budget=9)
+"""
+
+import argparse
+import importlib
+import inspect
+import os
+import pickle
+import random
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from multiprocessing.connection import Connection
+from pathlib import Path
+
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+from scripts.accounting import UsageMeter
+from scripts.resources import THREAD_ENV_VARS
+from scripts.subsets import DataSubsets
+
+
+def func_location(func):
+    """
+    File and name of a function defined at the top level of a file, as a
+    fork server loads it.
+
+    Raises:
+        ValueError: if the function is not defined at the top level of a
+            file, e.g. a lambda or a method.
+    """
+    name = getattr(func, '__name__', None)
+    try:
+        path = inspect.getsourcefile(func)
+    except TypeError:
+        path = None
+    if path is None or name is None or func.__qualname__ != name:
+        raise ValueError('A fork server needs a function defined at the top '
+                         'level of a file, not %r' % func)
+    return path, name
+
+
+class ForkServer(object):
+    """
+    Server process that evaluates a function in forked children.
+
+    Args:
+        func_file (str): file that defines the function.
+        func_name (str, optional): name of the function. Default: 'opt_func'.
+        func_args (tuple, optional): arguments passed to the function
+            before the configuration, e.g. the data. If it is a
+            :class:`scripts.subsets.DataSubsets`, the children pass the
+            subset for the budget of their evaluation.
+        preload (list of str, optional): modules imported by the server
+            before it loads the function.
+        timeout (float, optional): seconds after which an evaluation is
+            killed. Default: no limit.
+        startup_timeout (float, optional): seconds the server may take to
+            import everything. Default: 600.
+        threads (int, optional): size of the BLAS/OpenMP thread pools of the
+            evaluations, e.g. :attr:`scripts.resources.ResourceManager.threads`.
+            By default, the server inherits the settings of this process.
+    """
+
+    def __init__(self, func_file, func_name='opt_func', func_args=(),
+                 preload=(), timeout=None, startup_timeout=600, threads=None):
+        self.func_file = str(func_file)
+        self.func_name = func_name
+        if not isinstance(func_args, DataSubsets):
+            func_args = tuple(func_args)
+        self.func_args = func_args
+        self.preload = list(preload)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.threads = threads
+        self.process = None
+        self.directory = None
+        self.address = None
+        self.startup_time = None
+
+    def start(self):
+        """
+        Starts the server and waits until it has imported everything.
+        """
+        # unix socket paths are limited to about 100 characters
+        self.directory = tempfile.mkdtemp(prefix='forkserver_')
+        self.address = os.path.join(self.directory, 'socket')
+        args_file = os.path.join(self.directory, 'func_args.pkl')
+        with open(args_file, 'wb') as f:
+            pickle.dump(self.func_args, f)
+
+        start = time.time()
+        command = [sys.executable, os.path.abspath(__file__),
+                   '--address', self.address, '--func', self.func_file,
+                   '--func_name', self.func_name, '--func_args', args_file,
+                   '--preload'] + self.preload
+        environ = dict(os.environ)
+        if self.threads is not None:
+            # read by the libraries when the server imports them
+            environ.update({var: str(self.threads)
+                            for var in THREAD_ENV_VARS})
+        # the server exits once its stdin is closed, i.e. with this process
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, env=environ)
+        ready, _, _ = select.select([self.process.stdout], [], [],
+                                    self.startup_timeout)
+        if not ready or self.process.stdout.readline().strip() != b'ready':
+            self.shutdown()
+            raise RuntimeError('The fork server for %s did not start'
+                               % self.func_file)
+        self.startup_time = time.time() - start
+        return self
+
+    def evaluate(self, config, budget, num_allocations=0, trace_gc=False):
+        """
+        Evaluates the function on ``config`` and ``budget`` in a forked
+        child of the server.
+
+        Args:
+            config (dict): keyword arguments of the function.
+            budget (float): the budget.
+            num_allocations (int, optional): see
+                :class:`scripts.accounting.UsageMeter`.
+            trace_gc (bool, optional): see
+                :class:`scripts.accounting.UsageMeter`.
+
+        Returns:
+            object - the return value of the function
+            dict - CPU time and memory of the child, see
+                :class:`scripts.accounting.UsageMeter`
+
+        Raises:
+            TimeoutError: if the evaluation took longer than ``timeout``.
+            RuntimeError: if the function raised an exception, or the child
+                crashed.
+        """
+        if self.process is None or self.process.poll() is not None:
+            raise RuntimeError('The fork server is not running')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.address)
+        with Connection(sock.detach()) as conn:
+            try:
+                pid = conn.recv()
+                conn.send((dict(config), budget,
+                           {'num_allocations': num_allocations,
+                            'trace_gc': trace_gc}))
+                if not conn.poll(self.timeout):
+                    _kill(pid)
+                    raise TimeoutError('The evaluation took longer than %g '
+                                       'seconds' % self.timeout)
+                status, value, usage = conn.recv()
+            except EOFError:
+                raise RuntimeError('The evaluation crashed without a result, '
+                                   'e.g. on a signal or out of memory')
+        if status == 'error':
+            raise RuntimeError('The function raised an exception in the fork '
+                               'server:\n%s' % value)
+        return value, usage
+
+    def shutdown(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+def _kill(pid):
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _evaluate(conn, func, func_args):
+    # runs in the forked child
+    conn.send(os.getpid())
+    config, budget, meter_kwargs = conn.recv()
+    meter = UsageMeter(scope='process', **meter_kwargs)
+    if isinstance(func_args, DataSubsets):
+        func_args = func_args.args(budget)
+    try:
+        with meter:
+            value = func(*func_args, budget=budget, **config)
+        conn.send(('ok', value, meter.usage))
+    except Exception:
+        conn.send(('error', traceback.format_exc(), meter.usage))
+
+
+def serve(address, func_file, func_name='opt_func', func_args=(),
+          preload=()):
+    """
+    Runs the server in this process, until its stdin is closed.
+    """
+    # imported here, FMin uses this module
+    from scripts.FMin import load_func
+
+    for module in preload:
+        importlib.import_module(module)
+    func = load_func(func_file, name=func_name)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen(64)
+    # the children are reaped by the kernel
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+    # nobody reads the pipe anymore, the output of the function goes to
+    # stderr instead
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    while True:
+        readable, _, _ = select.select([listener, sys.stdin], [], [])
+        if sys.stdin in readable and not os.read(sys.stdin.fileno(), 1024):
+            break
+        if listener not in readable:
+            continue
+        client, _ = listener.accept()
+        if os.fork() != 0:
+            client.close()
+            continue
+
+        # the child
+        status = 0
+        try:
+            listener.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            # otherwise all children draw the same random numbers
+            random.seed()
+            if 'numpy' in sys.modules:
+                sys.modules['numpy'].random.seed()
+            with Connection(client.detach()) as conn:
+                _evaluate(conn, func, func_args)
+        except BaseException:
+            status = 1
+        finally:
+            # without the cleanup of the server's state
+            os._exit(status)
+    listener.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fork server of a function, '
+                                                 'see scripts/forkserver.py')
+    parser.add_argument('--address', help='unix socket to listen on',
+                        type=str, required=True)
+    parser.add_argument('--func', help='File of the function', type=str,
+                        required=True)
+    parser.add_argument('--func_name', help='Name of the function',
+                        type=str, default='opt_func')
+    parser.add_argument('--func_args', help='Pickled arguments of the '
+                                            'function', type=str,
+                        default=None)
+    parser.add_argument('--preload', help='Modules imported in advance',
+                        type=str, nargs='*', default=[])
+    args = parser.parse_args()
+
+    func_args = ()
+    if args.func_args is not None:
+        with open(args.func_args, 'rb') as f:
+            func_args = pickle.load(f)
+    serve(args.address, args.func, func_name=args.func_name,
+          func_args=func_args, preload=args.preload)
@@ -0,0 +1,246 @@
+"""
+Hard limits on the compute of a run.
+
+Comparisons of optimizers are only fair if every optimizer got the same
+compute. A number of HyperBand iterations is a poor unit for this: the
+black-box optimizers (SMAC, TPE) were given an approximate number of
+evaluations, and the runs overshot. A :class:`ComputeLimit` caps a run by
+one or more of
+
+- the total budget of all evaluations, e.g. epochs summed over all
+  configurations,
+- the number of evaluations,
+- the wall-clock time since the start of the run.
+
+The :class:`LimitedMaster` mixin stops BOHB, HyperBand and RandomSearch once
+a limit is reached: no further evaluation is started, the running ones
+finish, and then the run returns with the results so far. Evaluations are
+never cut short. The budget and the evaluations are counted when an
+evaluation is started, so a run ends with the first evaluation that reaches
+the limit and overshoots it by at most that evaluation's budget. For the
+black-box optimizers, every evaluation costs the maximum budget, and
+:meth:`ComputeLimit.num_evaluations` is the number of evaluations that
+reaches the same limit.
+"""
+
+import copy
+import time
+
+import numpy as np
+from hpbandster.core.result import Result
+
+from scripts.curves import hyperband_budgets, is_from_curve
+
+
+class ComputeLimit(object):
+    """
+    Limit on the compute of a run. A limit that is None doesn't apply.
+
+    Args:
+        max_total_budget (float, optional): total budget of all evaluations.
+        max_time (float, optional): seconds since the start of the run.
+        max_evaluations (int, optional): number of evaluations.
+    """
+
+    def __init__(self, max_total_budget=None, max_time=None,
+                 max_evaluations=None):
+        self.max_total_budget = max_total_budget
+        self.max_time = max_time
+        self.max_evaluations = max_evaluations
+
+    def __bool__(self):
+        return any(limit is not None for limit in (
+            self.max_total_budget, self.max_time, self.max_evaluations))
+
+    def reached(self, total_budget, num_evaluations, elapsed):
+        """
+        The limit that is reached, if any.
+
+        Args:
+            total_budget (float): budget of the evaluations started so far.
+            num_evaluations (int): number of evaluations started so far.
+            elapsed (float): seconds since the start of the run.
+
+        Returns:
+            str - 'max_total_budget', 'max_evaluations' or 'max_time', None
+                if no limit is reached
+        """
+        if self.max_total_budget is not None and \
+                total_budget >= self.max_total_budget:
+            return 'max_total_budget'
+        if self.max_evaluations is not None and \
+                num_evaluations >= self.max_evaluations:
+            return 'max_evaluations'
+        if self.max_time is not None and elapsed >= self.max_time:
+            return 'max_time'
+        return None
+
+    def num_evaluations(self, max_budget, default=None):
+        """
+        Number of evaluations on ``max_budget`` until the budget or
+        evaluation limit is reached.
+
+        Args:
+            max_budget (float): budget of every evaluation.
+            default (int, optional): returned if neither limit is set.
+
+        Returns:
+            int
+        """
+        limits = []
+        if self.max_total_budget is not None:
+            limits.append(int(np.ceil(self.max_total_budget / max_budget)))
+        if self.max_evaluations is not None:
+            limits.append(self.max_evaluations)
+        return min(limits) if limits else default
+
+    def to_dict(self):
+        return {'max_total_budget': self.max_total_budget,
+                'max_time': self.max_time,
+                'max_evaluations': self.max_evaluations}
+
+
+def hyperband_total_budget(min_budget, max_budget, eta, num_iterations):
+    """
+    Total budget of ``num_iterations`` iterations of HyperBand or BOHB, with
+    the brackets of HpBandSter's HyperBand.
+    """
+    budgets = hyperband_budgets(min_budget, max_budget, eta)
+    max_sh_iter = len(budgets)
+
+    total = 0.
+    for iteration in range(num_iterations):
+        s = max_sh_iter - 1 - (iteration % max_sh_iter)
+        n0 = int(np.floor(max_sh_iter / (s + 1)) * eta ** s)
+        ns = [max(int(n0 * eta ** (-i)), 1) for i in range(s + 1)]
+        total += float(np.dot(ns, budgets[(-s - 1):]))
+    return total
+
+
+class LimitedMaster(object):
+    """
+    Master mixin that stops the run at a :class:`ComputeLimit`.
+
+    The time limit counts from when the workers are there and the first
+    evaluation can start. After a resume from a checkpoint, the budget and
+    evaluations of the restored results count towards the limit, the time
+    before the interruption doesn't.
+
+    The limit, the limit that was reached and the budget, evaluations and
+    time used are stored as 'compute' in the config of the result.
+
+    Args:
+        compute_limit (ComputeLimit, optional): the limit. Without one, the
+            run ends after its iterations, as usual.
+    """
+
+    def __init__(self, *args, compute_limit=None, **kwargs):
+        super(LimitedMaster, self).__init__(*args, **kwargs)
+        self.compute_limit = compute_limit or ComputeLimit()
+        self.limit_reached = None
+        self.run_start = None
+        # iterations that were created after the limit was reached
+        self.num_skipped_iterations = 0
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        self.run_start = None
+        result = super(LimitedMaster, self).run(
+            n_iterations=n_iterations, min_n_workers=min_n_workers,
+            iteration_kwargs=iteration_kwargs)
+        if self.limit_reached is None:
+            result.HB_config['compute'] = self.compute_summary()
+            return result
+
+        # The run stopped dispatching, the running evaluations still finish
+        with self.thread_cond:
+            while self.num_running_jobs > 0:
+                self.thread_cond.wait()
+            # the iterations created after the stop are empty
+            del self.iterations[len(self.iterations)
+                                - self.num_skipped_iterations:]
+            self.num_skipped_iterations = 0
+            self.config['compute'] = self.compute_summary()
+            return Result([copy.deepcopy(it.data) for it in self.iterations] +
+                          [it.data for it in self.warmstart_iteration],
+                          self.config)
+
+    def active_iterations(self):
+        if self._check_limit() is not None:
+            return []
+        return super(LimitedMaster, self).active_iterations()
+
+    def get_next_iteration(self, iteration, iteration_kwargs={}):
+        it = super(LimitedMaster, self).get_next_iteration(iteration,
+                                                           iteration_kwargs)
+        if self.limit_reached is not None:
+            # The run loop creates the remaining iterations before it ends.
+            # They never start and are removed at the end of the run.
+            it.is_finished = True
+            self.num_skipped_iterations += 1
+        return it
+
+    def job_callback(self, job):
+        super(LimitedMaster, self).job_callback(job)
+        # the run waits for the last evaluations once the limit is reached
+        with self.thread_cond:
+            self.thread_cond.notify_all()
+
+    def compute_summary(self):
+        """
+        The limit and the compute used so far.
+
+        Returns:
+            dict - the limits, 'limit_reached', 'total_budget',
+                'num_evaluations' and 'time'
+        """
+        total_budget, num_evaluations = self.started_evaluations()
+        summary = self.compute_limit.to_dict()
+        summary.update({'limit_reached': self.limit_reached,
+                        'total_budget': total_budget,
+                        'num_evaluations': num_evaluations,
+                        'time': time.time() - self.run_start
+                        if self.run_start is not None else 0.})
+        return summary
+
+    def started_evaluations(self):
+        """
+        Total budget and number of the evaluations that finished or are
+        running.
+
+        Returns:
+            float, int
+        """
+        total_budget, num_evaluations = 0., 0
+        with self.thread_cond:
+            for it in self.iterations:
+                for datum in it.data.values():
+                    # results from learning curves cost nothing
+                    budgets = [b for b, res in datum.results.items()
+                               if not is_from_curve(res)]
+                    if datum.status == 'RUNNING' and \
+                            datum.budget not in datum.results:
+                        budgets.append(datum.budget)
+                    total_budget += sum(budgets)
+                    num_evaluations += len(budgets)
+                # early promotions of scripts.packing run on the next budget
+                # and are registered once their rung is complete
+                for _ in getattr(it, 'early', {}):
+                    total_budget += it.budgets[it.stage + 1]
+                    num_evaluations += 1
+        return total_budget, num_evaluations
+
+    def _check_limit(self):
+        # called by the run loop, after the master waited for the workers
+        if self.run_start is None:
+            self.run_start = time.time()
+        if self.limit_reached is None and self.compute_limit:
+            total_budget, num_evaluations = self.started_evaluations()
+            self.limit_reached = self.compute_limit.reached(
+                total_budget, num_evaluations, time.time() - self.run_start)
+            if self.limit_reached is not None:
+                self.logger.info('LIMIT: %s reached after %i evaluations with '
+                                 'a total budget of %g, waiting for the '
+                                 'running ones'
+                                 % (self.limit_reached, num_evaluations,
+                                    total_budget))
+        return self.limit_reached
@@ -0,0 +1,397 @@
+"""
+Live analysis of a run in progress.
+
+CAVE analyzes a run once it has finished, and every rerun on a long BOHB run
+repeats all the work. This module follows the 'configs.json' and
+'results.json' of a run as HpBandSter's result logger appends to them, and
+updates cheap summaries with every new result:
+
+- the incumbent trajectory, with the rule of HpBandSter's
+  ``Result.get_incumbent_trajectory``: a result on a larger budget always
+  replaces the incumbent, one on the same budget if its loss is lower
+- the Spearman rank correlation of the losses of the configurations
+  evaluated on two budgets, for every pair of budgets. A low correlation
+  says the small budgets mislead the run.
+- the loss distribution of every rung: number of results, minimum,
+  quartiles and maximum
+
+Expensive analyses, by default fANOVA's hyperparameter importance on the
+largest budget with enough results, are refreshed only every ``N`` new
+results. fANOVA needs the ``fanova`` package.
+
+The summary is written to 'live_analysis.json' in the run directory after
+every update, where notebooks or scripts monitoring the run pick it up, e.g.
+to stop runs whose incumbent stopped improving.
+
+Usage::
+
+    python live_analysis.py NEMO_OUTPUT/BC_0 --interval 30 --fanova_every 50
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+import numpy as np
+import ConfigSpace as CS
+from scipy.stats import spearmanr
+
+
+class LogTail(object):
+    """
+    The lines appended to a json lines file since the last read.
+
+    Lines that are still being written are returned once they are complete.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.offset = 0
+
+    def truncated(self):
+        """
+        Whether the file got shorter than what was read, e.g. because a
+        resumed run pruned its logs.
+        """
+        return os.path.exists(self.path) and \
+            os.path.getsize(self.path) < self.offset
+
+    def read(self):
+        """
+        Returns:
+            list - the new entries, decoded from json
+        """
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n')
+        if end < 0:
+            return []
+        self.offset += end + 1
+        return [json.loads(line) for line in
+                data[:end].decode('utf-8').splitlines() if line.strip()]
+
+
+def load_configspace(directory):
+    """
+    The configuration space stored in a run directory, by fmin as
+    'configspace.json' or by the experiment scripts as 'configspace.pcs'.
+
+    Returns:
+        ConfigSpace.ConfigurationSpace - None if there is none
+    """
+    from ConfigSpace.read_and_write import json as cs_json, pcs_new
+    path = os.path.join(str(directory), 'configspace.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            return cs_json.read(f.read())
+    path = os.path.join(str(directory), 'configspace.pcs')
+    if os.path.exists(path):
+        with open(path) as f:
+            return pcs_new.read(f)
+    return None
+
+
+def fanova_importance(configspace, configs, losses):
+    """
+    Individual importance of every hyperparameter by fANOVA.
+
+    Args:
+        configspace (ConfigSpace.ConfigurationSpace): space of the configs.
+        configs (list of dict): the evaluated configurations.
+        losses (list of float): their losses.
+
+    Returns:
+        dict - hyperparameter name -> importance
+    """
+    from fanova import fANOVA
+
+    hyperparameters = configspace.get_hyperparameters()
+    X = np.zeros((len(configs), len(hyperparameters)))
+    for i, config in enumerate(configs):
+        for j, hp in enumerate(hyperparameters):
+            value = config.get(hp.name)
+            if isinstance(hp, CS.CategoricalHyperparameter):
+                # inactive hyperparameters get their first choice or lower
+                # bound, fANOVA needs a value
+                X[i, j] = hp.choices.index(value) if value is not None else 0
+            elif isinstance(hp, CS.Constant):
+                X[i, j] = 0
+            else:
+                X[i, j] = value if value is not None else hp.lower
+    f = fANOVA(X, np.asarray(losses, dtype=float), config_space=configspace)
+    return {hp.name: float(f.quantify_importance((j,))[(j,)]
+                           ['individual importance'])
+            for j, hp in enumerate(hyperparameters)}
+
+
+class LiveAnalysis(object):
+    """
+    Incrementally updated analysis of the run in ``directory``.
+
+    Args:
+        directory (str): run directory with 'configs.json' and
+            'results.json'.
+        fanova_every (int, optional): fANOVA is refreshed after this many
+            new results. Disabled if None.
+        min_fanova_results (int, optional): fANOVA runs on the largest
+            budget with at least this many results. Default: 10.
+        importance (callable, optional): replaces :func:`fanova_importance`.
+            Called with the configuration space, the configs and their
+            losses.
+    """
+
+    def __init__(self, directory, fanova_every=None, min_fanova_results=10,
+                 importance=fanova_importance):
+        self.directory = str(directory)
+        self.fanova_every = fanova_every
+        self.min_fanova_results = min_fanova_results
+        self.importance = importance
+        self.configspace = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets everything read so far, the logs are read from the start
+        with the next :meth:`update`.
+        """
+        self.configs_log = LogTail(os.path.join(self.directory,
+                                                'configs.json'))
+        self.results_log = LogTail(os.path.join(self.directory,
+                                                'results.json'))
+        self.configs = {}
+        # config_id -> budget -> loss
+        self.losses = {}
+        # budget -> sorted losses
+        self.rungs = {}
+        self.num_results = 0
+        self.num_crashed = 0
+        self.first_submitted = None
+        self.last_finished = None
+        self.incumbent = None
+        self.trajectory = []
+        self.fanova = None
+        self.fanova_results = 0
+
+    def update(self):
+        """
+        Reads the new configurations and results and updates the analysis.
+
+        Returns:
+            int - number of new results
+        """
+        if self.configs_log.truncated() or self.results_log.truncated():
+            self.reset()
+
+        for config_id, config, _ in self.configs_log.read():
+            self.configs[tuple(config_id)] = config
+        new = self.results_log.read()
+        for config_id, budget, time_stamps, result, _ in new:
+            self._add_result(tuple(config_id), budget, time_stamps, result)
+
+        if self.fanova_every is not None and \
+                self.num_results - self.fanova_results >= self.fanova_every:
+            self.fanova_results = self.num_results
+            self._update_fanova()
+        return len(new)
+
+    def _add_result(self, config_id, budget, time_stamps, result):
+        self.num_results += 1
+        if self.first_submitted is None or \
+                time_stamps['submitted'] < self.first_submitted:
+            self.first_submitted = time_stamps['submitted']
+        self.last_finished = max(self.last_finished or 0.,
+                                 time_stamps['finished'])
+        if result is None or result.get('loss') is None:
+            self.num_crashed += 1
+            return
+
+        loss = result['loss']
+        self.losses.setdefault(config_id, {})[budget] = loss
+        bisect.insort(self.rungs.setdefault(budget, []), loss)
+
+        # HpBandSter's incumbent trajectory with all budgets, a larger budget
+        # is better and the budget never decreases
+        if self.incumbent is None or budget > self.incumbent['budget'] or \
+                (budget == self.incumbent['budget'] and
+                 loss < self.incumbent['loss']):
+            self.incumbent = {'config_id': config_id, 'budget': budget,
+                              'loss': loss,
+                              'finished': time_stamps['finished']}
+            self.trajectory.append(self.incumbent)
+
+    def _update_fanova(self):
+        if self.configspace is None:
+            self.configspace = load_configspace(self.directory)
+        budgets = [b for b in sorted(self.rungs, reverse=True)
+                   if len(self.rungs[b]) >= self.min_fanova_results]
+        if self.configspace is None or not budgets:
+            return
+        budget = budgets[0]
+        ids = [cid for cid, losses in self.losses.items()
+               if budget in losses and cid in self.configs]
+        try:
+            importance = self.importance(
+                self.configspace, [self.configs[cid] for cid in ids],
+                [self.losses[cid][budget] for cid in ids])
+        except ImportError as e:
+            self.fanova = {'error': str(e)}
+            return
+        self.fanova = {'budget': budget, 'num_results': len(ids),
+                       'importance': importance}
+
+    def budget_correlation(self):
+        """
+        Spearman rank correlation between the losses of the configurations
+        evaluated on both budgets, for every pair of budgets.
+
+        Returns:
+            list of dict - 'budgets', 'num_configs' and 'correlation' (None
+                for fewer than three configurations)
+        """
+        budgets = sorted(self.rungs)
+        correlations = []
+        for i, b1 in enumerate(budgets):
+            for b2 in budgets[i + 1:]:
+                pairs = [(l[b1], l[b2]) for l in self.losses.values()
+                         if b1 in l and b2 in l]
+                correlation = None
+                if len(pairs) >= 3:
+                    correlation = spearmanr(*zip(*pairs)).correlation
+                    correlation = (None if np.isnan(correlation)
+                                   else float(correlation))
+                correlations.append({'budgets': [b1, b2],
+                                     'num_configs': len(pairs),
+                                     'correlation': correlation})
+        return correlations
+
+    def rung_distributions(self):
+        """
+        Loss distribution of every budget.
+
+        Returns:
+            dict - budget -> 'num_results', 'min', 'q25', 'median', 'q75'
+                and 'max'
+        """
+        distributions = {}
+        for budget, losses in sorted(self.rungs.items()):
+            q = np.percentile(losses, [0, 25, 50, 75, 100])
+            distributions[budget] = dict(zip(
+                ['min', 'q25', 'median', 'q75', 'max'], map(float, q)))
+            distributions[budget]['num_results'] = len(losses)
+        return distributions
+
+    def summary(self):
+        """
+        The current analysis. Times are relative to the first submission.
+
+        Returns:
+            dict with 'num_configs', 'num_results', 'num_crashed', 'elapsed',
+                'incumbent', 'trajectory', 'budget_correlation',
+                'rung_distributions' and 'fanova'
+        """
+        def relative(entry):
+            entry = dict(entry, config_id=list(entry['config_id']))
+            entry['finished'] -= self.first_submitted
+            entry['config'] = self.configs.get(tuple(entry['config_id']))
+            return entry
+
+        return {'num_configs': len(self.configs),
+                'num_results': self.num_results,
+                'num_crashed': self.num_crashed,
+                'elapsed': (self.last_finished - self.first_submitted
+                            if self.num_results else 0.),
+                'incumbent': (relative(self.incumbent)
+                              if self.incumbent is not None else None),
+                'trajectory': [relative(e) for e in self.trajectory],
+                'budget_correlation': self.budget_correlation(),
+                'rung_distributions': self.rung_distributions(),
+                'fanova': self.fanova}
+
+    def write(self, filename=None):
+        """
+        Writes the :meth:`summary` to ``filename``, by default
+        'live_analysis.json' in the run directory. Readers never see a
+        partial file.
+        """
+        if filename is None:
+            filename = os.path.join(self.directory, 'live_analysis.json')
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(
+            os.path.abspath(filename)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.summary(), f, indent=2, default=str)
+            os.replace(tmp_file, filename)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+
+def watch(directory, interval=30, fanova_every=None, output=None,
+          idle_timeout=None):
+    """
+    Updates the analysis of the run in ``directory`` every ``interval``
+    seconds and writes it, whenever there were new results.
+
+    Args:
+        idle_timeout (float, optional): returns once there were no new
+            results for this many seconds. By default, it runs until it is
+            interrupted.
+
+    Returns:
+        LiveAnalysis - the final analysis
+    """
+    analysis = LiveAnalysis(directory, fanova_every=fanova_every)
+    last_result = time.time()
+    while True:
+        if analysis.update() > 0:
+            last_result = time.time()
+            analysis.write(output)
+            incumbent = analysis.incumbent
+            print('{:d} results, incumbent {} with loss {} on budget {}'
+                  .format(analysis.num_results,
+                          incumbent and tuple(incumbent['config_id']),
+                          incumbent and incumbent['loss'],
+                          incumbent and incumbent['budget']))
+        elif idle_timeout is not None and \
+                time.time() - last_result >= idle_timeout:
+            return analysis
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Live analysis of a '
+                                                 'HpBandSter run')
+    parser.add_argument('directory', help='Run directory with results.json '
+                                          'and configs.json', type=str)
+    parser.add_argument('--interval', help='Seconds between two updates',
+                        type=float, default=30)
+    parser.add_argument('--fanova_every',
+                        help='Refresh fANOVA after this many new results',
+                        type=int, default=None)
+    parser.add_argument('--output', help='Json file for the analysis. '
+                                         'Default: live_analysis.json in the '
+                                         'run directory',
+                        type=str, default=None)
+    parser.add_argument('--idle_timeout',
+                        help='Stop after this many seconds without new '
+                             'results', type=float, default=None)
+    args = parser.parse_args()
+
+    try:
+        watch(args.directory, interval=args.interval,
+              fanova_every=args.fanova_every, output=args.output,
+              idle_timeout=args.idle_timeout)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,45 @@
+"""
+Optimizer classes shared by ``fmin`` and the ICML 2018 experiment scripts.
+
+The extensions of this package (e.g. pruning) add behaviour to the
+HpBandSter master as mixin classes. :func:`get_optimizer_class` combines one
+of the HpBandSter optimizers with the requested mixins, so that every
+extension works with BOHB, HyperBand and RandomSearch alike.
+"""
+
+from scripts.asha import AsynchronousBOHB
+from scripts.batch_sampling import BatchRandomSearch, BatchHyperBand
+from scripts.bounded_bohb import BoundedBOHB
+
+
+# BoundedBOHB samples like HpBandSter's BOHB unless its history options are
+# used, so it serves as 'bohb'. 'asha' samples like 'bohb' and promotes
+# asynchronously. The batch samplers sample like RandomSearch and HyperBand
+# unless vectorized_sampling is set.
+OPTIMIZERS = {'randomsearch': BatchRandomSearch,
+              'bohb': BoundedBOHB,
+              'hyperband': BatchHyperBand,
+              'asha': AsynchronousBOHB}
+
+
+def get_optimizer_class(opt_method, extensions=()):
+    """
+    Returns the optimizer class for ``opt_method``.
+
+    Args:
+        opt_method (str): one of 'randomsearch', 'bohb', 'hyperband' or
+            'asha'.
+        extensions (iterable): master mixin classes, e.g.
+            :class:`scripts.pruning.PruningMaster`. They take precedence over
+            the optimizer in the method resolution order, in the given order.
+
+    Returns:
+        class - a subclass of ``hpbandster.core.master.Master``
+    """
+    if opt_method not in OPTIMIZERS:
+        raise ValueError("Unknown method %s" % opt_method)
+    optimizer = OPTIMIZERS[opt_method]
+    extensions = tuple(extensions)
+    if not extensions:
+        return optimizer
+    return type(optimizer.__name__, extensions + (optimizer,), {})
@@ -0,0 +1,449 @@
+"""
+Cost-aware packing of the jobs of successive halving onto the workers.
+
+Successive halving dispatches the configurations of a rung in the order they
+were sampled and only promotes the best ones once every job of the rung has
+finished. With evaluation costs that vary a lot between configurations, the
+most expensive job of a rung often starts last, and all other workers idle
+until it is done.
+
+- :class:`CostModel` learns the cost of a configuration per budget from the
+  results, either from ``info['cost']`` or from the time stamps of the job.
+- :class:`PackedSuccessiveHalving` dispatches the queued job with the largest
+  expected cost first. New configurations are still sampled one at a time,
+  when nothing is queued, so BOHB's model keeps learning within the first
+  rung. The ordering therefore applies to the promoted configurations of the
+  larger budgets, where the costs matter most. Once a rung has nothing left
+  to dispatch, it starts the configurations on the next budget that are sure
+  to be promoted, whatever the outstanding jobs return.
+- :class:`PackingMaster` is a master mixin using both, and reports makespan and
+  idle time of every iteration and rung at the end of the run.
+
+:func:`schedule_report` computes the same report for any run, e.g. from
+:func:`runs_from_result`, to compare it to a run without packing.
+"""
+
+import json
+import numbers
+
+import numpy as np
+import ConfigSpace
+import hpbandster.core.result as hpres
+from hpbandster.optimizers.iterations import SuccessiveHalving
+
+
+def job_cost(result, timestamps):
+    """
+    Cost of a job: ``info['cost']`` of its result if there is one, the time
+    between start and end of the job otherwise.
+
+    Returns:
+        float - the cost, or None if neither is known
+    """
+    info = (result or {}).get('info')
+    cost = info.get('cost') if isinstance(info, dict) else None
+    if isinstance(cost, numbers.Number) and np.isfinite(cost):
+        return float(cost)
+    if timestamps and 'started' in timestamps and 'finished' in timestamps:
+        return timestamps['finished'] - timestamps['started']
+    return None
+
+
+class CostModel(object):
+    """
+    Ridge regression of the cost of a configuration, one per budget.
+
+    Until a budget has ``min_points`` observations, its mean cost is used.
+    Budgets without any observation are extrapolated linearly from the
+    closest budget that has some.
+
+    Args:
+        configspace (ConfigSpace.ConfigurationSpace): the search space.
+        min_points (int, optional): observations needed per budget before the
+            regression is used. Default: number of hyperparameters + 2.
+        regularization (float, optional): ridge penalty. Default: 1e-3.
+    """
+
+    def __init__(self, configspace, min_points=None, regularization=1e-3):
+        self.configspace = configspace
+        self.min_points = (min_points if min_points is not None else
+                           len(configspace.get_hyperparameters()) + 2)
+        self.regularization = regularization
+        # budget -> ([feature vectors], [costs])
+        self.observations = {}
+        # budget -> weights, None once new observations came in
+        self.weights = {}
+
+    def _features(self, config):
+        vector = ConfigSpace.Configuration(self.configspace,
+                                           values=config).get_array()
+        # inactive hyperparameters are NaN
+        return np.concatenate([[1.], np.nan_to_num(vector, nan=-1.)])
+
+    def add(self, config, budget, cost):
+        """
+        Adds the cost of evaluating ``config`` on ``budget``.
+        """
+        if cost is None:
+            return
+        features, costs = self.observations.setdefault(budget, ([], []))
+        features.append(self._features(config))
+        costs.append(cost)
+        self.weights[budget] = None
+
+    def add_job(self, job):
+        """
+        Adds the cost of a finished ``hpbandster.core.dispatcher.Job``.
+        """
+        self.add(job.kwargs['config'], job.kwargs['budget'],
+                 job_cost(job.result, job.timestamps))
+
+    def load_results(self, directory):
+        """
+        Adds all results logged to ``directory`` by a json result logger,
+        e.g. of previous runs on the same problem. Configurations that don't
+        belong to the search space are skipped.
+
+        Returns:
+            int - the number of results added
+        """
+        result = hpres.logged_results_to_HBS_result(str(directory))
+        id2config = result.get_id2config_mapping()
+        num_added = 0
+        for run in result.get_all_runs():
+            cost = job_cost({'info': run.info}, run.time_stamps)
+            try:
+                self.add(id2config[run.config_id]['config'], run.budget, cost)
+            except (KeyError, TypeError, ValueError):
+                continue
+            num_added += int(cost is not None)
+        return num_added
+
+    def predict(self, config, budget):
+        """
+        Expected cost of evaluating ``config`` on ``budget``.
+
+        Returns:
+            float - the expected cost, or None without any observations
+        """
+        if budget not in self.observations:
+            if not self.observations:
+                return None
+            closest = min(self.observations,
+                          key=lambda b: abs(np.log(b / budget)))
+            return float(np.mean(self.observations[closest][1])) * \
+                budget / closest
+
+        features, costs = self.observations[budget]
+        if len(costs) < self.min_points:
+            return float(np.mean(costs))
+        if self.weights.get(budget) is None:
+            X, y = np.array(features), np.array(costs)
+            penalty = self.regularization * np.eye(X.shape[1])
+            self.weights[budget] = np.linalg.solve(X.T.dot(X) + penalty,
+                                                   X.T.dot(y))
+        prediction = self._features(config).dot(self.weights[budget])
+        return float(max(prediction, 0.))
+
+
+class PackedSuccessiveHalving(SuccessiveHalving):
+    """
+    Successive halving that dispatches the most expensive jobs first and
+    promotes configurations early.
+
+    Args:
+        cost_model (CostModel, optional): expected costs of the jobs. Without
+            one, the jobs are dispatched in the original order.
+        early_promotion (bool, optional): start configurations on the next
+            budget before the rung is complete, once their promotion is
+            certain. Default: True.
+        **kwargs: passed on to ``SuccessiveHalving``.
+    """
+
+    def __init__(self, *args, cost_model=None, early_promotion=True,
+                 **kwargs):
+        super(PackedSuccessiveHalving, self).__init__(*args, **kwargs)
+        self.cost_model = cost_model
+        self.early_promotion = early_promotion
+        # config_id -> finished job on the next budget, None while running
+        self.early = {}
+        self.num_early_promotions = 0
+
+    def expected_cost(self, config_id, budget):
+        if self.cost_model is None:
+            return 0.
+        cost = self.cost_model.predict(self.data[config_id].config, budget)
+        return cost if cost is not None else 0.
+
+    def get_next_run(self):
+        if self.is_finished:
+            return None
+
+        # New configurations are sampled one at a time, as in
+        # SuccessiveHalving, so BOHB's model sees every result that came in
+        # before. Only the queued jobs, e.g. the promoted configurations,
+        # are ordered by their cost.
+        queued = [k for k, v in self.data.items() if v.status == 'QUEUED']
+        if not queued and self.actual_num_configs[self.stage] < \
+                self.num_configs[self.stage]:
+            queued = [self.add_configuration()]
+        if queued:
+            k = max(queued, key=lambda k: self.expected_cost(
+                k, self.data[k].budget))
+            v = self.data[k]
+            assert v.budget == self.budgets[self.stage], \
+                'Configuration budget does not align with current stage!'
+            v.status = 'RUNNING'
+            self.num_running += 1
+            return k, v.config, v.budget
+
+        if self.num_running == 0:
+            self.process_results()
+            return self.get_next_run()
+
+        if self.early_promotion:
+            promotable = self._certain_promotions()
+            if promotable:
+                budget = self.budgets[self.stage + 1]
+                k = max(promotable,
+                        key=lambda k: self.expected_cost(k, budget))
+                self.early[k] = None
+                self.num_early_promotions += 1
+                self.logger.debug('ITERATION: Advancing config %s early to '
+                                  'budget %f' % (k, budget))
+                return k, self.data[k].config, budget
+        return None
+
+    def _certain_promotions(self):
+        # Configurations that are among the best num_configs[stage + 1],
+        # even if every running job of the rung ends up with a lower loss.
+        if self.stage + 1 >= len(self.num_configs):
+            return []
+        budget = self.budgets[self.stage]
+        losses = {k: v.results[budget]['loss'] for k, v in self.data.items()
+                  if v.status == 'REVIEW'}
+        promotable = []
+        for k, loss in losses.items():
+            if k in self.early:
+                continue
+            as_good = sum(1 for other, l in losses.items()
+                          if other != k and l <= loss)
+            if as_good + self.num_running < self.num_configs[self.stage + 1]:
+                promotable.append(k)
+        return promotable
+
+    def register_result(self, job, skip_sanity_checks=False):
+        if job.id in self.early and \
+                job.kwargs['budget'] != self.data[job.id].budget:
+            # result on the next budget, applied once the rung is complete
+            self.early[job.id] = job
+            return
+        super(PackedSuccessiveHalving, self).register_result(
+            job, skip_sanity_checks=skip_sanity_checks)
+
+    def process_results(self):
+        super(PackedSuccessiveHalving, self).process_results()
+        if self.is_finished:
+            return
+        # The early promotions were promoted now. Their jobs are running or
+        # done on the budget of the new stage already.
+        for k, job in self.early.items():
+            datum = self.data[k]
+            assert datum.status == 'QUEUED', \
+                'Early promotion %s was not promoted!' % str(k)
+            datum.status = 'RUNNING'
+            self.num_running += 1
+            if job is not None:
+                super(PackedSuccessiveHalving, self).register_result(job)
+        self.early = {}
+
+
+def runs_from_iterations(iterations):
+    """
+    Jobs of the iterations of a master, as input for :func:`schedule_report`.
+    """
+    runs = []
+    for it in iterations:
+        for config_id, datum in it.data.items():
+            for budget, timestamps in datum.time_stamps.items():
+                runs.append({'config_id': config_id, 'budget': budget,
+                             'started': timestamps['started'],
+                             'finished': timestamps['finished']})
+    return runs
+
+
+def runs_from_result(result):
+    """
+    Jobs of a ``hpbandster.core.result.Result``, as input for
+    :func:`schedule_report`.
+    """
+    return [{'config_id': run.config_id, 'budget': run.budget,
+             'started': run.time_stamps['started'],
+             'finished': run.time_stamps['finished']}
+            for run in result.get_all_runs()]
+
+
+def idle_time(intervals, start, end, num_workers):
+    """
+    Worker time left unused between ``start`` and ``end``.
+
+    Args:
+        intervals (list of (float, float)): start and end of all jobs.
+        start (float): begin of the time window.
+        end (float): end of the time window.
+        num_workers (int): size of the pool.
+
+    Returns:
+        float - ``num_workers * (end - start)`` minus the time spent on jobs
+    """
+    events = []
+    for s, e in intervals:
+        s, e = max(s, start), min(e, end)
+        if e > s:
+            events.extend([(s, 1), (e, -1)])
+    events.sort()
+
+    idle, running, last = 0., 0, start
+    for t, delta in events:
+        idle += max(num_workers - running, 0) * (t - last)
+        running += delta
+        last = t
+    return idle + num_workers * (end - last)
+
+
+def max_concurrency(intervals):
+    """
+    Largest number of jobs that ran at the same time.
+    """
+    events = sorted([(s, 1) for s, _ in intervals] +
+                    [(e, -1) for _, e in intervals])
+    running, most = 0, 0
+    for _, delta in events:
+        running += delta
+        most = max(most, running)
+    return most
+
+
+def schedule_report(runs, num_workers=None):
+    """
+    Makespan and idle time of every iteration and of the tail of every rung.
+
+    The tail of a rung begins when its last job was started. From then on,
+    successive halving itself has nothing to dispatch and workers idle until
+    the last job of the rung finished.
+
+    Args:
+        runs (list of dict): jobs with 'config_id', 'budget', 'started' and
+            'finished', see :func:`runs_from_iterations` and
+            :func:`runs_from_result`.
+        num_workers (int, optional): size of the pool. Defaults to the
+            largest number of jobs that ran at the same time.
+
+    Returns:
+        dict - 'num_workers', 'total' and 'iterations'. The total and every
+            iteration have 'makespan', 'busy_time', 'idle_time' and
+            'utilization' in seconds. Every iteration additionally has
+            'rungs', each with 'budget', 'num_jobs', 'makespan' and
+            'tail_idle_time'.
+    """
+    intervals = [(r['started'], r['finished']) for r in runs]
+    if num_workers is None:
+        num_workers = max_concurrency(intervals)
+
+    def summary(jobs):
+        start = min(r['started'] for r in jobs)
+        end = max(r['finished'] for r in jobs)
+        idle = idle_time(intervals, start, end, num_workers)
+        capacity = num_workers * (end - start)
+        return {'makespan': end - start,
+                'busy_time': sum(r['finished'] - r['started'] for r in jobs),
+                'idle_time': idle,
+                'utilization': 1. - idle / capacity if capacity > 0 else 1.}
+
+    iterations = {}
+    for r in runs:
+        iterations.setdefault(r['config_id'][0], []).append(r)
+
+    report = {'num_workers': num_workers,
+              'total': summary(runs) if runs else {},
+              'iterations': []}
+    for i in sorted(iterations):
+        jobs = iterations[i]
+        rungs = []
+        for budget in sorted(set(r['budget'] for r in jobs)):
+            rung = [r for r in jobs if r['budget'] == budget]
+            tail_start = max(r['started'] for r in rung)
+            end = max(r['finished'] for r in rung)
+            rungs.append({
+                'budget': budget, 'num_jobs': len(rung),
+                'makespan': end - min(r['started'] for r in rung),
+                'tail_idle_time': idle_time(intervals, tail_start, end,
+                                            num_workers)})
+        entry = {'iteration': i}
+        entry.update(summary(jobs))
+        entry['rungs'] = rungs
+        report['iterations'].append(entry)
+    return report
+
+
+class PackingMaster(object):
+    """
+    Master mixin for cost-aware packing of the jobs.
+
+    Args:
+        cost_model (CostModel, optional): model of the evaluation costs, e.g.
+            warm started with :meth:`CostModel.load_results`. A new one is
+            learned during the run if None.
+        early_promotion (bool, optional): see
+            :class:`PackedSuccessiveHalving`. Default: True.
+        packing_report (str, optional): json file the
+            :func:`schedule_report` of the run is written to.
+    """
+
+    def __init__(self, *args, cost_model=None, early_promotion=True,
+                 packing_report=None, **kwargs):
+        super(PackingMaster, self).__init__(*args, **kwargs)
+        self.cost_model = (cost_model if cost_model is not None else
+                           CostModel(self.config_generator.configspace))
+        self.early_promotion = early_promotion
+        self.packing_report = packing_report
+        self.config.update({'cost_aware': True,
+                            'early_promotion': early_promotion})
+
+    def get_next_iteration(self, iteration, iteration_kwargs={}):
+        it = super(PackingMaster, self).get_next_iteration(iteration,
+                                                           iteration_kwargs)
+        return PackedSuccessiveHalving(
+            HPB_iter=it.HPB_iter, num_configs=it.num_configs,
+            budgets=it.budgets, config_sampler=it.config_sampler,
+            cost_model=self.cost_model, early_promotion=self.early_promotion,
+            **iteration_kwargs)
+
+    def job_callback(self, job):
+        with self.thread_cond:
+            self.cost_model.add_job(job)
+        super(PackingMaster, self).job_callback(job)
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        result = super(PackingMaster, self).run(
+            n_iterations=n_iterations, min_n_workers=min_n_workers,
+            iteration_kwargs=iteration_kwargs)
+
+        with self.dispatcher.discover_cond:
+            num_workers = len(self.dispatcher.worker_pool) or None
+        report = schedule_report(runs_from_iterations(self.iterations),
+                                 num_workers)
+        early = {it.HPB_iter: getattr(it, 'num_early_promotions', 0)
+                 for it in self.iterations}
+        for entry in report['iterations']:
+            entry['early_promotions'] = early.get(entry['iteration'], 0)
+            self.logger.info('PACKING: iteration %i took %.1fs, %.0f%% of '
+                             'the worker time was idle'
+                             % (entry['iteration'], entry['makespan'],
+                                100 * (1 - entry['utilization'])))
+
+        result.HB_config['packing'] = report
+        if self.packing_report is not None:
+            with open(str(self.packing_report), 'w') as f:
+                json.dump(report, f, indent=2)
+        return result
@@ -0,0 +1,140 @@
+"""
+Content-addressed storage for large result payloads.
+
+Everything a worker puts into the info of a result is sent to the master
+via Pyro, kept in the ``Result`` in memory and written inline to
+'results.json'. For the cartpole benchmark, e.g., that's the returns of all
+runs of every evaluation. Learning curves or model artifacts would be larger
+still.
+
+A :class:`PayloadStore` is a directory on the filesystem that the workers
+share, e.g. in the working directory of the run. Workers write large
+payloads to the store and send a small handle instead. The handle is a json
+dict ``{'__payload__': <sha256 of the payload>, 'bytes': <size>}``, so
+results.json stays readable by HpBandSter and CAVE. Each payload is stored
+once under its hash, a payload that several results share needs no
+additional space.
+
+The analysis reads the payloads back with :meth:`PayloadStore.load_info` or
+:func:`load_result_payloads`.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+HANDLE_KEY = '__payload__'
+
+
+def is_handle(value):
+    """
+    Whether ``value`` is the handle of a payload.
+    """
+    return isinstance(value, dict) and HANDLE_KEY in value
+
+
+class PayloadStore(object):
+    """
+    Payloads in ``directory``, stored as pickles under their sha256.
+
+    Args:
+        directory (str): directory of the store. Created if it doesn't
+            exist. Workers on other hosts need it on a shared filesystem.
+        threshold (int, optional): pickled size in bytes, from which
+            :meth:`offload_info` moves an info field to the store.
+            Default: 10 kB.
+    """
+
+    def __init__(self, directory, threshold=10000):
+        self.directory = str(directory)
+        self.threshold = threshold
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, digest):
+        # two levels, so no directory gets too many entries
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def put(self, payload):
+        """
+        Stores ``payload``, which must be picklable.
+
+        Returns:
+            dict - the handle of the payload
+        """
+        return self._put(pickle.dumps(payload,
+                                      protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file first, so readers never see a
+            # partial payload. Workers storing the same payload at once
+            # replace it with the same content.
+            fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(path),
+                                            suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_file, path)
+            except BaseException:
+                os.remove(tmp_file)
+                raise
+        return {HANDLE_KEY: digest, 'bytes': len(data)}
+
+    def load(self, handle):
+        """
+        The payload of ``handle``.
+        """
+        with open(self.path(handle[HANDLE_KEY]), 'rb') as f:
+            return pickle.load(f)
+
+    def offload_info(self, info):
+        """
+        Moves the fields of ``info`` that are larger than the threshold to
+        the store.
+
+        Returns:
+            dict - ``info`` with handles instead of the large fields
+        """
+        if not isinstance(info, dict):
+            return info
+        offloaded = {}
+        for key, value in info.items():
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            offloaded[key] = (self._put(data) if len(data) >= self.threshold
+                              else value)
+        return offloaded
+
+    def load_info(self, info):
+        """
+        ``info`` with the payloads instead of their handles.
+        """
+        if not isinstance(info, dict):
+            return info
+        return {key: self.load(value) if is_handle(value) else value
+                for key, value in info.items()}
+
+
+def load_result_payloads(result, directory):
+    """
+    Replaces the handles in the info of all runs of an HpBandSter result with
+    their payloads.
+
+    Args:
+        result (hpbandster.core.result.Result): e.g. loaded with
+            ``logged_results_to_HBS_result``.
+        directory (str): directory of the :class:`PayloadStore`.
+
+    Returns:
+        hpbandster.core.result.Result - ``result``, changed in place
+    """
+    store = PayloadStore(directory)
+    for datum in result.data.values():
+        for budget, res in datum.results.items():
+            if res is not None:
+                res['info'] = store.load_info(res['info'])
+    return result
@@ -0,0 +1,314 @@
+"""
+Surrogate-model prefilter for the configurations on the smallest budget.
+
+Most of the compute of a BOHB or HyperBand run goes into the brackets that
+start on ``min_budget`` with many configurations, and many of them are
+predictably bad given the results so far. A :class:`SurrogatePrefilter` is
+a random forest regression of the loss on the configuration and the budget,
+fitted on all results of the run and, optionally, on the logged results of
+earlier runs.
+
+The :class:`PrefilterMaster` mixin uses it in every bracket that starts on
+``min_budget``: once the model has enough observations, the bracket samples
+its candidates from the optimizer as before, e.g. from BOHB's model, scores
+all of them in one call and dispatches only the best ``keep`` fraction, but
+at least as many as the bracket promotes. The rest is never evaluated.
+
+The predicted loss of a dispatched configuration is stored as
+``predicted_loss`` in its info in 'configs.json'. The number of candidates,
+the skip rate and the error of the predictions on the dispatched
+configurations are stored as 'prefilter' in the config of the result, to
+check that the evaluations saved don't cost incumbent quality.
+"""
+
+import json
+import math
+
+import numpy as np
+import scipy.stats as sps
+import ConfigSpace
+import hpbandster.core.result as hpres
+
+
+class SurrogatePrefilter(object):
+    """
+    Random forest regression of the loss of a configuration on a budget.
+
+    Args:
+        configspace (ConfigSpace.ConfigurationSpace): the search space.
+        keep (float, optional): fraction of the candidates that is
+            dispatched. Default: 0.5.
+        oversampling (int, optional): a bracket scores this many times as
+            many candidates as it would evaluate without the prefilter.
+            Default: 1.
+        min_points (int, optional): results needed before the model is used.
+            Default: twice the number of hyperparameters plus 2.
+        num_trees (int, optional): number of trees of the forest. Default: 50.
+        seed (int, optional): seed of the forest.
+    """
+
+    def __init__(self, configspace, keep=0.5, oversampling=1, min_points=None,
+                 num_trees=50, seed=None):
+        if not 0 < keep <= 1:
+            raise ValueError('keep must be in (0, 1], not %s' % keep)
+        self.configspace = configspace
+        self.keep = keep
+        self.oversampling = oversampling
+        self.min_points = (min_points if min_points is not None else
+                           2 * len(configspace.get_hyperparameters()) + 2)
+        self.num_trees = num_trees
+        self.seed = seed
+        self.features = []
+        self.losses = []
+        # None once new observations came in
+        self.model = None
+
+        self.num_candidates = 0
+        self.num_dispatched = 0
+        # evaluations the brackets would have done without the prefilter
+        self.num_saved = 0
+        # (predicted, observed) loss of the dispatched configurations
+        self.predictions = []
+
+    def _features(self, config, budget):
+        vector = ConfigSpace.Configuration(self.configspace,
+                                           values=config).get_array()
+        # inactive hyperparameters are NaN
+        return np.concatenate([np.nan_to_num(vector, nan=-1.),
+                               [np.log(budget)]])
+
+    def add(self, config, budget, loss):
+        """
+        Adds the loss of ``config`` on ``budget``. Crashed evaluations, whose
+        loss is None or not finite, are left out.
+        """
+        if loss is None or not np.isfinite(loss):
+            return
+        self.features.append(self._features(config, budget))
+        self.losses.append(float(loss))
+        self.model = None
+
+    def add_job(self, job):
+        """
+        Adds the result of a finished ``hpbandster.core.dispatcher.Job``.
+        """
+        if job.result is not None:
+            self.add(job.kwargs['config'], job.kwargs['budget'],
+                     job.result.get('loss'))
+
+    def load_results(self, directory):
+        """
+        Adds all results logged to ``directory`` by a json result logger,
+        e.g. of previous runs on the same problem. Configurations that don't
+        belong to the search space are skipped.
+
+        Returns:
+            int - the number of results added
+        """
+        result = hpres.logged_results_to_HBS_result(str(directory))
+        id2config = result.get_id2config_mapping()
+        num_added = 0
+        for run in result.get_all_runs():
+            num_points = len(self.losses)
+            try:
+                self.add(id2config[run.config_id]['config'], run.budget,
+                         run.loss)
+            except (KeyError, TypeError, ValueError):
+                continue
+            num_added += len(self.losses) - num_points
+        return num_added
+
+    def is_ready(self):
+        return len(self.losses) >= self.min_points
+
+    def predict(self, configs, budget):
+        """
+        Predicted losses of ``configs`` on ``budget``, in one call of the
+        forest.
+
+        Returns:
+            np.ndarray - the predicted losses
+        """
+        if self.model is None:
+            self._fit()
+        X = np.array([self._features(c, budget) for c in configs])
+        return self.model.predict(X)
+
+    def _fit(self):
+        # scikit-learn is only needed with the prefilter
+        from sklearn.ensemble import RandomForestRegressor
+        self.model = RandomForestRegressor(n_estimators=self.num_trees,
+                                           random_state=self.seed)
+        self.model.fit(np.array(self.features), np.array(self.losses))
+
+    def num_dispatched_of(self, num_configs, num_promoted):
+        """
+        Number of the ``num_configs`` configurations of a rung that are
+        dispatched, at least the ``num_promoted`` ones the rung promotes.
+        """
+        return min(num_configs, max(int(math.ceil(self.keep * num_configs)),
+                                    num_promoted, 1))
+
+    def select(self, candidates, budget, num_dispatched):
+        """
+        The most promising candidates.
+
+        Args:
+            candidates (list of (dict, dict)): configurations and their info,
+                as returned by a config sampler.
+            budget (float): budget they are evaluated on.
+            num_dispatched (int): number of candidates to keep.
+
+        Returns:
+            list of (dict, dict) - the best ``num_dispatched`` candidates by
+                their predicted loss, best first, with the prediction as
+                'predicted_loss' in their info
+        """
+        predicted = self.predict([config for config, _ in candidates], budget)
+        selected = []
+        for i in np.argsort(predicted, kind='stable')[:num_dispatched]:
+            config, info = candidates[i]
+            info = dict(info or {})
+            info['predicted_loss'] = float(predicted[i])
+            selected.append((config, info))
+        self.num_candidates += len(candidates)
+        self.num_dispatched += len(selected)
+        return selected
+
+    def add_prediction(self, predicted, loss):
+        """
+        Records the observed ``loss`` of a configuration whose loss was
+        ``predicted``.
+        """
+        if loss is not None and np.isfinite(loss):
+            self.predictions.append((predicted, float(loss)))
+
+    def report(self):
+        """
+        Skip rate of the candidates and error of the predictions.
+
+        Returns:
+            dict - 'num_candidates', 'num_dispatched', 'num_saved',
+                'skip_rate', 'num_predictions', 'mean_absolute_error' and
+                'rank_correlation' (Spearman) of the predicted and observed
+                losses of the dispatched configurations
+        """
+        report = {'num_candidates': self.num_candidates,
+                  'num_dispatched': self.num_dispatched,
+                  'num_saved': self.num_saved,
+                  'skip_rate': (1. - self.num_dispatched / self.num_candidates
+                                if self.num_candidates else 0.),
+                  'num_predictions': len(self.predictions),
+                  'mean_absolute_error': None,
+                  'rank_correlation': None}
+        if self.predictions:
+            predicted, observed = np.array(self.predictions).T
+            report['mean_absolute_error'] = float(np.mean(np.abs(
+                predicted - observed)))
+            if len(self.predictions) > 2 and np.ptp(predicted) > 0 and \
+                    np.ptp(observed) > 0:
+                report['rank_correlation'] = float(
+                    sps.spearmanr(predicted, observed)[0])
+        return report
+
+
+class PrefilterMaster(object):
+    """
+    Master mixin that dispatches only the most promising configurations of
+    the brackets starting on ``min_budget``, see :mod:`scripts.prefilter`.
+
+    It replaces the config sampler of the iterations, so it works with every
+    kind of iteration, e.g. of :mod:`scripts.packing` or
+    :mod:`scripts.asha`, if it comes before their mixins.
+
+    Args:
+        prefilter (SurrogatePrefilter, optional): the model, e.g. warm
+            started with :meth:`SurrogatePrefilter.load_results`. A new one
+            is learned during the run if None.
+        prefilter_report (str, optional): json file the report of the
+            prefilter is written to.
+    """
+
+    def __init__(self, *args, prefilter=None, prefilter_report=None,
+                 **kwargs):
+        super(PrefilterMaster, self).__init__(*args, **kwargs)
+        self.prefilter = (prefilter if prefilter is not None else
+                          SurrogatePrefilter(self.config_generator.configspace))
+        self.prefilter_report = prefilter_report
+
+    def get_next_iteration(self, iteration, iteration_kwargs={}):
+        it = super(PrefilterMaster, self).get_next_iteration(iteration,
+                                                             iteration_kwargs)
+        if np.isclose(it.budgets[0], self.budgets[0]):
+            it.num_configs = list(it.num_configs)
+            it.config_sampler = self._prefiltered_sampler(it)
+        return it
+
+    def _prefiltered_sampler(self, it):
+        sampler = it.config_sampler
+        selected = []
+
+        def sample(budget):
+            # The candidates are sampled and scored when the iteration needs
+            # its first configuration, so the model has all results up to
+            # then. A resumed iteration samples the rest without the model.
+            if it.actual_num_configs[0] == 0 and not selected and \
+                    self.prefilter.is_ready():
+                num_configs = it.num_configs[0]
+                num_promoted = it.num_configs[1] if len(it.num_configs) > 1 \
+                    else 1
+                num_dispatched = self.prefilter.num_dispatched_of(
+                    num_configs, num_promoted)
+                candidates = [sampler(budget) for _ in range(
+                    num_configs * self.prefilter.oversampling)]
+                selected.extend(self.prefilter.select(candidates, budget,
+                                                      num_dispatched))
+                it.num_configs[0] = num_dispatched
+                self.prefilter.num_saved += num_configs - num_dispatched
+                self.logger.debug('PREFILTER: dispatching %i of %i '
+                                  'candidates of iteration %i'
+                                  % (num_dispatched, len(candidates),
+                                     it.HPB_iter))
+            if selected:
+                return selected.pop(0)
+            return sampler(budget)
+
+        return sample
+
+    def job_callback(self, job):
+        with self.thread_cond:
+            self.prefilter.add_job(job)
+            datum = self.iterations[job.id[0]].data.get(job.id)
+            info = datum.config_info if datum is not None else None
+            if isinstance(info, dict) and 'predicted_loss' in info and \
+                    job.result is not None and \
+                    np.isclose(job.kwargs['budget'], self.budgets[0]):
+                self.prefilter.add_prediction(info['predicted_loss'],
+                                              job.result.get('loss'))
+        super(PrefilterMaster, self).job_callback(job)
+
+    def run(self, n_iterations=1, min_n_workers=1, iteration_kwargs={}):
+        # the results of the iterations restored from a checkpoint
+        with self.thread_cond:
+            for it in self.iterations:
+                for datum in it.data.values():
+                    for budget, res in datum.results.items():
+                        if res is not None:
+                            self.prefilter.add(datum.config, budget,
+                                               res.get('loss'))
+
+        result = super(PrefilterMaster, self).run(
+            n_iterations=n_iterations, min_n_workers=min_n_workers,
+            iteration_kwargs=iteration_kwargs)
+
+        report = self.prefilter.report()
+        self.logger.info('PREFILTER: skipped %i of %i candidates, saving %i '
+                         'evaluations on budget %g'
+                         % (report['num_candidates'] - report['num_dispatched'],
+                            report['num_candidates'], report['num_saved'],
+                            self.budgets[0]))
+        result.HB_config['prefilter'] = report
+        if self.prefilter_report is not None:
+            with open(str(self.prefilter_report), 'w') as f:
+                json.dump(report, f, indent=2)
+        return result
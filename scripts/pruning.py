@@ -0,0 +1,253 @@
+"""
+Learning-curve based pruning within a budget.
+
+Objectives like an MLP trained for ``max_iter=int(budget)`` epochs only report
+a loss at the very end. Hopeless configurations therefore always use up their
+whole budget. With pruning, the objective reports intermediate losses while it
+trains. The :class:`RungPruner` running next to the master compares each
+report against the losses of the configurations that already finished in the
+same rung (same iteration and budget) at the same point of training. Once as
+many finished runs were better at that point as the rung promotes to the next
+budget, the run cannot be promoted anymore. The report then raises
+:class:`EarlyStopped` in the worker and the partial result is logged as an
+early-stopped evaluation.
+
+Workers get a report function via :func:`get_reporter`::
+
+    def compute(self, config_id, config, budget, **kwargs):
+        report = get_reporter(self, config_id, budget)
+        try:
+            for epoch in range(1, int(budget) + 1):
+                ...
+                if report is not None:
+                    report(loss, epoch)
+        except EarlyStopped as e:
+            return {'loss': e.loss, 'info': early_stopped_info(e)}
+"""
+
+import threading
+
+import Pyro4
+import Pyro4.errors
+
+
+class EarlyStopped(Exception):
+    """
+    Raised by the report function when the master decided to stop the run.
+
+    Args:
+        loss (float): the last reported loss.
+        step (float): the step (e.g. epoch) at which the run was stopped.
+    """
+
+    def __init__(self, loss, step):
+        super(EarlyStopped, self).__init__(
+            'Stopped at step %s with loss %s' % (step, loss))
+        self.loss = loss
+        self.step = step
+
+
+def early_stopped_info(stopped):
+    """
+    Info entries logged for an early-stopped evaluation.
+    """
+    return {'early_stopped': True,
+            'stopped_at': stopped.step}
+
+
+class RungPruner(object):
+    """
+    Decides whether running evaluations should be stopped.
+
+    Every rung, i.e. the evaluations of one iteration on one budget, keeps the
+    learning curves reported by its evaluations. A reported loss is compared to
+    the losses of the finished evaluations of the same rung at the same step.
+    The evaluation is stopped if at least as many of them were better as the
+    rung promotes, since it can't be promoted anymore then. The number of
+    promotions is set by the master with :meth:`set_promotions`, evaluations
+    of rungs without one are never stopped.
+
+    Early-stopped evaluations only serve as reference up to the step at which
+    they were stopped.
+    """
+
+    def __init__(self):
+        # (iteration, budget) -> config_id -> {step: loss}
+        self.curves = {}
+        # (iteration, budget) -> set of finished config_ids
+        self.finished = {}
+        # (iteration, budget) -> config_id -> step it was stopped at
+        self.stopped = {}
+        # (iteration, budget) -> number of configurations promoted
+        self.promotions = {}
+        self.num_reports = 0
+        self.num_stopped = 0
+        self.lock = threading.Lock()
+
+        self.pyro_id = None
+        self.pyro_daemon = None
+        self.nameserver = None
+        self.nameserver_port = None
+
+    @staticmethod
+    def _rung(config_id, budget):
+        return int(config_id[0]), float(budget)
+
+    def set_promotions(self, iteration, budget, num_promoted):
+        """
+        Sets how many configurations of a rung make it to the next budget.
+
+        Args:
+            iteration (int): the iteration of the rung.
+            budget (float): the budget of the rung.
+            num_promoted (int): configurations promoted from the rung. For the
+                last rung of an iteration, this is 1: a run is only continued
+                while it can still become the best of the rung.
+        """
+        with self.lock:
+            self.promotions[(int(iteration), float(budget))] = num_promoted
+
+    @Pyro4.expose
+    def report(self, config_id, budget, step, loss):
+        """
+        Registers an intermediate loss of a running evaluation.
+
+        Args:
+            config_id (tuple): id of the evaluated configuration.
+            budget (float): budget of the evaluation.
+            step (float): progress of the evaluation, e.g. the epoch.
+            loss (float): the intermediate loss.
+
+        Returns:
+            bool - True if the evaluation should stop
+        """
+        config_id = tuple(config_id)
+        rung = self._rung(config_id, budget)
+        with self.lock:
+            self.num_reports += 1
+            curves = self.curves.setdefault(rung, {})
+            curves.setdefault(config_id, {})[step] = loss
+
+            num_promoted = self.promotions.get(rung)
+            if num_promoted is None:
+                return False
+
+            stopped = self.stopped.get(rung, {})
+            num_better = 0
+            for cid in self.finished.get(rung, ()):
+                # a stopped run tells nothing about the steps after it
+                if cid in stopped and stopped[cid] < step:
+                    continue
+                steps = [s for s in curves.get(cid, {}) if s <= step]
+                if steps and curves[cid][max(steps)] < loss:
+                    num_better += 1
+
+            stop = num_better >= max(1, num_promoted)
+            if stop:
+                self.num_stopped += 1
+            return stop
+
+    def register_result(self, job):
+        """
+        Marks an evaluation as finished. Called by the master for every job.
+        """
+        config_id = tuple(job.id)
+        budget = job.kwargs['budget']
+        rung = self._rung(config_id, budget)
+        with self.lock:
+            curve = self.curves.setdefault(rung, {}).setdefault(config_id, {})
+            result = job.result
+            info = result.get('info') if result is not None else None
+            if isinstance(info, dict) and info.get('early_stopped'):
+                self.stopped.setdefault(rung, {})[config_id] = \
+                    info['stopped_at']
+            elif result is not None:
+                # the final loss of a completed run counts for its last step
+                curve.setdefault(budget, result['loss'])
+            self.finished.setdefault(rung, set()).add(config_id)
+
+    def start(self, run_id, host, nameserver, nameserver_port):
+        """
+        Makes the pruner available to remote workers through the nameserver.
+        """
+        self.pyro_id = 'hpbandster.run_%s.pruner' % run_id
+        self.nameserver = nameserver
+        self.nameserver_port = nameserver_port
+        self.pyro_daemon = Pyro4.core.Daemon(host=host)
+        uri = self.pyro_daemon.register(self, self.pyro_id)
+        with Pyro4.locateNS(host=nameserver, port=nameserver_port) as ns:
+            ns.register(self.pyro_id, uri)
+        thread = threading.Thread(target=self.pyro_daemon.requestLoop,
+                                  name='pruner')
+        thread.daemon = True
+        thread.start()
+
+    def shutdown(self):
+        if self.pyro_daemon is None:
+            return
+        with Pyro4.locateNS(host=self.nameserver,
+                            port=self.nameserver_port) as ns:
+            ns.remove(self.pyro_id)
+        self.pyro_daemon.shutdown()
+        self.pyro_daemon = None
+
+
+class PruningMaster(object):
+    """
+    Master mixin that informs a :class:`RungPruner` about the rungs and the
+    finished jobs.
+
+    Args:
+        pruner (RungPruner, optional): the pruner of this run.
+    """
+
+    def __init__(self, *args, pruner=None, **kwargs):
+        super(PruningMaster, self).__init__(*args, **kwargs)
+        self.pruner = pruner
+
+    def _submit_job(self, config_id, config, budget):
+        if self.pruner is not None:
+            iteration = self.iterations[config_id[0]]
+            stage = list(iteration.budgets).index(budget)
+            num_promoted = iteration.num_configs[stage + 1] \
+                if stage + 1 < len(iteration.num_configs) else 1
+            self.pruner.set_promotions(config_id[0], budget, num_promoted)
+        super(PruningMaster, self)._submit_job(config_id, config, budget)
+
+    def job_callback(self, job):
+        if self.pruner is not None:
+            self.pruner.register_result(job)
+        super(PruningMaster, self).job_callback(job)
+
+
+def get_reporter(worker, config_id, budget, pruner=None):
+    """
+    Returns the report function for one evaluation of a worker.
+
+    Args:
+        worker (hpbandster.core.worker.Worker): the evaluating worker. Used
+            to look up the pruner of its run at the nameserver.
+        config_id (tuple): id of the evaluated configuration.
+        budget (float): budget of the evaluation.
+        pruner (RungPruner, optional): use this pruner directly instead of
+            looking it up, e.g. for workers in the master's process.
+
+    Returns:
+        callable or None - ``report(loss, step)``, which raises
+            :class:`EarlyStopped` if the run should stop. None if the run
+            does not use pruning.
+    """
+    if pruner is None:
+        try:
+            with Pyro4.locateNS(host=worker.nameserver,
+                                port=worker.nameserver_port) as ns:
+                uri = ns.lookup('hpbandster.run_%s.pruner' % worker.run_id)
+        except Pyro4.errors.NamingError:
+            return None
+        pruner = Pyro4.Proxy(uri)
+
+    def report(loss, step):
+        if pruner.report(config_id, budget, step, float(loss)):
+            raise EarlyStopped(float(loss), step)
+
+    return report
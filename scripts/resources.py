@@ -0,0 +1,263 @@
+"""
+Thread budgeting for workers that share a node.
+
+Numerical libraries (BLAS, OpenMP, TensorFlow) size their thread pools after
+the number of cores of the machine, not after the number of cores that were
+actually granted to the job. When several workers run on the same node this
+leads to oversubscription, or, if everything is pinned to a single thread, to
+idle cores.
+
+The :class:`ResourceManager` detects the cores available to the process
+(CPU affinity and cgroup quota), splits them between the workers co-located on
+the node and sets the thread pools accordingly. The chosen layout is a plain
+dict, which workers add to the ``info`` of every result.
+
+TensorFlow reads its thread pool sizes only from the config of a session.
+Benchmarks like hpolib's cartpole create their sessions internally, so
+:func:`limit_tf_sessions` makes every session created without a config use
+the layout.
+"""
+
+import os
+import math
+import threading
+
+
+# Environment variables read by the common BLAS/OpenMP implementations.
+THREAD_ENV_VARS = ('OMP_NUM_THREADS',
+                   'OPENBLAS_NUM_THREADS',
+                   'MKL_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS',
+                   'NUMEXPR_NUM_THREADS')
+
+
+def _cgroup_cpu_limit():
+    """
+    Reads the CPU quota of the cgroup this process belongs to.
+
+    Returns:
+        float or None - number of cores granted by the quota, or None if
+            there is no quota (or no cgroup information available)
+    """
+    # cgroup v2
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', 'r') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us', 'r') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def available_cores():
+    """
+    Number of cores this process may use.
+
+    Takes the CPU affinity mask, the cgroup CPU quota and the cores granted by
+    SLURM (``SLURM_CPUS_PER_TASK``) into account and returns the smallest of
+    them.
+
+    Returns:
+        int - number of available cores (at least 1)
+    """
+    try:
+        affinity = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        affinity = list(range(os.cpu_count() or 1))
+    cores = len(affinity)
+
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cores = min(cores, max(1, int(math.floor(quota))))
+
+    slurm_cpus = os.environ.get('SLURM_CPUS_PER_TASK')
+    if slurm_cpus is not None and slurm_cpus.isdigit():
+        cores = min(cores, int(slurm_cpus))
+
+    return max(1, cores)
+
+
+def thread_layout(workers_per_node=1, worker_index=0):
+    """
+    Splits the available cores between the workers on this node.
+
+    Args:
+        workers_per_node (int): number of workers sharing the cores of this
+            node (or of this process, if the workers are threads).
+        worker_index (int): index of this worker among the co-located
+            workers. Determines which cores it is pinned to.
+
+    Returns:
+        dict - the layout with the entries
+            - ``cores_available``: cores detected for the process
+            - ``workers_per_node``: number of co-located workers
+            - ``worker_index``: index of this worker
+            - ``threads``: size of the thread pools of this worker
+            - ``cpus``: the cores assigned to this worker
+    """
+    workers_per_node = max(1, int(workers_per_node))
+    worker_index = int(worker_index) % workers_per_node
+
+    try:
+        affinity = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        affinity = list(range(os.cpu_count() or 1))
+    cores = available_cores()
+    affinity = affinity[:cores]
+
+    threads = max(1, cores // workers_per_node)
+    start = (worker_index * threads) % len(affinity)
+    cpus = affinity[start:start + threads]
+
+    return {'cores_available': cores,
+            'workers_per_node': workers_per_node,
+            'worker_index': worker_index,
+            'threads': threads,
+            'cpus': cpus}
+
+
+_tf_session_init = None
+_tf_lock = threading.Lock()
+
+
+def limit_tf_sessions(threads):
+    """
+    Makes TensorFlow sessions created without a config use ``threads``
+    threads for their operations.
+
+    Args:
+        threads (int): size of the intra-op thread pool. The inter-op pool
+            gets a single thread.
+    """
+    global _tf_session_init
+    import tensorflow as tf
+
+    default = tf.ConfigProto(intra_op_parallelism_threads=threads,
+                             inter_op_parallelism_threads=1)
+    with _tf_lock:
+        if _tf_session_init is None:
+            _tf_session_init = tf.Session.__init__
+        init = _tf_session_init
+
+        def __init__(session, target='', graph=None, config=None):
+            init(session, target, graph,
+                 config if config is not None else default)
+
+        tf.Session.__init__ = __init__
+
+
+def restore_tf_sessions():
+    """
+    Undoes :func:`limit_tf_sessions`.
+    """
+    global _tf_session_init
+    with _tf_lock:
+        if _tf_session_init is None:
+            return
+        import tensorflow as tf
+        tf.Session.__init__ = _tf_session_init
+        _tf_session_init = None
+
+
+class ResourceManager(object):
+    """
+    Detects the cores of the node and sets the thread pools of this worker.
+
+    The environment variables of the BLAS/OpenMP implementations are only read
+    when those libraries are loaded, so apply the manager before importing
+    the benchmarks. The thread pools of libraries that were loaded before,
+    like numpy's BLAS, are limited with ``threadpoolctl``.
+
+    Args:
+        workers_per_node (int): number of workers sharing the node.
+        worker_index (int, optional): index of this worker on the node. By
+            default it is read from ``SLURM_LOCALID``, or 0.
+        pin (bool): if True, the process is pinned to the cores of its
+            share. Only sensible if every worker runs in its own process.
+    """
+
+    def __init__(self, workers_per_node=1, worker_index=None, pin=False):
+        if worker_index is None:
+            worker_index = int(os.environ.get('SLURM_LOCALID', 0))
+        self.pin = pin
+        self.layout = thread_layout(workers_per_node, worker_index)
+        self._limits = None
+        self._environ = None
+        self._tf = False
+
+    @property
+    def threads(self):
+        return self.layout['threads']
+
+    def apply(self):
+        """
+        Sets the thread pools of BLAS/OpenMP (and the affinity if requested).
+
+        Returns:
+            dict - the applied layout
+        """
+        self._environ = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(self.threads)
+
+        try:
+            from threadpoolctl import threadpool_limits
+            self._limits = threadpool_limits(limits=self.threads)
+        except ImportError:
+            pass
+
+        if self.pin and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.layout['cpus'])
+
+        return self.layout
+
+    def restore(self):
+        """
+        Restores the thread pool settings from before :meth:`apply`.
+        """
+        if self._tf:
+            restore_tf_sessions()
+            self._tf = False
+        if self._limits is not None:
+            self._limits.restore_original_limits()
+            self._limits = None
+        if self._environ is not None:
+            for var, value in self._environ.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+            self._environ = None
+
+    def limit_tf_sessions(self):
+        """
+        Sizes the thread pools of TensorFlow sessions created without a config,
+        see :func:`limit_tf_sessions`. Undone by :meth:`restore`.
+        """
+        limit_tf_sessions(self.threads)
+        self._tf = True
+
+    def tf_session_config(self):
+        """
+        TensorFlow session configuration matching the layout.
+
+        Returns:
+            tf.ConfigProto - to be passed to ``tf.Session(config=...)``
+        """
+        import tensorflow as tf
+        return tf.ConfigProto(intra_op_parallelism_threads=self.threads,
+                              inter_op_parallelism_threads=1)
@@ -0,0 +1,454 @@
+"""
+A SQLite store for the results of many runs.
+
+HpBandSter's json result logger writes a 'configs.json' and a 'results.json'
+per run directory. Comparing methods across ``opt_results/**`` means parsing
+every file again, and several masters can't share the files. A
+:class:`ResultStore` keeps the configurations and results of any number of
+runs in one SQLite database, each run identified by its experiment (e.g.
+'paramnet_surrogates/adult'), optimizer and run_id. The results are indexed
+by run, budget, loss and finishing time, so queries like
+:meth:`ResultStore.best_losses` over all runs are answered by the database.
+
+Several masters and analysis processes can use a store at the same time.
+It runs in write-ahead-log (WAL) mode, where readers don't block the
+writer. WAL needs shared memory between the processes, so they all have to
+run on the same host, with the database on a local disk. On a network
+filesystem, use ``journal_mode='delete'`` instead, which relies on the file
+locks of the filesystem, or give every host its own store and merge them
+with :meth:`ResultStore.import_directory` on the json logs.
+
+:class:`StoreResultLogger` is a result logger for the masters, which writes
+the json files as before and adds every configuration and result to a store
+as it comes in. :meth:`ResultStore.export` writes a run back to the json
+layout, e.g. for CAVE. From the command line::
+
+    python result_store.py results.db import opt_results/
+    python result_store.py results.db best --time 3600
+    python result_store.py results.db export bnn/bostonhousing bohb 0 out/
+"""
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+from scripts.checkpoint import ResumableResultLogger
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    optimizer TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    -- earliest submission of a job of the run
+    time_ref REAL,
+    UNIQUE (experiment, optimizer, run_id)
+);
+CREATE TABLE IF NOT EXISTS configs (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    config_id TEXT NOT NULL,
+    config TEXT NOT NULL,
+    config_info TEXT,
+    PRIMARY KEY (run, config_id)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    config_id TEXT NOT NULL,
+    budget REAL NOT NULL,
+    submitted REAL,
+    started REAL,
+    finished REAL,
+    -- NULL for crashed evaluations
+    loss REAL,
+    result TEXT,
+    exception TEXT,
+    PRIMARY KEY (run, config_id, budget)
+);
+CREATE INDEX IF NOT EXISTS results_by_budget ON results (run, budget, loss);
+CREATE INDEX IF NOT EXISTS results_by_time ON results (run, finished, loss);
+CREATE INDEX IF NOT EXISTS runs_by_optimizer ON runs (optimizer, experiment);
+"""
+
+
+def _finite(loss):
+    # NaN and inf losses are stored as crashed, like HpBandSter treats them
+    if isinstance(loss, (int, float)) and math.isfinite(loss):
+        return float(loss)
+    return None
+
+
+class ResultStore(object):
+    """
+    Results of many runs in one SQLite database.
+
+    Args:
+        path (str): file of the database, created if it doesn't exist.
+        journal_mode (str, optional): 'wal' (default) for processes on one
+            host, 'delete' for a database on a network filesystem.
+        timeout (float, optional): seconds a writer waits for another one
+            before it fails. Default: 60.
+    """
+
+    def __init__(self, path, journal_mode='wal', timeout=60):
+        self.path = str(path)
+        # one connection, shared by the threads of a master
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(self.path, timeout=timeout,
+                                           check_same_thread=False)
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=%s' % journal_mode)
+            # with WAL, a commit is durable once the log is checkpointed
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _execute(self, statements):
+        # statements is a list of (sql, parameters), run in one transaction
+        with self._lock, self._connection:
+            cursor = None
+            for sql, parameters in statements:
+                cursor = self._connection.execute(sql, parameters)
+            return cursor
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def run(self, experiment, optimizer, run_id, overwrite=False):
+        """
+        Key of a run, which is added if it doesn't exist.
+
+        Args:
+            overwrite (bool, optional): drop the configurations and results
+                of an existing run with the same name.
+
+        Returns:
+            int - the key of the run in the store
+        """
+        key = (str(experiment), str(optimizer), str(run_id))
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR IGNORE INTO runs (experiment, optimizer, run_id) '
+                'VALUES (?, ?, ?)', key)
+            run = self._connection.execute(
+                'SELECT id FROM runs WHERE experiment = ? AND optimizer = ? '
+                'AND run_id = ?', key).fetchone()[0]
+            if overwrite:
+                for table in ['configs', 'results']:
+                    self._connection.execute(
+                        'DELETE FROM %s WHERE run = ?' % table, (run,))
+                self._connection.execute(
+                    'UPDATE runs SET time_ref = NULL WHERE id = ?', (run,))
+        return run
+
+    def runs(self, experiment=None, optimizer=None):
+        """
+        The runs in the store.
+
+        Returns:
+            list of dict - 'experiment', 'optimizer', 'run_id' and
+                'num_results' of every run
+        """
+        where, parameters = self._filter(experiment, optimizer)
+        rows = self._query(
+            'SELECT r.experiment, r.optimizer, r.run_id, COUNT(s.run) '
+            'FROM runs r LEFT JOIN results s ON s.run = r.id %s '
+            'GROUP BY r.id ORDER BY r.experiment, r.optimizer, r.run_id'
+            % where, parameters)
+        return [{'experiment': e, 'optimizer': o, 'run_id': i,
+                 'num_results': n} for e, o, i, n in rows]
+
+    def add_config(self, run, config_id, config, config_info=None):
+        """
+        Adds a sampled configuration to the run with the key ``run``.
+        """
+        self._execute([(
+            'INSERT OR REPLACE INTO configs VALUES (?, ?, ?, ?)',
+            (run, json.dumps(list(config_id)), json.dumps(config),
+             json.dumps(config_info)))])
+
+    def add_result(self, run, config_id, budget, timestamps, result,
+                   exception=None):
+        """
+        Adds the result of an evaluation to the run with the key ``run``. A
+        result of the same configuration and budget is replaced.
+
+        Args:
+            timestamps (dict): 'submitted', 'started' and 'finished'.
+            result (dict): 'loss' and 'info', None if the evaluation crashed.
+        """
+        loss = _finite(result.get('loss')) if result is not None else None
+        submitted = timestamps.get('submitted')
+        self._execute([
+            ('INSERT OR REPLACE INTO results VALUES '
+             '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+             (run, json.dumps(list(config_id)), float(budget), submitted,
+              timestamps.get('started'), timestamps.get('finished'), loss,
+              json.dumps(result), exception)),
+            ('UPDATE runs SET time_ref = MIN(COALESCE(time_ref, ?), ?) '
+             'WHERE id = ?', (submitted, submitted, run))])
+
+    def import_directory(self, directory, experiment, optimizer, run_id):
+        """
+        Adds a run logged by a json result logger to ``directory``. A run of
+        the same name in the store is replaced.
+
+        Returns:
+            int - the number of results added
+        """
+        run = self.run(experiment, optimizer, run_id, overwrite=True)
+        configs, results = [], []
+        with open(os.path.join(str(directory), 'configs.json')) as f:
+            for line in f:
+                entry = json.loads(line)
+                configs.append((
+                    'INSERT OR REPLACE INTO configs VALUES (?, ?, ?, ?)',
+                    (run, json.dumps(entry[0]), json.dumps(entry[1]),
+                     json.dumps(entry[2] if len(entry) > 2 else None))))
+        with open(os.path.join(str(directory), 'results.json')) as f:
+            for line in f:
+                config_id, budget, timestamps, result, exception = \
+                    json.loads(line)
+                loss = _finite(result.get('loss')) if result else None
+                results.append((
+                    'INSERT OR REPLACE INTO results VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (run, json.dumps(config_id), float(budget),
+                     timestamps.get('submitted'), timestamps.get('started'),
+                     timestamps.get('finished'), loss, json.dumps(result),
+                     exception)))
+        self._execute(configs + results + [(
+            'UPDATE runs SET time_ref = (SELECT MIN(submitted) FROM results '
+            'WHERE run = ?) WHERE id = ?', (run, run))])
+        return len(results)
+
+    def import_result(self, result, experiment, optimizer, run_id):
+        """
+        Adds an ``hpbandster.core.result.Result``, e.g. of SMAC or TPE run
+        by the ICML 2018 workers. A run of the same name is replaced.
+
+        Returns:
+            int - the number of results added
+        """
+        run = self.run(experiment, optimizer, run_id, overwrite=True)
+        id2config = result.get_id2config_mapping()
+        for config_id, entry in id2config.items():
+            self.add_config(run, config_id, entry['config'],
+                            entry.get('config_info'))
+        runs = result.get_all_runs()
+        for r in runs:
+            self.add_result(run, r.config_id, r.budget, r.time_stamps,
+                            {'loss': r.loss, 'info': r.info}
+                            if r.loss is not None else None)
+        return len(runs)
+
+    def export(self, directory, experiment, optimizer, run_id):
+        """
+        Writes a run to 'configs.json' and 'results.json' in ``directory``,
+        as HpBandSter's json result logger does.
+
+        Returns:
+            int - the number of results written
+        """
+        rows = self._query(
+            'SELECT id FROM runs WHERE experiment = ? AND optimizer = ? AND '
+            'run_id = ?', (str(experiment), str(optimizer), str(run_id)))
+        if not rows:
+            raise KeyError('No run %s/%s/%s in %s'
+                           % (experiment, optimizer, run_id, self.path))
+        run = rows[0][0]
+        configs = self._query(
+            'SELECT config_id, config, config_info FROM configs '
+            'WHERE run = ? ORDER BY rowid', (run,))
+        results = self._query(
+            'SELECT config_id, budget, submitted, started, finished, result, '
+            'exception FROM results WHERE run = ? ORDER BY finished', (run,))
+
+        os.makedirs(str(directory), exist_ok=True)
+        with open(os.path.join(str(directory), 'configs.json'), 'w') as f:
+            for config_id, config, config_info in configs:
+                f.write(json.dumps([json.loads(config_id), json.loads(config),
+                                    json.loads(config_info)]))
+                f.write('\n')
+        with open(os.path.join(str(directory), 'results.json'), 'w') as f:
+            for config_id, budget, submitted, started, finished, result, \
+                    exception in results:
+                f.write(json.dumps([json.loads(config_id), budget,
+                                    {'submitted': submitted,
+                                     'started': started,
+                                     'finished': finished},
+                                    json.loads(result), exception]))
+                f.write('\n')
+        return len(results)
+
+    @staticmethod
+    def _filter(experiment=None, optimizer=None):
+        conditions, parameters = [], []
+        if experiment is not None:
+            conditions.append('r.experiment = ?')
+            parameters.append(str(experiment))
+        if optimizer is not None:
+            conditions.append('r.optimizer = ?')
+            parameters.append(str(optimizer))
+        where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return where, parameters
+
+    def best_losses(self, time=None, budget=None, experiment=None,
+                    optimizer=None, per_run=False):
+        """
+        Best loss per optimizer and experiment.
+
+        Args:
+            time (float, optional): only results that finished within this
+                many seconds after the start of their run.
+            budget (float, optional): only results on this budget, e.g. the
+                maximum budget. Default: all budgets.
+            experiment (str, optional): only this experiment.
+            optimizer (str, optional): only this optimizer.
+            per_run (bool, optional): one entry per run, instead of per
+                experiment and optimizer.
+
+        Returns:
+            list of dict - 'experiment', 'optimizer', 'num_runs', 'mean'
+                and 'min' of the best losses of the runs, or per run
+                'run_id', 'loss' and 'num_results'
+        """
+        where, parameters = self._filter(experiment, optimizer)
+        conditions = ['s.loss IS NOT NULL']
+        if time is not None:
+            conditions.append('s.finished - r.time_ref <= ?')
+            parameters.append(float(time))
+        if budget is not None:
+            conditions.append('s.budget = ?')
+            parameters.append(float(budget))
+        where = (where + ' AND ' if where else 'WHERE ') + \
+            ' AND '.join(conditions)
+        runs = ('SELECT r.experiment, r.optimizer, r.run_id, MIN(s.loss) '
+                'AS loss, COUNT(*) AS num_results FROM results s JOIN runs r '
+                'ON s.run = r.id %s GROUP BY s.run' % where)
+
+        if per_run:
+            rows = self._query(runs + ' ORDER BY r.experiment, r.optimizer, '
+                                      'r.run_id', parameters)
+            return [{'experiment': e, 'optimizer': o, 'run_id': i,
+                     'loss': loss, 'num_results': n}
+                    for e, o, i, loss, n in rows]
+        rows = self._query(
+            'SELECT experiment, optimizer, COUNT(*), AVG(loss), MIN(loss) '
+            'FROM (%s) GROUP BY experiment, optimizer '
+            'ORDER BY experiment, optimizer' % runs, parameters)
+        return [{'experiment': e, 'optimizer': o, 'num_runs': n,
+                 'mean': mean, 'min': best}
+                for e, o, n, mean, best in rows]
+
+
+class StoreResultLogger(ResumableResultLogger):
+    """
+    json result logger, that adds every configuration and result to a
+    :class:`ResultStore` as well.
+
+    Args:
+        directory (str): directory of 'configs.json' and 'results.json'.
+        store (ResultStore): the store.
+        experiment (str): experiment of the run in the store.
+        optimizer (str): optimizer of the run in the store.
+        run_id (str): run_id of the run in the store.
+        overwrite (bool, optional): see ``json_result_logger``. A run of the
+            same name in the store is replaced as well.
+        resume (bool, optional): see :class:`ResumableResultLogger`. The
+            run in the store is continued.
+        **kwargs: passed on to the next logger class, e.g.
+            :class:`scripts.spool.SpoolingResultLogger` in a class derived
+            from both.
+    """
+
+    def __init__(self, directory, store, experiment, optimizer, run_id,
+                 overwrite=False, resume=False, **kwargs):
+        super(StoreResultLogger, self).__init__(directory, overwrite=overwrite,
+                                                resume=resume, **kwargs)
+        self.store = store
+        self.store_run = store.run(experiment, optimizer, run_id,
+                                   overwrite=overwrite and not resume)
+
+    def new_config(self, config_id, config, config_info):
+        if config_id not in self.config_ids:
+            self.store.add_config(self.store_run, config_id, config,
+                                  config_info)
+        super(StoreResultLogger, self).new_config(config_id, config,
+                                                  config_info)
+
+    def __call__(self, job):
+        if job.id not in self.config_ids:
+            self.store.add_config(self.store_run, job.id,
+                                  job.kwargs['config'], {})
+        super(StoreResultLogger, self).__call__(job)
+        self.store.add_result(self.store_run, job.id, job.kwargs['budget'],
+                              job.timestamps, job.result, job.exception)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='SQLite store of '
+                                                 'HpBandSter results')
+    parser.add_argument('database', help='File of the store', type=str)
+    parser.add_argument('--journal_mode', help='wal for processes on one '
+                                               'host, delete on a network '
+                                               'filesystem',
+                        choices=['wal', 'delete'], default='wal')
+    commands = parser.add_subparsers(dest='command')
+    importer = commands.add_parser(
+        'import', help='Add the runs in <root>/<experiment>/<optimizer>, '
+                       'e.g. the opt_results of run_experiment')
+    importer.add_argument('root', type=str)
+    importer.add_argument('--run_id', type=str, default='0')
+    best = commands.add_parser('best', help='Best loss per optimizer and '
+                                            'experiment')
+    best.add_argument('--time', type=float, default=None)
+    best.add_argument('--budget', type=float, default=None)
+    best.add_argument('--experiment', type=str, default=None)
+    exporter = commands.add_parser('export', help='Write a run to the json '
+                                                  'layout')
+    for name in ['experiment', 'optimizer', 'run_id', 'directory']:
+        exporter.add_argument(name, type=str)
+    args = parser.parse_args()
+
+    store = ResultStore(args.database, journal_mode=args.journal_mode)
+    if args.command == 'import':
+        for results_file in sorted(Path(args.root).glob('**/results.json')):
+            run_dir = results_file.parent
+            relative = run_dir.relative_to(args.root)
+            if len(relative.parts) < 2:
+                continue
+            experiment = '/'.join(relative.parts[:-1])
+            num_results = store.import_directory(run_dir, experiment,
+                                                 relative.parts[-1],
+                                                 args.run_id)
+            print('{:40s} {:>12s} {:6d} results'.format(
+                experiment, relative.parts[-1], num_results))
+    elif args.command == 'best':
+        print('{:40s} {:>12s} {:>5s} {:>12s} {:>12s}'.format(
+            'experiment', 'optimizer', 'runs', 'mean', 'min'))
+        for entry in store.best_losses(time=args.time, budget=args.budget,
+                                       experiment=args.experiment):
+            print('{:40s} {:>12s} {:5d} {:12.6g} {:12.6g}'.format(
+                entry['experiment'], entry['optimizer'], entry['num_runs'],
+                entry['mean'], entry['min']))
+    elif args.command == 'export':
+        num_results = store.export(args.directory, args.experiment,
+                                   args.optimizer, args.run_id)
+        print('Exported {} results to {}'.format(num_results, args.directory))
+    else:
+        parser.print_help()
+    store.close()
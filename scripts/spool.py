@@ -0,0 +1,230 @@
+"""
+Result logging through a spool on a local disk.
+
+The json result logger of HpBandSter opens, appends to and closes
+'configs.json' and 'results.json' for every configuration and result. The
+files are usually in the shared directory of the run, on NFS, where each of
+these writes is a synchronous round trip to the file server, done by the
+master while it holds its lock. On a busy cluster, this stalls the
+dispatch of new jobs.
+
+A :class:`SpoolingResultLogger` appends the entries to spool files on a
+local disk instead, which is fast. A background thread copies the new
+entries to the shared directory every ``flush_interval`` seconds, with one
+append and one fsync per file. Many results cost a few metadata operations
+on the shared filesystem instead of a few per result.
+
+A flush is crash safe:
+
+- the configurations are written and synced before the results, so the
+  shared 'results.json' never refers to a configuration that is missing
+  from 'configs.json'
+- after a file is synced, the flushed offsets of the spool and the sizes
+  of the shared files are written to a state file in the spool, which is
+  replaced atomically
+- a flush first truncates the shared files to the sizes in the state file,
+  dropping the partial writes of a flush that failed or was interrupted,
+  and appends everything that was spooled after it. A logger created with
+  ``resume=True`` does so for the spool of the interrupted run.
+
+The spool survives a crash of the master, but not one of its node, unless
+the run is resumed on the same node. The :class:`scripts.checkpoint.
+CheckpointMaster` flushes the logger before it writes a checkpoint, so the
+shared files contain at least the results of the last checkpoint, which is
+all a resumed run needs.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+from scripts.checkpoint import ResumableResultLogger
+
+
+KINDS = ('configs', 'results')
+
+
+def _fsync_replace(fn, data):
+    # writes data to fn atomically and durably
+    with open(fn + '.tmp', 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(fn + '.tmp', fn)
+
+
+class SpoolingResultLogger(ResumableResultLogger):
+    """
+    json result logger, that writes to a spool on a local disk and flushes
+    it to ``directory`` in the background.
+
+    Args:
+        directory (str): shared directory of 'configs.json' and
+            'results.json'.
+        spool_directory (str): directory on a local disk. The spool of the
+            run is a subdirectory named after ``directory``, so several runs
+            can share it.
+        overwrite (bool, optional): see ``json_result_logger``.
+        resume (bool, optional): see
+            :class:`scripts.checkpoint.ResumableResultLogger`. The entries
+            that were spooled but not flushed before the interruption are
+            flushed first.
+        flush_interval (float, optional): seconds between two flushes.
+            Default: 30.
+    """
+
+    def __init__(self, directory, spool_directory, overwrite=False,
+                 resume=False, flush_interval=30):
+        super(SpoolingResultLogger, self).__init__(
+            directory, overwrite=overwrite, resume=resume)
+        self.logger = logging.getLogger('hpbandster')
+        self.flush_interval = flush_interval
+        key = hashlib.sha1(os.path.abspath(str(directory)).encode())
+        self.spool_directory = os.path.join(str(spool_directory),
+                                            'spool_' + key.hexdigest()[:16])
+        os.makedirs(self.spool_directory, exist_ok=True)
+        self.spool_fns = {kind: os.path.join(self.spool_directory,
+                                             kind + '.json')
+                          for kind in KINDS}
+        self.shared_fns = {'configs': self.config_fn,
+                           'results': self.results_fn}
+        self.state_fn = os.path.join(self.spool_directory, 'state.json')
+
+        self.num_spooled = 0
+        self.num_flushes = 0
+        # spool_lock guards the spool files, flush_lock a flush
+        self.spool_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+        if resume and os.path.exists(self.state_fn):
+            self._recover()
+        else:
+            for fn in self.spool_fns.values():
+                open(fn, 'w').close()
+            self._write_state({kind: 0 for kind in KINDS})
+        self.spool_files = {kind: open(fn, 'ab')
+                            for kind, fn in self.spool_fns.items()}
+
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._flush_periodically,
+                                       name='result_spool', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _write_state(self, flushed):
+        self.state = {'flushed': flushed,
+                      'shared': {kind: os.path.getsize(fn)
+                                 for kind, fn in self.shared_fns.items()}}
+        _fsync_replace(self.state_fn, json.dumps(self.state))
+
+    def _recover(self):
+        with open(self.state_fn) as f:
+            self.state = json.load(f)
+        ends = {}
+        for kind, fn in self.spool_fns.items():
+            with open(fn, 'r+b') as f:
+                # without the incomplete line the crash may have left
+                ends[kind] = f.read().rfind(b'\n') + 1
+                f.truncate(ends[kind])
+        num_bytes = self._flush_until(ends)
+        self.logger.info('SPOOL: recovered %i bytes from %s'
+                         % (num_bytes, self.spool_directory))
+
+    def _spool(self, kind, entry):
+        line = (json.dumps(entry) + '\n').encode()
+        with self.spool_lock:
+            # written through to the page cache, so it survives a crash of
+            # this process
+            self.spool_files[kind].write(line)
+            self.spool_files[kind].flush()
+            self.num_spooled += 1
+
+    def new_config(self, config_id, config, config_info):
+        if config_id not in self.config_ids:
+            self.config_ids.add(config_id)
+            self._spool('configs', [config_id, config, config_info])
+
+    def __call__(self, job):
+        if job.id not in self.config_ids:
+            self.config_ids.add(job.id)
+            self._spool('configs', [job.id, job.kwargs['config'], {}])
+        self._spool('results', [job.id, job.kwargs['budget'], job.timestamps,
+                                job.result, job.exception])
+
+    def flush(self):
+        """
+        Appends the spooled entries to the shared files and syncs them.
+
+        Returns:
+            int - the number of bytes appended
+        """
+        with self.spool_lock:
+            if self.closed.is_set() and self.spool_files['results'].closed:
+                return 0
+            # entries spooled from now on are left to the next flush
+            ends = {kind: f.tell() for kind, f in self.spool_files.items()}
+        return self._flush_until(ends)
+
+    def _flush_until(self, ends):
+        with self.flush_lock:
+            for kind, fn in self.shared_fns.items():
+                size = os.path.getsize(fn)
+                if size > self.state['shared'][kind]:
+                    # the partial write of a flush that failed or was
+                    # interrupted, it is written again
+                    with open(fn, 'r+b') as f:
+                        f.truncate(self.state['shared'][kind])
+                elif size < self.state['shared'][kind]:
+                    # rewritten since, e.g. pruned by a resumed
+                    # CheckpointMaster
+                    self._write_state(self.state['flushed'])
+
+            num_bytes = 0
+            # configurations first, every result refers to one
+            for kind in KINDS:
+                start = self.state['flushed'][kind]
+                if ends[kind] <= start:
+                    continue
+                with open(self.spool_fns[kind], 'rb') as f:
+                    f.seek(start)
+                    data = f.read(ends[kind] - start)
+                with open(self.shared_fns[kind], 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._write_state(dict(self.state['flushed'],
+                                       **{kind: ends[kind]}))
+                num_bytes += len(data)
+            if num_bytes:
+                self.num_flushes += 1
+            return num_bytes
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                # e.g. the file server is unavailable, the entries stay in
+                # the spool until the next flush
+                self.logger.warning('SPOOL: flush to %s failed: %s'
+                                    % (self.config_fn, e))
+
+    def close(self):
+        """
+        Stops the background thread, flushes the spool and removes it.
+        """
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.thread.join()
+        self.flush()
+        for f in self.spool_files.values():
+            f.close()
+        shutil.rmtree(self.spool_directory, ignore_errors=True)
+        atexit.unregister(self.close)
+        self.logger.debug('SPOOL: %i entries in %i flushes'
+                          % (self.num_spooled, self.num_flushes))
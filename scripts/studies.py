@@ -0,0 +1,359 @@
+"""
+Several fmin studies on one shared pool of workers.
+
+Every ``fmin`` call starts its own nameserver, master and ``num_workers``
+worker threads. Several small studies at once compete for the same cores,
+and each pays the startup cost. A :class:`StudyServer` is started once and
+accepts any number of studies, each with its own function, configuration
+space and ``output_dir``. All evaluations run on one pool of
+``num_workers`` threads.
+
+Every study still has its own master, which decides what to evaluate next.
+Its workers are light proxies that queue the evaluations at the pool,
+so a study alone can use the whole pool. Whenever a thread of the pool is
+free, it takes the next evaluation of
+
+- 'fair' scheduling: the study with the fewest running evaluations relative
+  to its ``share``, and of those the one that started the fewest
+  evaluations relative to its share. Equal studies take turns.
+- 'priority' scheduling: the study with the highest ``priority``. Studies of
+  the same priority share fairly.
+
+Evaluations of the same study run in the order they were queued. The
+number of evaluations, the busy time and the queue wait of every study are
+stored as 'shared_pool' in the config of its result.
+
+Example::
+
+    server = StudyServer(num_workers=8)
+    first = server.submit(func, cs, func_args=(X, y), output_dir='first')
+    second = server.submit(other, other_cs, output_dir='second', share=2)
+    inc_value, inc_cfg, result = first.result()
+    server.shutdown()
+"""
+
+import collections
+import itertools
+import pickle
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import hpbandster.core.nameserver as hpns
+import hpbandster.core.result as hpres
+from ConfigSpace.read_and_write import json
+
+from scripts.FMin import FMinWorker, get_incumbent
+from scripts.optimizers import get_optimizer_class
+from scripts.resources import ResourceManager
+
+
+SCHEDULING = ('fair', 'priority')
+
+
+class SharedPool(object):
+    """
+    Threads that run the evaluations of several studies.
+
+    Args:
+        num_workers (int): number of threads.
+        scheduling (str, optional): 'fair' (default) or 'priority'.
+    """
+
+    def __init__(self, num_workers, scheduling='fair'):
+        if scheduling not in SCHEDULING:
+            raise ValueError('Unknown scheduling %s' % scheduling)
+        self.num_workers = num_workers
+        self.scheduling = scheduling
+        self.cond = threading.Condition()
+        # study -> queued tasks, in the order they were submitted
+        self.queues = {}
+        self.studies = {}
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._work,
+                                      name='shared_pool_%i' % i, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def shutdown(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def register(self, study, priority=0, share=1.):
+        """
+        Adds a study, whose evaluations are scheduled with ``priority`` and
+        ``share``.
+        """
+        with self.cond:
+            self.queues[study] = collections.deque()
+            self.studies[study] = {'priority': priority, 'share': share,
+                                   'num_running': 0, 'num_started': 0,
+                                   'num_evaluations': 0,
+                                   'busy_time': 0., 'queue_wait': 0.}
+
+    def unregister(self, study):
+        """
+        Removes a study.
+
+        Returns:
+            dict - its 'priority', 'share', 'num_evaluations', 'busy_time'
+                and 'queue_wait', summed over all evaluations
+        """
+        with self.cond:
+            del self.queues[study]
+            stats = self.studies.pop(study)
+        del stats['num_running'], stats['num_started']
+        return stats
+
+    def evaluate(self, study, func):
+        """
+        Runs ``func()`` on the pool for ``study`` and waits for it.
+
+        Returns:
+            the return value of ``func``, whose exceptions are raised again
+        """
+        task = {'func': func, 'submitted': time.time(),
+                'done': threading.Event()}
+        with self.cond:
+            if not self.running:
+                raise RuntimeError('The pool is shut down.')
+            self.queues[study].append(task)
+            self.cond.notify()
+        task['done'].wait()
+        if 'error' in task:
+            raise task['error']
+        return task['result']
+
+    def _next_study(self):
+        waiting = [s for s, queue in self.queues.items() if queue]
+        if not waiting:
+            return None
+
+        def fair(s):
+            # fewest running, then fewest started evaluations for its share
+            stats = self.studies[s]
+            return (stats['num_running'] / stats['share'],
+                    stats['num_started'] / stats['share'],
+                    self.queues[s][0]['submitted'])
+
+        if self.scheduling == 'priority':
+            return min(waiting, key=lambda s: (-self.studies[s]['priority'],)
+                       + fair(s))
+        return min(waiting, key=fair)
+
+    def _work(self):
+        while True:
+            with self.cond:
+                study = self._next_study()
+                while study is None and self.running:
+                    self.cond.wait()
+                    study = self._next_study()
+                if study is None:
+                    return
+                task = self.queues[study].popleft()
+                stats = self.studies[study]
+                stats['num_running'] += 1
+                stats['num_started'] += 1
+
+            started = time.time()
+            try:
+                task['result'] = task['func']()
+            except Exception as e:
+                task['error'] = e
+            finished = time.time()
+
+            with self.cond:
+                stats['num_running'] -= 1
+                stats['num_evaluations'] += 1
+                stats['busy_time'] += finished - started
+                stats['queue_wait'] += started - task['submitted']
+            task['done'].set()
+
+
+class StudyWorker(FMinWorker):
+    """
+    Worker of a study, which runs its evaluations on a :class:`SharedPool`.
+
+    Args:
+        pool (SharedPool): the pool.
+        study (str): the study in the pool.
+    """
+
+    def __init__(self, *args, pool, study, **kwargs):
+        super(StudyWorker, self).__init__(*args, **kwargs)
+        self.pool = pool
+        self.study = study
+
+    def compute(self, config, budget, config_id=None, **kwargs):
+        compute = super(StudyWorker, self).compute
+        return self.pool.evaluate(self.study, lambda: compute(
+            config, budget, config_id=config_id, **kwargs))
+
+
+class Study(object):
+    """
+    A study running on a :class:`StudyServer`, see
+    :meth:`StudyServer.submit`.
+    """
+
+    def __init__(self, run_id, target):
+        self.run_id = run_id
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(target,),
+                                        name=run_id, daemon=True)
+        self._thread.start()
+
+    def _run(self, target):
+        try:
+            self._result = target()
+        except BaseException as e:
+            self._error = e
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def result(self, timeout=None):
+        """
+        Waits for the study to finish.
+
+        Returns:
+            the return value of ``fmin``: the incumbent's loss and
+                configuration and the result
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError('Study %s is still running.' % self.run_id)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class StudyServer(object):
+    """
+    Runs several fmin studies on one shared pool of workers.
+
+    The server starts a nameserver and the pool right away. Shut it down
+    with :meth:`shutdown` once all studies are done.
+
+    Args:
+        num_workers (int, optional): number of evaluations that run at once.
+            Default: 1.
+        scheduling (str, optional): which study gets the next free worker,
+            'fair' (default) or 'priority'. See the module docstring.
+        manage_threads (bool, optional): If True (default), the BLAS/OpenMP
+            thread pools are sized to one worker's share of the cores, as
+            in ``fmin``.
+        nic_name (str, optional): network interface of the nameserver.
+        working_directory (str, optional): directory for the nameserver
+            credentials. Defaults to a temporary directory.
+    """
+
+    def __init__(self, num_workers=1, scheduling='fair', manage_threads=True,
+                 nic_name=None, working_directory=None):
+        self.num_workers = num_workers
+        self._tmp_dir = None
+        if working_directory is None:
+            self._tmp_dir = tempfile.TemporaryDirectory()
+            working_directory = self._tmp_dir.name
+        self.working_directory = str(working_directory)
+
+        self.resource_manager = None
+        if manage_threads:
+            self.resource_manager = ResourceManager(
+                workers_per_node=num_workers, worker_index=0)
+            self.resource_manager.apply()
+
+        self.ns = hpns.NameServer(run_id='studies', nic_name=nic_name,
+                                  working_directory=self.working_directory)
+        self.ns_host, self.ns_port = self.ns.start()
+        self.pool = SharedPool(num_workers, scheduling=scheduling)
+        self.pool.start()
+        self._study_ids = itertools.count()
+
+    def submit(self, func, config_space, func_args=(), output_dir='.',
+               eta=2, min_budget=2, max_budget=4, num_iterations=1,
+               priority=0, share=1., max_history=None,
+               history_subsampling='recency', vectorized_sampling=False,
+               run_id=None):
+        """
+        Starts a study. The arguments are those of ``fmin``.
+
+        Args:
+            priority (float, optional): with 'priority' scheduling, the
+                evaluations of studies with a higher priority run first.
+                Default: 0.
+            share (float, optional): with 'fair' scheduling, the share of
+                the workers the study gets while other studies are waiting.
+                Default: 1.
+            run_id (str, optional): name of the study. Must be unique on the
+                server. Defaults to 'study_<n>'.
+
+        Returns:
+            Study - its :meth:`Study.result` is the return value of ``fmin``
+        """
+        if run_id is None:
+            run_id = 'study_%i' % next(self._study_ids)
+        output_dir = Path(output_dir)
+        output_dir.mkdir(exist_ok=True)
+        with open(output_dir / 'configspace.json', 'w') as f:
+            f.write(json.write(config_space))
+
+        self.pool.register(run_id, priority=priority, share=share)
+        # A study alone may use the whole pool, so it gets a proxy for every
+        # worker of the pool.
+        for i in range(self.num_workers):
+            worker = StudyWorker(
+                func=func, func_args=func_args, id=i, pool=self.pool,
+                study=run_id,
+                resources=(self.resource_manager.layout
+                           if self.resource_manager else None),
+                nameserver=self.ns_host, nameserver_port=self.ns_port,
+                run_id=run_id)
+            worker.run(background=True)
+
+        optimizer = get_optimizer_class('bohb')
+        opt = optimizer(configspace=config_space, run_id=run_id,
+                        min_budget=min_budget, max_budget=max_budget, eta=eta,
+                        host=self.ns_host, nameserver=self.ns_host,
+                        nameserver_port=self.ns_port,
+                        result_logger=hpres.json_result_logger(
+                            directory=output_dir, overwrite=True),
+                        max_history=max_history,
+                        history_subsampling=history_subsampling,
+                        vectorized_sampling=vectorized_sampling)
+
+        def run():
+            try:
+                result = opt.run(n_iterations=num_iterations,
+                                 min_n_workers=self.num_workers)
+            finally:
+                opt.shutdown(shutdown_workers=True)
+                stats = self.pool.unregister(run_id)
+            result.HB_config['shared_pool'] = stats
+            with open(output_dir / 'results.pkl', 'wb') as f:
+                pickle.dump(result, f)
+            return get_incumbent(result) + (result,)
+
+        return Study(run_id, run)
+
+    def shutdown(self):
+        """
+        Stops the pool and the nameserver. Running studies fail.
+        """
+        self.pool.shutdown()
+        self.ns.shutdown()
+        if self.resource_manager is not None:
+            self.resource_manager.restore()
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
@@ -0,0 +1,125 @@
+"""
+Dataset-subset fidelities.
+
+A common budget is the fraction of the training data an evaluation may use,
+as the ``dataset_fraction`` of the SVM surrogate. The toy objective of
+``fmin`` slices ``x[:int(budget)]``, i.e. it always uses the first samples.
+If the data is sorted, e.g. by class or by time, the low budgets see a
+biased part of it, and their losses predict those on the full data badly.
+Every evaluation that draws a random subset itself copies the data, and the
+subsets of a configuration on two budgets have nothing in common.
+
+:class:`DataSubsets` draws the subsets once for all budgets of the run.
+They are
+
+- stratified: every class, or quantile bin of a continuous target, has the
+  same share in every subset as in the full data, up to one sample, and at
+  least one sample
+- nested: the subset of a budget contains those of all lower budgets, so
+  a configuration promoted to the next budget sees more of the same data
+- shuffled: the order of the samples within a subset is random.
+
+The arrays are permuted once, so that the subset of every budget is a
+prefix of them. An evaluation receives slices of the permuted arrays,
+which are views that don't copy any data, also in the children of a
+:class:`scripts.forkserver.ForkServer`.
+"""
+
+import numpy as np
+
+
+def budget_schedule(min_budget, max_budget, eta):
+    """
+    The budgets of the successive halving brackets of HpBandSter.
+    """
+    num_budgets = -int(np.log(min_budget / max_budget) / np.log(eta)) + 1
+    return max_budget * np.power(eta, -np.linspace(num_budgets - 1, 0,
+                                                   num_budgets))
+
+
+class DataSubsets(object):
+    """
+    Nested, stratified subsets of the function arguments of a run.
+
+    Args:
+        func_args (tuple): arguments of the function. The numpy arrays with
+            as many rows as the first one are subsampled along their first
+            axis, the other arguments are passed as they are.
+        budgets (list of float): budgets of the run, the largest one uses
+            all of the data. See :func:`budget_schedule`.
+        stratify (int, optional): index of the argument in ``func_args``
+            that holds the labels to stratify by, e.g. 1 for ``(X, y)``. By
+            default, the subsets are only shuffled.
+        num_bins (int, optional): labels of a float dtype are stratified by
+            this many quantile bins. Default: 10.
+        seed (int, optional): seed of the shuffling.
+    """
+
+    def __init__(self, func_args, budgets, stratify=None, num_bins=10,
+                 seed=None):
+        func_args = tuple(func_args)
+        arrays = [a for a in func_args if isinstance(a, np.ndarray)
+                  and a.ndim > 0]
+        if not arrays:
+            raise ValueError('Data subsets need func_args with numpy arrays.')
+        self.num_samples = len(arrays[0])
+        self.subsampled = [isinstance(a, np.ndarray) and a.ndim > 0
+                           and len(a) == self.num_samples for a in func_args]
+        self.budgets = sorted(float(b) for b in budgets)
+        self.max_budget = self.budgets[-1]
+
+        if stratify is None:
+            labels = np.zeros(self.num_samples, dtype=int)
+        else:
+            if not self.subsampled[stratify]:
+                raise ValueError('The labels to stratify by need one entry '
+                                 'per sample.')
+            labels = func_args[stratify]
+            if labels.dtype.kind == 'f':
+                edges = np.quantile(labels, np.linspace(0, 1, num_bins + 1))
+                labels = np.digitize(labels, edges[1:-1])
+        rng = np.random.RandomState(seed)
+        # Every class is spread evenly over a ranking of the samples, so
+        # that each prefix has a share of every class, and its first sample
+        # comes first. The subsets are its prefixes.
+        keys = np.empty(self.num_samples)
+        self.num_classes = 0
+        for c in np.unique(labels):
+            indices = rng.permutation(np.flatnonzero(labels == c))
+            keys[indices] = (np.arange(len(indices)) + 0.5) / len(indices)
+            keys[indices[0]] = 0
+            self.num_classes += 1
+        ranking = np.lexsort((rng.random_sample(self.num_samples), keys))
+
+        # the samples a budget adds to the next lower one, in random order
+        order, start = [], 0
+        for budget in self.budgets + [np.inf]:
+            end = self.size(budget)
+            order.append(rng.permutation(ranking[start:end]))
+            start = end
+        self.order = np.concatenate(order)
+        # permuted once, so that every subset is a prefix
+        self.func_args = tuple(a[self.order] if subsampled else a
+                               for a, subsampled in zip(func_args,
+                                                        self.subsampled))
+
+    def size(self, budget):
+        """
+        Number of samples used on ``budget``, at least one per class.
+
+        Budgets between those of the run get a prefix of the next larger
+        subset, which is shuffled but only roughly stratified.
+        """
+        fraction = min(budget / self.max_budget, 1)
+        size = int(np.floor(fraction * self.num_samples + 0.5))
+        return min(max(size, self.num_classes), self.num_samples)
+
+    def args(self, budget):
+        """
+        The function arguments on ``budget``, as views of the permuted
+        arrays.
+        """
+        size = self.size(budget)
+        return tuple(a[:size] if subsampled else a
+                     for a, subsampled in zip(self.func_args,
+                                              self.subsampled))
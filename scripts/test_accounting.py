@@ -0,0 +1,53 @@
+import unittest
+
+from scripts.accounting import (UsageMeter, load_usage,
+                                usage_by_hyperparameter, worker_memory_trends)
+from scripts.testing import FMinTestCase
+
+
+class TestAccounting(FMinTestCase):
+    def test_meter(self):
+        with UsageMeter(num_allocations=3, trace_gc=True) as meter:
+            data = [bytearray(10000) for _ in range(100)]
+        usage = meter.usage
+
+        self.assertGreaterEqual(usage['cpu_user'] + usage['cpu_sys'], 0)
+        self.assertGreater(usage['wall_time'], 0)
+        self.assertGreater(usage['peak_rss_mb'], 0)
+        self.assertLessEqual(len(usage['allocations']), 3)
+        # the buffers allocated above are still held
+        self.assertIn('test_accounting.py', usage['allocations'][0]['location'])
+        self.assertGreaterEqual(usage['gc']['collections'], 0)
+
+    def test_by_hyperparameter(self):
+        runs = [{'config': {'w': w, 'lr': lr}, 'started': i, 'worker': 0,
+                 'usage': {'peak_rss_mb': 10. * w + lr, 'rss_mb': 100. + i}}
+                for i, (w, lr) in enumerate([(0, 1), (1, 2), (1, 3), (0, 4),
+                                             (1, 5)])]
+        report = usage_by_hyperparameter(runs, num_bins=2)
+
+        self.assertEqual([(g['value'], g['num_evaluations'], g['max'])
+                          for g in report['w']], [(0, 2, 4.), (1, 3, 15.)])
+        # numerical values are binned
+        self.assertEqual(len(report['lr']), 2)
+        self.assertEqual(sum(g['num_evaluations'] for g in report['lr']), 5)
+
+        trends = worker_memory_trends(runs)
+        self.assertAlmostEqual(trends['0']['growth_per_evaluation_mb'], 1.)
+
+    def test_fmin(self):
+        output_dir, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            trace_gc=True)
+        for run in result.get_all_runs():
+            self.assertEqual(run.info['usage']['cpu_scope'], 'thread')
+            self.assertIn('gc', run.info['usage'])
+
+        runs = load_usage(output_dir)
+        self.assertEqual(len(runs), len(result.get_all_runs()))
+        report = usage_by_hyperparameter(runs, metric='cpu_user')
+        self.assertEqual(sum(g['num_evaluations'] for g in report['w']),
+                         len(runs))
+
+
+if __name__ == '__main__':
+    unittest.main()
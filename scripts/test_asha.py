@@ -0,0 +1,75 @@
+import unittest
+
+from hpbandster.core.dispatcher import Job
+
+from scripts.asha import AsynchronousSuccessiveHalving
+from scripts.testing import FMinTestCase
+
+
+class TestASHA(FMinTestCase):
+    def make_iteration(self):
+        configs = iter(range(100))
+        return AsynchronousSuccessiveHalving(
+            HPB_iter=0, num_configs=[4, 2, 1], budgets=[3, 6, 12],
+            config_sampler=lambda budget: ({'w': next(configs)}, {}), eta=2)
+
+    @staticmethod
+    def finish(it, run, loss):
+        config_id, config, budget = run
+        job = Job(config_id, config=config, budget=budget)
+        job.result = {'loss': loss, 'info': {}}
+        it.register_result(job)
+
+    def test_promotes_before_the_rung_is_complete(self):
+        it = self.make_iteration()
+        runs = [it.get_next_run() for _ in range(3)]
+        self.assertEqual([budget for _, _, budget in runs], [3] * 3)
+
+        # the best of two results is promoted, while the third still runs
+        self.finish(it, runs[0], 2.)
+        self.finish(it, runs[1], 1.)
+        config_id, _, budget = it.get_next_run()
+        self.assertEqual((config_id, budget), (runs[1][0], 6))
+        # nothing else is promotable, so a new configuration is sampled
+        self.assertEqual(it.get_next_run()[2], 3)
+
+    def test_evaluations_per_budget(self):
+        it = self.make_iteration()
+        running, budgets = [], []
+        while not it.is_finished:
+            run = it.get_next_run()
+            if run is None:
+                # a worker finishes the oldest job
+                if running:
+                    run = running.pop(0)
+                    self.finish(it, run, float(run[1]['w']))
+                continue
+            running.append(run)
+            budgets.append(run[2])
+            if len(running) == 2:
+                run = running.pop(0)
+                self.finish(it, run, float(run[1]['w']))
+
+        # as many evaluations as synchronous successive halving
+        self.assertEqual(sorted(budgets), [3] * 4 + [6] * 2 + [12])
+        self.assertEqual(it.num_promotions, 3)
+        self.assertIsNone(it.get_next_run())
+
+    def test_asynchronous(self):
+        output_dir, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            num_iterations=2, num_workers=2, asynchronous=True)
+
+        self.assertEqual(inc_best_cfg['w'], 1)
+        self.assertTrue(result.HB_config['asynchronous'])
+        self.assertEqual(result.HB_config['asynchronous_promotions'], 3 + 1)
+        budgets = [run.budget for run in result.get_all_runs()
+                   if run.config_id[0] == 0]
+        self.assertEqual(sorted(budgets), [3] * 4 + [6] * 2 + [12])
+
+    def test_cost_aware(self):
+        with self.assertRaises(ValueError):
+            self.run_fmin(asynchronous=True, cost_aware=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
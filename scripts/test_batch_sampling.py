@@ -0,0 +1,91 @@
+import time
+import unittest
+
+import numpy as np
+import ConfigSpace as CS
+
+from scripts.batch_sampling import (BatchSampler, BatchRandomSampling,
+                                    BatchSamplingMaster)
+from scripts.optimizers import get_optimizer_class
+from scripts.testing import FMinTestCase
+
+
+def conditional_space():
+    # the space of mlp_on_digits, with a nested and an OR condition
+    cs = CS.ConfigurationSpace(seed=1)
+    solver = CS.CategoricalHyperparameter('solver', ['sgd', 'adam', 'lbfgs'],
+                                          weights=[1, 2, 1])
+    lr = CS.UniformFloatHyperparameter('lr', 1e-4, 1, log=True)
+    momentum = CS.UniformFloatHyperparameter('momentum', 0, 1)
+    nesterov = CS.CategoricalHyperparameter('nesterov', [True, False])
+    beta_1 = CS.UniformFloatHyperparameter('beta_1', 0.5, 0.99)
+    beta_2 = CS.UniformFloatHyperparameter('beta_2', 0.9, 0.9999)
+    layers = CS.UniformIntegerHyperparameter('layers', 1, 4)
+    width = CS.UniformIntegerHyperparameter('width', 8, 512, log=True)
+    cs.add_hyperparameters([solver, lr, momentum, nesterov, beta_1, beta_2,
+                            layers, width])
+    cs.add_conditions([
+        CS.EqualsCondition(momentum, solver, 'sgd'),
+        CS.AndConjunction(CS.EqualsCondition(nesterov, solver, 'sgd'),
+                          CS.GreaterThanCondition(nesterov, momentum, 0.5)),
+        CS.EqualsCondition(beta_1, solver, 'adam'),
+        CS.EqualsCondition(beta_2, solver, 'adam'),
+        CS.OrConjunction(CS.InCondition(lr, solver, ['sgd', 'adam']),
+                         CS.GreaterThanCondition(lr, layers, 2))])
+    cs.add_forbidden_clause(CS.ForbiddenAndConjunction(
+        CS.ForbiddenEqualsClause(solver, 'lbfgs'),
+        CS.ForbiddenInClause(layers, [3, 4])))
+    return cs
+
+
+class TestBatchSampling(FMinTestCase):
+    def test_conditions(self):
+        cs = conditional_space()
+        sampler = BatchSampler(cs, seed=1)
+        batch = sampler.sample_array(2000)
+        self.assertEqual(batch.shape, (2000, len(cs.get_hyperparameters())))
+
+        for vector in batch[:500]:
+            # raises if an active value is missing or an inactive one is set
+            CS.Configuration(cs, vector=vector).is_valid_configuration()
+
+        solver = batch[:, cs.get_idx_by_hyperparameter_name('solver')]
+        beta_1 = batch[:, cs.get_idx_by_hyperparameter_name('beta_1')]
+        np.testing.assert_array_equal(np.isnan(beta_1), solver != 1)
+        # weighted choices, of which a fourth of lbfgs is forbidden
+        self.assertAlmostEqual(np.mean(solver == 1), 0.5 / 0.875, delta=0.05)
+        # nothing forbidden, lbfgs only with 1 or 2 layers
+        lbfgs = [sampler.to_dict(v) for v in batch[solver == 2]]
+        self.assertTrue(lbfgs)
+        self.assertTrue(all(c['layers'] <= 2 and 'lr' not in c
+                            for c in lbfgs))
+
+    def test_sample(self):
+        cs = conditional_space()
+        sampler = BatchSampler(cs, batch_size=10)
+        configs = [sampler.sample() for _ in range(25)]
+        self.assertEqual(len({tuple(sorted(c.items())) for c in configs}), 25)
+
+        start = time.time()
+        sampler.sample_array(10000)
+        batch_time = time.time() - start
+        start = time.time()
+        cs.sample_configuration(1000)
+        # ten times as many in less time
+        self.assertLess(batch_time, time.time() - start)
+
+    def test_optimizers(self):
+        cg = BatchRandomSampling(self.cs, batch_size=4)
+        configs = [cg.get_config(3)[0]['w'] for _ in range(10)]
+        self.assertEqual(set(configs), {0, 1})
+        for opt_method in ['randomsearch', 'hyperband']:
+            self.assertTrue(issubclass(get_optimizer_class(opt_method),
+                                       BatchSamplingMaster))
+
+        _, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            vectorized_sampling=True, num_iterations=3)
+        self.assertEqual(inc_best_cfg['w'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from scripts.benchmark_overhead import (_flatten, compare, measure_sampling,
+                                        measure_run_experiment, zero_cost)
+
+
+class TestBenchmarkOverhead(unittest.TestCase):
+    def test_flatten(self):
+        results = {'meta': {'python': '3.6', 'timestamp': 1.},
+                   'zero_cost': [{'num_workers': 4, 'wall_time': 2.,
+                                  'queue_latency': {'mean': 0.1}}],
+                   'sampling': [{'history_size': 10, 'fit': 0.5}],
+                   'runs': [3., 4.]}
+        # lists are keyed by their number of workers or history size
+        self.assertEqual(_flatten(results),
+                         {'meta/timestamp': 1.,
+                          'zero_cost/4/num_workers': 4,
+                          'zero_cost/4/wall_time': 2.,
+                          'zero_cost/4/queue_latency/mean': 0.1,
+                          'sampling/10/history_size': 10,
+                          'sampling/10/fit': 0.5,
+                          'runs/0': 3., 'runs/1': 4.})
+
+    def test_compare(self):
+        old = {'meta': {'timestamp': 1.},
+               'zero_cost': [{'num_workers': 1, 'wall_time': 2.,
+                              'run_time': 1., 'num_evaluations': 0}]}
+        new = {'meta': {'timestamp': 5.},
+               'zero_cost': [{'num_workers': 1, 'wall_time': 1.,
+                              'run_time': 1.05, 'num_evaluations': 3}],
+               'logging': {'result': 1.}}
+        # meta data, zeros, small changes and new measurements are skipped
+        self.assertEqual(compare(old, new),
+                         [('zero_cost/1/wall_time', 2., 1., -0.5)])
+
+    def test_measurements(self):
+        sampling = measure_sampling([20, 40], repeats=2)
+        self.assertEqual([m['history_size'] for m in sampling], [20, 40])
+        self.assertEqual(sampling[-1]['get_config']['n'], 2)
+
+        run = measure_run_experiment(zero_cost, 2, max_budget=3)
+        self.assertEqual(run['num_workers'], 2)
+        self.assertGreater(run['num_evaluations'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from scripts.benchmark_pool import BenchmarkPool
+
+
+class Benchmark(object):
+    def __init__(self):
+        self.state = 0
+        self.num_resets = 0
+
+
+class TestBenchmarkPool(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+
+        def factory():
+            self.created.append(Benchmark())
+            return self.created[-1]
+
+        def reset(benchmark):
+            benchmark.state = 0
+            benchmark.num_resets += 1
+
+        self.pool = BenchmarkPool(factory, reset=reset)
+
+    def test_reuse(self):
+        with self.pool.lease() as (first, setup_time):
+            first.state = 1
+            self.assertGreaterEqual(setup_time, 0)
+        with self.pool.lease() as (second, _):
+            # the benchmark is reused and reset before
+            self.assertIs(second, first)
+            self.assertEqual(second.state, 0)
+            self.assertEqual(second.num_resets, 1)
+
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual((self.pool.num_created, self.pool.num_reused), (1, 1))
+
+    def test_concurrent_leases(self):
+        with self.pool.lease() as (first, _):
+            with self.pool.lease() as (second, _):
+                self.assertIsNot(first, second)
+        self.assertEqual(self.pool.num_created, 2)
+
+    def test_discard_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.lease() as (broken, _):
+                raise RuntimeError('evaluation failed')
+
+        # a benchmark in an unknown state is not handed out again
+        with self.pool.lease() as (benchmark, _):
+            self.assertIsNot(benchmark, broken)
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(self.pool.num_reused, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
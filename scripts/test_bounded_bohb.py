@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+import ConfigSpace as CS
+import statsmodels.api as sm
+from hpbandster.core.dispatcher import Job
+
+from scripts.bounded_bohb import BoundedKDE, kde_pdf
+from scripts.testing import FMinTestCase
+
+
+class TestBoundedBOHB(FMinTestCase):
+    def test_bounded_history(self):
+        cs = CS.ConfigurationSpace()
+        cs.add_hyperparameter(CS.UniformFloatHyperparameter('x', 0, 1))
+        cs.add_hyperparameter(CS.CategoricalHyperparameter('c', ['a', 'b']))
+
+        for subsampling in ['recency', 'quality']:
+            cg = BoundedKDE(cs, max_history=20,
+                            history_subsampling=subsampling,
+                            vectorized_sampling=True)
+            for i in range(50):
+                job = Job((0, 0, i), budget=1.,
+                          config=cs.sample_configuration().get_dictionary())
+                job.result = {'loss': float(i % 7), 'info': {}}
+                cg.new_result(job)
+
+            self.assertEqual(len(cg.losses[1.]), 20)
+            if subsampling == 'quality':
+                self.assertEqual(min(cg.losses[1.]), 0)
+
+            config, info = cg.get_config(1.)
+            self.assertIn('sampling_time', info)
+            self.assertEqual(len(cg.sampling_times), 1)
+
+        _, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            max_history=10, vectorized_sampling=True)
+        for entry in result.get_id2config_mapping().values():
+            self.assertIn('sampling_time', entry['config_info'])
+        self.assertEqual(inc_best_cfg['w'], 1)
+        self.assertEqual(result.HB_config['sampling']['get_config']['n'],
+                         len(result.get_id2config_mapping()))
+
+    def test_random_fraction(self):
+        cs = CS.ConfigurationSpace()
+        cs.add_hyperparameter(CS.UniformFloatHyperparameter('x', 0, 1))
+        cg = BoundedKDE(cs, vectorized_sampling=True, random_fraction=0.5)
+        for i in range(20):
+            job = Job((0, 0, i), budget=1.,
+                      config=cs.sample_configuration().get_dictionary())
+            job.result = {'loss': float(i), 'info': {}}
+            cg.new_result(job)
+
+        picks = [cg.get_config(1.)[1]['model_based_pick']
+                 for _ in range(400)]
+        # one random draw per call, not one per branch
+        self.assertAlmostEqual(np.mean(picks), 0.5, delta=0.1)
+
+    def test_kde_pdf(self):
+        # continuous x, categorical c with three levels in the data
+        data = np.array([[0.1, 0], [0.4, 1], [0.5, 1], [0.9, 2]])
+        vartypes = np.array([0, 3])
+        kde = sm.nonparametric.KDEMultivariate(data=data, var_type='cu',
+                                               bw=[0.2, 0.3])
+        # exact matches of the categories use 1 - bw, the others bw / 2
+        points = np.array([[0.2, 0], [0.5, 1], [0.7, 2], [0.3, 1]])
+        expected = [kde.pdf(p) for p in points]
+        np.testing.assert_allclose(kde_pdf(kde, points, vartypes), expected)
+
+        x, c = points[0]
+        gauss = np.exp(-0.5 * ((x - data[:, 0]) / 0.2) ** 2) \
+            / (np.sqrt(2 * np.pi) * 0.2)
+        aitchison_aitken = np.where(data[:, 1] == c, 1 - 0.3, 0.3 / 2)
+        self.assertAlmostEqual(kde_pdf(kde, points[:1], vartypes)[0],
+                               np.mean(gauss * aitchison_aitken))
+
+    def test_kde_pdf_single_level(self):
+        # all observations have the same category
+        data = np.array([[0.1, 0], [0.4, 0], [0.9, 0]])
+        vartypes = np.array([0, 2])
+        kde = sm.nonparametric.KDEMultivariate(data=data, var_type='cu',
+                                               bw=[0.2, 0.3])
+        match, other = np.array([[0.3, 0]]), np.array([[0.3, 1]])
+        np.testing.assert_allclose(kde_pdf(kde, match, vartypes),
+                                   kde.pdf(match[0]))
+
+        # statsmodels divides by num_levels - 1 = 0 for the other category,
+        # kde_pdf uses bw as the kernel of a single other level instead
+        with np.errstate(divide='ignore'):
+            self.assertEqual(kde.pdf(other[0]), np.inf)
+        gauss = np.exp(-0.5 * ((0.3 - data[:, 0]) / 0.2) ** 2) \
+            / (np.sqrt(2 * np.pi) * 0.2)
+        self.assertAlmostEqual(kde_pdf(kde, other, vartypes)[0],
+                               np.mean(gauss * 0.3))
+
+
+if __name__ == '__main__':
+    unittest.main()
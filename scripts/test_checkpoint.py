@@ -0,0 +1,186 @@
+import json
+import os
+import shutil
+import unittest
+
+import hpbandster.core.nameserver as hpns
+import hpbandster.core.result as hpres
+
+from hpbandster.core.dispatcher import Job
+
+from scripts.FMin import FMinWorker
+from scripts.checkpoint import (CheckpointMaster, ResumableResultLogger,
+                                checkpoint_path)
+from scripts.optimizers import get_optimizer_class
+from scripts.packing import PackingMaster
+from scripts.testing import FMinTestCase
+
+
+class TestCheckpoint(FMinTestCase):
+    def setUp(self):
+        super(TestCheckpoint, self).setUp()
+        # (w, budget) of every evaluation
+        self.evaluated = []
+        # called with the number of the evaluation before it runs
+        self.before_evaluation = lambda n: None
+
+    def opt_func(self, w, budget):
+        self.before_evaluation(len(self.evaluated) + 1)
+        self.evaluated.append((w, budget))
+        return float(w != 1) + 1. / budget
+
+    def run_master(self, working_directory, n_iterations, resume,
+                   extensions=(), num_workers=1):
+        ns = hpns.NameServer(run_id='ckpt',
+                             working_directory=working_directory)
+        ns_host, ns_port = ns.start()
+        for i in range(num_workers):
+            worker = FMinWorker(func=self.opt_func, func_args=(), id=i,
+                                nameserver=ns_host, nameserver_port=ns_port,
+                                run_id='ckpt')
+            worker.run(background=True)
+        optimizer = get_optimizer_class('bohb',
+                                        [CheckpointMaster] + list(extensions))
+        opt = optimizer(configspace=self.cs, run_id='ckpt', eta=2,
+                        min_budget=3, max_budget=12,
+                        nameserver=ns_host, nameserver_port=ns_port,
+                        working_directory=working_directory,
+                        result_logger=ResumableResultLogger(
+                            working_directory, overwrite=True,
+                            resume=resume),
+                        checkpoint_interval=0, resume=resume)
+        try:
+            return opt.run(n_iterations=n_iterations,
+                           min_n_workers=num_workers)
+        finally:
+            opt.shutdown(shutdown_workers=True)
+            ns.shutdown()
+
+    @staticmethod
+    def read_log(working_directory, name):
+        with open(os.path.join(working_directory, name)) as f:
+            return [json.loads(line) for line in f]
+
+    def test_checkpoint(self):
+        working_directory = self.make_directory()
+        first = self.run_master(working_directory, 1, resume=False)
+        num_first = len(self.evaluated)
+        resumed = self.run_master(working_directory, 2, resume=True)
+
+        # the first iteration is restored, only the second one is run
+        self.assertEqual(len(resumed.get_all_runs()),
+                         len(first.get_all_runs()) + len(self.evaluated) -
+                         num_first)
+        self.assertEqual(set(first.get_id2config_mapping()),
+                         {cid for cid in resumed.get_id2config_mapping()
+                          if cid[0] == 0})
+        logged = hpres.logged_results_to_HBS_result(working_directory)
+        self.assertEqual(len(logged.get_all_runs()),
+                         len(resumed.get_all_runs()))
+
+    def test_interrupted_iteration(self, **kwargs):
+        # Keeps the checkpoint from before the 4th evaluation, i.e. in the
+        # middle of the first rung, as if the run was interrupted there.
+        working_directory = self.make_directory()
+        checkpoint_file = checkpoint_path(working_directory, 'ckpt')
+        backup = os.path.join(working_directory, 'backup.pkl')
+
+        def before_evaluation(n):
+            if n == 4:
+                shutil.copy(checkpoint_file, backup)
+        self.before_evaluation = before_evaluation
+        first = self.run_master(working_directory, 1, resume=False, **kwargs)
+        self.before_evaluation = lambda n: None
+        self.assertEqual(len(self.evaluated), 7)
+
+        # The results of the first evaluation on the second and the third
+        # budget weren't logged before the interruption.
+        shutil.copy(backup, checkpoint_file)
+        results = self.read_log(working_directory, 'results.json')
+        lost = [results[4], results[6]]
+        with open(os.path.join(working_directory, 'results.json'), 'w') as f:
+            for entry in results:
+                if entry not in lost:
+                    f.write(json.dumps(entry) + '\n')
+        configs = self.read_log(working_directory, 'configs.json')
+
+        self.evaluated = []
+        resumed = self.run_master(working_directory, 1, resume=True, **kwargs)
+
+        # the configurations sampled after the checkpoint are added under
+        # their ids, the results logged after it are replayed, and only the
+        # lost evaluations run again
+        self.assertEqual(resumed.get_id2config_mapping(),
+                         first.get_id2config_mapping())
+        self.assertEqual(sorted(b for _, b in self.evaluated),
+                         sorted(entry[1] for entry in lost))
+        self.assertEqual(len(resumed.get_all_runs()), 7)
+        self.assertEqual(self.read_log(working_directory, 'configs.json'),
+                         configs)
+        logged = self.read_log(working_directory, 'results.json')
+        self.assertEqual(len(logged), 7)
+        self.assertEqual(len(set((tuple(r[0]), r[1]) for r in logged)), 7)
+
+    def test_early_promotions(self):
+        working_directory = self.make_directory()
+        ns = hpns.NameServer(run_id='ckpt',
+                             working_directory=working_directory)
+        ns_host, ns_port = ns.start()
+        self.addCleanup(ns.shutdown)
+
+        def master(resume):
+            optimizer = get_optimizer_class('bohb', [CheckpointMaster,
+                                                     PackingMaster])
+            opt = optimizer(configspace=self.cs, run_id='ckpt', eta=2,
+                            min_budget=3, max_budget=12,
+                            nameserver=ns_host, nameserver_port=ns_port,
+                            working_directory=working_directory,
+                            result_logger=ResumableResultLogger(
+                                working_directory, overwrite=True,
+                                resume=resume),
+                            checkpoint_interval=0, resume=resume)
+            self.addCleanup(opt.shutdown)
+            return opt
+
+        def finish(it, config_id, config, budget, loss):
+            job = Job(config_id, config=config, budget=budget)
+            job.result = {'loss': loss, 'info': {}}
+            it.register_result(job)
+
+        opt = master(resume=False)
+        it = opt.get_next_iteration(0, {'result_logger': opt.result_logger})
+        opt.iterations.append(it)
+        runs = [it.get_next_run() for _ in range(4)]
+        for i, (config_id, config, budget) in enumerate(runs[:3]):
+            finish(it, config_id, config, budget, float(i))
+        # the best configuration is certain to be among the best two
+        config_id, config, budget = it.get_next_run()
+        self.assertEqual(config_id, runs[0][0])
+        finish(it, config_id, config, budget, 0.)
+        opt.checkpoint()
+
+        resumed = master(resume=True)
+        resumed._restore(resumed.resume_state,
+                         {'result_logger': resumed.result_logger})
+        it = resumed.iterations[0]
+        self.assertEqual(list(it.early), [config_id])
+        self.assertEqual(it.early[config_id].kwargs['budget'], budget)
+        self.assertEqual(it.num_early_promotions, 1)
+        # the job that was still running is dispatched again
+        self.assertEqual(it.data[runs[3][0]].status, 'QUEUED')
+
+    def test_resume_without_checkpoint(self):
+        working_directory = self.make_directory()
+        self.run_master(working_directory, 1, resume=False)
+        os.remove(checkpoint_path(working_directory, 'ckpt'))
+
+        # starts from scratch instead of appending to the old logs
+        self.run_master(working_directory, 1, resume=True)
+        results = self.read_log(working_directory, 'results.json')
+        self.assertEqual(len(results), 7)
+        self.assertEqual(len(self.read_log(working_directory,
+                                           'configs.json')), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
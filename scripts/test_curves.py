@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+import ConfigSpace as CS
+
+from scripts.curves import FROM_CURVE, hyperband_budgets, is_from_curve
+from scripts.testing import FMinTestCase
+
+
+class TestCurves(FMinTestCase):
+    def setUp(self):
+        super(TestCurves, self).setUp()
+        # (w, budget) of every evaluation
+        self.evaluated = []
+
+    def curve_func(self, w, budget):
+        self.evaluated.append((w, budget))
+        # the loss after every epoch up to the budget
+        return {b: float(w != 1) + 1. / b for b in range(1, int(budget) + 1)}
+
+    def test_hyperband_budgets(self):
+        np.testing.assert_allclose(hyperband_budgets(3, 12, 2), [3, 6, 12])
+        np.testing.assert_allclose(hyperband_budgets(9, 243, 3),
+                                   [9, 27, 81, 243])
+
+    def test_learning_curves(self):
+        _, (inc_value, inc_cfg, result) = self.run_fmin(
+            self.curve_func, func_args=(), num_iterations=3,
+            learning_curves=True)
+        runs = result.get_all_runs()
+        filled = [r for r in runs if r.info and FROM_CURVE in r.info]
+        self.assertGreater(len(filled), 0)
+        # every result is the loss on its budget, evaluated or not
+        for r in runs:
+            w = result.get_id2config_mapping()[r.config_id]['config']['w']
+            self.assertAlmostEqual(r.loss, float(w != 1) + 1. / r.budget)
+        # only the results that weren't taken from a curve were evaluated
+        self.assertEqual(len(self.evaluated), len(runs) - len(filled))
+
+        # configurations that started on budget 12 have all rungs
+        for config_id, datum in result.data.items():
+            budgets = sorted(datum.results)
+            self.assertEqual(budgets, [3, 6, 12][:len(budgets)])
+
+        stats = result.HB_config['learning_curves']
+        self.assertEqual(stats['num_filled'] + stats['num_cached'],
+                         len(filled))
+        # w is either 0 or 1, so BOHB samples configurations again
+        self.assertGreater(stats['num_cached'], 0)
+        self.assertEqual(inc_cfg['w'], 1)
+        self.assertAlmostEqual(inc_value, 1. / 12)
+
+    def test_limit_counts_evaluations(self):
+        self.cs = CS.ConfigurationSpace(seed=123)
+        self.cs.add_hyperparameter(CS.UniformFloatHyperparameter('w', 0, 2))
+        _, (_, _, result) = self.run_fmin(
+            self.curve_func, func_args=(), num_iterations=10,
+            learning_curves=True, max_evaluations=10)
+        self.assertEqual(len(self.evaluated), 10)
+        self.assertEqual(sum(not is_from_curve({'info': r.info})
+                             for r in result.get_all_runs()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from scripts.dataset_cache import DatasetCache, default_cache_dir
+
+
+class TestDatasetCache(unittest.TestCase):
+    def test_cache(self):
+        calls = []
+
+        def loader(n):
+            calls.append(n)
+            return {'x': np.arange(n), 'y': np.ones((n, 2))}
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = DatasetCache(cache_dir)
+            first = cache.get('toy', loader, n=10)
+            second = cache.get('toy', loader, n=10)
+            other = cache.get('toy', loader, n=5)
+
+            # preprocessed once per set of parameters, attached afterwards
+            self.assertEqual(calls, [10, 5])
+            self.assertIsInstance(second['x'], np.memmap)
+            np.testing.assert_array_equal(first['x'], second['x'])
+            self.assertEqual(other['y'].shape, (5, 2))
+
+    def test_default_cache_dir(self):
+        # one directory per user, it isn't writable for the others
+        with mock.patch.dict(os.environ):
+            os.environ.pop('BOAH_DATASET_CACHE', None)
+            with mock.patch('getpass.getuser', return_value='alice'):
+                self.assertEqual(os.path.basename(default_cache_dir()),
+                                 'boah_dataset_cache-alice')
+
+
+if __name__ == '__main__':
+    unittest.main()
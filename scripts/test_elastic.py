@@ -0,0 +1,27 @@
+import json
+import os
+import unittest
+
+from scripts.testing import FMinTestCase
+
+
+class TestElastic(FMinTestCase):
+    def test_elastic(self):
+        # doesn't wait for the remote worker, which never comes
+        output_dir, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            num_workers=2, wait_for_remote_workers=1, elastic=True)
+        with open(os.path.join(output_dir, 'workers.json')) as f:
+            workers = json.load(f)
+
+        # the run may finish before the second worker was discovered
+        self.assertIn(len(workers), [1, 2])
+        self.assertEqual(sum(w['num_jobs'] for w in workers.values()),
+                         len(result.get_all_runs()))
+        for stats in workers.values():
+            self.assertIsNone(stats['left'])
+            self.assertGreaterEqual(stats['utilization'], 0)
+            self.assertLessEqual(stats['utilization'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from scripts.FMin import load_func
+from scripts.forkserver import ForkServer
+from scripts.testing import FMinTestCase
+
+
+FUNCTIONS = '''
+import os
+import time
+
+import numpy as np
+
+
+def opt_func(x, y, w, budget):
+    return np.mean((y[:int(budget)] - w * x[:int(budget)]) ** 2)
+
+
+def pid(budget):
+    return os.getpid()
+
+
+def fail(budget):
+    if budget > 1:
+        raise ValueError('budget too large')
+    os._exit(1)
+
+
+def sleep(budget):
+    time.sleep(budget)
+    return budget
+'''
+
+
+class TestForkServer(FMinTestCase):
+    def setUp(self):
+        super(TestForkServer, self).setUp()
+        self.func_file = os.path.join(self.make_directory(), 'functions.py')
+        with open(self.func_file, 'w') as f:
+            f.write(FUNCTIONS)
+
+    def test_evaluate(self):
+        with ForkServer(self.func_file, func_args=(self.X, self.y),
+                        preload=['json']) as server:
+            loss, usage = server.evaluate({'w': 1}, 12)
+            self.assertAlmostEqual(loss, self.opt_func(self.X, self.y, 1, 12))
+            self.assertEqual(usage['cpu_scope'], 'process')
+            self.assertGreater(server.startup_time, 0)
+
+    def test_isolation(self):
+        with ForkServer(self.func_file, func_name='pid') as server:
+            pids = {server.evaluate({}, 1)[0] for _ in range(3)}
+            # every evaluation runs in a new child of the server
+            self.assertEqual(len(pids), 3)
+            self.assertNotIn(os.getpid(), pids)
+            self.assertNotIn(server.process.pid, pids)
+
+        with ForkServer(self.func_file, func_name='fail') as server:
+            with self.assertRaisesRegex(RuntimeError, 'budget too large'):
+                server.evaluate({}, 2)
+            with self.assertRaisesRegex(RuntimeError, 'crashed'):
+                server.evaluate({}, 1)
+
+        with ForkServer(self.func_file, func_name='sleep',
+                        timeout=0.5) as server:
+            with self.assertRaises(TimeoutError):
+                server.evaluate({}, 10)
+            # the server survives crashes and timeouts
+            self.assertEqual(server.evaluate({}, 0.1)[0], 0.1)
+
+    def test_fmin(self):
+        func = load_func(self.func_file)
+        output_dir, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            opt_func=func, fork_server=True, num_workers=2,
+            evaluation_timeout=60)
+        self.assertEqual(inc_best_cfg['w'], 1)
+        for run in result.get_all_runs():
+            self.assertEqual(run.info['usage']['cpu_scope'], 'process')
+
+        with self.assertRaises(ValueError):
+            self.run_fmin(fork_server=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import time
+import unittest
+
+from scripts.limits import ComputeLimit, hyperband_total_budget
+from scripts.testing import FMinTestCase
+
+
+class TestComputeLimit(unittest.TestCase):
+    def test_reached(self):
+        limit = ComputeLimit(max_total_budget=30, max_evaluations=5)
+        self.assertTrue(limit)
+        self.assertFalse(ComputeLimit())
+        self.assertIsNone(limit.reached(29, 4, 1e6))
+        self.assertEqual(limit.reached(30, 4, 0), 'max_total_budget')
+        self.assertEqual(limit.reached(0, 5, 0), 'max_evaluations')
+        self.assertEqual(ComputeLimit(max_time=1).reached(0, 0, 1),
+                         'max_time')
+
+    def test_blackbox_evaluations(self):
+        # one iteration of budgets 3 to 12 with eta 2: 4 * 3 + 2 * 6 + 12
+        self.assertEqual(hyperband_total_budget(3, 12, 2, 1), 36)
+        # the four brackets of budgets 1 to 9 with eta 3
+        self.assertEqual(hyperband_total_budget(1, 9, 3, 4),
+                         (9 + 3 * 3 + 9) + (3 * 3 + 9) + 3 * 9 + 3 * 9)
+
+        self.assertEqual(ComputeLimit(max_total_budget=36)
+                         .num_evaluations(12), 3)
+        self.assertEqual(ComputeLimit(max_total_budget=37)
+                         .num_evaluations(12), 4)
+        self.assertEqual(ComputeLimit(max_total_budget=36, max_evaluations=2)
+                         .num_evaluations(12), 2)
+        self.assertEqual(ComputeLimit(max_time=10)
+                         .num_evaluations(12, default=7), 7)
+
+
+class TestLimitedMaster(FMinTestCase):
+    def test_max_evaluations(self):
+        _, (_, inc_cfg, result) = self.run_fmin(num_iterations=10,
+                                                max_evaluations=5)
+        self.assertEqual(len(result.get_all_runs()), 5)
+        compute = result.HB_config['compute']
+        self.assertEqual(compute['limit_reached'], 'max_evaluations')
+        self.assertEqual(compute['num_evaluations'], 5)
+        # the best configuration on the largest budget evaluated so far
+        self.assertEqual(inc_cfg['w'], 1)
+
+    def test_max_total_budget(self):
+        _, (_, _, result) = self.run_fmin(num_iterations=10, num_workers=2,
+                                          max_total_budget=50)
+        budgets = [run.budget for run in result.get_all_runs()]
+        # stops with the evaluation that reached the limit, and the ones
+        # that were running at that time
+        self.assertGreaterEqual(sum(budgets), 50)
+        self.assertLess(sum(budgets), 50 + 2 * 12)
+        compute = result.HB_config['compute']
+        self.assertEqual(compute['limit_reached'], 'max_total_budget')
+        self.assertEqual(compute['total_budget'], sum(budgets))
+
+    def test_max_time(self):
+        def opt_func(x, y, w, budget):
+            time.sleep(0.2)
+            return self.opt_func(x, y, w, budget)
+
+        start = time.time()
+        _, (_, _, result) = self.run_fmin(opt_func, num_iterations=100,
+                                          max_time=1)
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(result.HB_config['compute']['limit_reached'],
+                         'max_time')
+        self.assertGreater(len(result.get_all_runs()), 0)
+
+    def test_without_limit(self):
+        _, (_, _, result) = self.run_fmin(num_iterations=1)
+        # the iteration runs completely
+        self.assertEqual(sum(run.budget for run in result.get_all_runs()),
+                         hyperband_total_budget(3, 12, 2, 1))
+        self.assertNotIn('compute', result.HB_config)
+
+
+if __name__ == '__main__':
+    unittest.main()
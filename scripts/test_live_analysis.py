@@ -0,0 +1,71 @@
+import json
+import os
+import unittest
+
+import hpbandster.core.result as hpres
+
+from scripts.live_analysis import LiveAnalysis, LogTail
+from scripts.testing import FMinTestCase
+
+
+class TestLiveAnalysis(FMinTestCase):
+    def test_log_tail(self):
+        path = os.path.join(self.make_directory(), 'results.json')
+        tail = LogTail(path)
+        self.assertEqual(tail.read(), [])
+        with open(path, 'w') as f:
+            f.write('[1]\n[2')
+        # the second line is still being written
+        self.assertEqual(tail.read(), [[1]])
+        with open(path, 'a') as f:
+            f.write(']\n')
+        self.assertEqual(tail.read(), [[2]])
+        self.assertFalse(tail.truncated())
+        with open(path, 'w') as f:
+            f.write('')
+        self.assertTrue(tail.truncated())
+
+    def test_matches_result(self):
+        output_dir, (inc_value, _, result) = self.run_fmin(num_iterations=3)
+        # the results are read in two parts, as while the run is going on
+        with open(os.path.join(output_dir, 'results.json')) as f:
+            lines = f.readlines()
+        with open(os.path.join(output_dir, 'results.json'), 'w') as f:
+            f.writelines(lines[:5])
+
+        importance = []
+        analysis = LiveAnalysis(
+            output_dir, fanova_every=5, min_fanova_results=1,
+            importance=lambda cs, configs, losses:
+            importance.append(len(losses)) or {'w': 1.})
+        self.assertEqual(analysis.update(), 5)
+        with open(os.path.join(output_dir, 'results.json'), 'a') as f:
+            f.writelines(lines[5:])
+        self.assertEqual(analysis.update(), len(lines) - 5)
+
+        logged = hpres.logged_results_to_HBS_result(output_dir)
+        trajectory = logged.get_incumbent_trajectory()
+        self.assertEqual([tuple(e['config_id']) for e in
+                          analysis.summary()['trajectory']],
+                         trajectory['config_ids'][:len(analysis.trajectory)])
+        self.assertEqual(analysis.incumbent['loss'], inc_value)
+
+        summary = analysis.summary()
+        self.assertEqual(summary['num_results'], len(result.get_all_runs()))
+        self.assertEqual(sum(d['num_results'] for d in
+                             summary['rung_distributions'].values()),
+                         len(result.get_all_runs()))
+        for entry in summary['budget_correlation']:
+            self.assertLess(entry['budgets'][0], entry['budgets'][1])
+        # fANOVA was refreshed after the first 5 results and at the end
+        self.assertEqual(len(importance), 2)
+        self.assertEqual(summary['fanova']['importance'], {'w': 1.})
+
+        analysis.write()
+        with open(os.path.join(output_dir, 'live_analysis.json')) as f:
+            self.assertEqual(json.load(f)['num_results'],
+                             summary['num_results'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import json
+import os
+import unittest
+
+from scripts.packing import CostModel, idle_time
+from scripts.testing import FMinTestCase
+
+
+class TestPacking(FMinTestCase):
+    def test_cost_model(self):
+        model = CostModel(self.cs, min_points=2)
+        self.assertIsNone(model.predict({'w': 0}, 3))
+        for i in range(4):
+            model.add({'w': i % 2}, 3, 1. + 2 * (i % 2))
+        self.assertGreater(model.predict({'w': 1}, 3),
+                           model.predict({'w': 0}, 3))
+        # budgets without observations are extrapolated
+        self.assertAlmostEqual(model.predict({'w': 0}, 6), 4.)
+
+    def test_idle_time(self):
+        # two workers, one idle during the second half
+        self.assertEqual(idle_time([(0, 2), (0, 1)], 0, 2, 2), 1)
+
+    def test_cost_aware(self):
+        output_dir, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            num_iterations=2, num_workers=2, cost_aware=True)
+        with open(os.path.join(output_dir, 'packing.json')) as f:
+            report = json.load(f)
+
+        self.assertEqual(inc_best_cfg['w'], 1)
+        self.assertEqual(len(report['iterations']), 2)
+        for entry in report['iterations']:
+            self.assertGreaterEqual(entry['utilization'], 0)
+            self.assertLessEqual(entry['utilization'], 1)
+        # early promotions don't change how many runs successive halving does
+        budgets = [run.budget for run in result.get_all_runs()
+                   if run.config_id[0] == 0]
+        self.assertEqual(sorted(budgets), [3] * 4 + [6] * 2 + [12])
+
+
+if __name__ == '__main__':
+    unittest.main()
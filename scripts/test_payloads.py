@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from hpbandster.core.base_iteration import Datum
+from hpbandster.core.result import Result
+
+from scripts.payloads import PayloadStore, is_handle, load_result_payloads
+
+
+class TestPayloadStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.store = PayloadStore(os.path.join(self.directory, 'payloads'),
+                                  threshold=1000)
+
+    def test_put_load(self):
+        curve = np.arange(1000.)
+        handle = self.store.put(curve)
+        self.assertTrue(is_handle(handle))
+        # the handle is small and can be logged as json
+        self.assertLess(len(json.dumps(handle)), 200)
+        np.testing.assert_array_equal(self.store.load(handle), curve)
+
+        # the same payload is stored once
+        self.assertEqual(self.store.put(np.arange(1000.)), handle)
+        files = [f for _, _, fs in os.walk(self.store.directory) for f in fs]
+        self.assertEqual(len(files), 1)
+
+    def test_offload_info(self):
+        info = {'all_runs': list(range(1000)), 'returns': 1.5,
+                'resources': {'threads': 2}}
+        offloaded = self.store.offload_info(info)
+        self.assertTrue(is_handle(offloaded['all_runs']))
+        self.assertEqual(offloaded['returns'], 1.5)
+        self.assertEqual(offloaded['resources'], {'threads': 2})
+        self.assertEqual(self.store.load_info(offloaded), info)
+
+        # infos that aren't dicts are left as they are
+        self.assertEqual(self.store.offload_info('crashed'), 'crashed')
+
+    def test_load_result_payloads(self):
+        info = self.store.offload_info({'curve': list(range(1000))})
+        data = {(0, 0, 0): Datum({'w': 1}, {}, budget=3,
+                                 results={3: {'loss': 0., 'info': info}},
+                                 time_stamps={3: {'submitted': 0.,
+                                                  'started': 0.,
+                                                  'finished': 1.}},
+                                 status='FINISHED')}
+        result = Result([data], {'max_budget': 3, 'time_ref': 0.})
+        load_result_payloads(result, self.store.directory)
+        run, = result.get_all_runs()
+        self.assertEqual(run.info['curve'], list(range(1000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
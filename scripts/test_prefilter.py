@@ -0,0 +1,57 @@
+import json
+import os
+import unittest
+
+from scripts.prefilter import SurrogatePrefilter
+from scripts.testing import FMinTestCase
+
+
+class TestPrefilter(FMinTestCase):
+    def test_select(self):
+        prefilter = SurrogatePrefilter(self.cs, seed=1)
+        self.assertFalse(prefilter.is_ready())
+        for i in range(4):
+            prefilter.add({'w': i % 2}, 3, 10. - 9 * (i % 2))
+        # crashed evaluations are left out
+        prefilter.add({'w': 0}, 3, None)
+        self.assertTrue(prefilter.is_ready())
+
+        candidates = [({'w': w}, {'model_based_pick': False})
+                      for w in [0, 1, 0, 1]]
+        selected = prefilter.select(candidates, 3, 2)
+        self.assertEqual([config['w'] for config, _ in selected], [1, 1])
+        self.assertLess(selected[0][1]['predicted_loss'], 5)
+        self.assertFalse(selected[0][1]['model_based_pick'])
+
+        prefilter.add_prediction(selected[0][1]['predicted_loss'], 1.)
+        report = prefilter.report()
+        self.assertEqual(report['skip_rate'], 0.5)
+        self.assertEqual(report['num_predictions'], 1)
+        self.assertLess(report['mean_absolute_error'], 1)
+
+    def test_num_dispatched(self):
+        prefilter = SurrogatePrefilter(self.cs, keep=0.25)
+        self.assertEqual(prefilter.num_dispatched_of(27, 9), 9)
+        self.assertEqual(prefilter.num_dispatched_of(81, 9), 21)
+        self.assertEqual(prefilter.num_dispatched_of(1, 0), 1)
+
+    def test_prefilter(self):
+        output_dir, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            num_iterations=4, prefilter=True)
+        with open(os.path.join(output_dir, 'prefilter.json')) as f:
+            report = json.load(f)
+
+        self.assertEqual(inc_best_cfg['w'], 1)
+        self.assertEqual(report, result.HB_config['prefilter'])
+        # the first bracket runs before the model is ready, the last one
+        # evaluates half of its configurations on min_budget
+        self.assertEqual(report['num_candidates'], 4)
+        self.assertEqual(report['num_saved'], 2)
+        budgets = [run.budget for run in result.get_all_runs()
+                   if run.config_id[0] == 3]
+        self.assertEqual(sorted(budgets), [3] * 2 + [6] * 2 + [12])
+        self.assertEqual(report['num_predictions'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+import ConfigSpace as CS
+from hpbandster.core.dispatcher import Job
+
+from scripts.pruning import RungPruner
+from scripts.testing import FMinTestCase
+
+
+def finished_job(config_id, budget, loss, info=None):
+    job = Job(config_id, budget=budget)
+    job.result = {'loss': loss, 'info': info or {}}
+    return job
+
+
+class TestPruning(FMinTestCase):
+    def test_rung_pruner(self):
+        pruner = RungPruner()
+        # unknown number of promotions: never stopped
+        self.assertFalse(pruner.report((0, 0, 9), 9, 1, 100.))
+
+        pruner.set_promotions(0, 9, 2)
+        for i, curve in enumerate([[3., 2., 1.], [4., 3., 2.]]):
+            for step, loss in enumerate(curve, 1):
+                pruner.report((0, 0, i), 9, step, loss)
+            pruner.register_result(finished_job((0, 0, i), 9, curve[-1]))
+
+        # stopped only when as many runs were better as are promoted
+        self.assertFalse(pruner.report((0, 0, 2), 9, 1, 3.5))
+        self.assertTrue(pruner.report((0, 0, 3), 9, 2, 3.5))
+
+        # an early-stopped run is no reference after it was stopped
+        pruner.set_promotions(1, 9, 1)
+        pruner.report((1, 0, 0), 9, 1, 1.)
+        pruner.register_result(finished_job(
+            (1, 0, 0), 9, 1., {'early_stopped': True, 'stopped_at': 1}))
+        self.assertTrue(pruner.report((1, 0, 1), 9, 1, 2.))
+        self.assertFalse(pruner.report((1, 0, 2), 9, 2, 2.))
+
+    def test_prune(self):
+        def opt_func(x, y, w, budget, report):
+            for step in range(1, int(budget) + 1):
+                loss = np.mean((y - w * x) ** 2) + 1. / step
+                report(loss, step)
+            return loss
+
+        # rungs of 9, 3 and 1 configurations, the first one promotes 3
+        self.cs = CS.ConfigurationSpace()
+        self.cs.add_hyperparameter(CS.UniformFloatHyperparameter('w', -1, 3))
+        self.cs.seed(123)
+        _, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            opt_func, eta=3, max_budget=27, num_iterations=1, prune=True)
+        id2config = result.get_id2config_mapping()
+        stopped = [run for run in result.get_all_runs()
+                   if run.info.get('early_stopped')]
+
+        # Only configurations worse than the incumbent are stopped early
+        self.assertTrue(len(stopped) > 0)
+        for run in stopped:
+            w = id2config[run.config_id]['config']['w']
+            self.assertGreater(abs(w - 1), abs(inc_best_cfg['w'] - 1))
+            self.assertLess(run.info['stopped_at'], run.budget)
+
+        # Functions without a ``report`` argument can't be pruned
+        with self.assertRaises(ValueError):
+            self.run_fmin(prune=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
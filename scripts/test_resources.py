@@ -0,0 +1,32 @@
+import os
+import unittest
+
+from scripts.resources import THREAD_ENV_VARS, available_cores, thread_layout
+from scripts.testing import FMinTestCase
+
+
+class TestResources(FMinTestCase):
+    def test_thread_layout(self):
+        cores = available_cores()
+        self.assertGreaterEqual(cores, 1)
+
+        for workers in [1, 2, 64]:
+            layout = thread_layout(workers_per_node=workers, worker_index=0)
+            self.assertEqual(layout['cores_available'], cores)
+            self.assertEqual(layout['threads'], max(1, cores // workers))
+            self.assertEqual(len(layout['cpus']), layout['threads'])
+
+    def test_restore(self):
+        before = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+        _, (inc_best, inc_best_cfg, result) = self.run_fmin(num_workers=2)
+
+        # fmin gives the caller its thread pools back
+        self.assertEqual({var: os.environ.get(var) for var in THREAD_ENV_VARS},
+                         before)
+        # every result records the thread layout of its worker
+        for run in result.get_all_runs():
+            self.assertEqual(run.info['resources']['workers_per_node'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import threading
+import unittest
+
+import hpbandster.core.result as hpres
+
+from scripts.result_store import ResultStore
+from scripts.testing import FMinTestCase
+
+
+class TestResultStore(FMinTestCase):
+    def add_run(self, store, optimizer, run_id, losses, start=100.):
+        run = store.run('exp', optimizer, run_id)
+        for i, loss in enumerate(losses):
+            config_id = (0, 0, i)
+            store.add_config(run, config_id, {'w': i % 2},
+                             {'model_based_pick': False})
+            store.add_result(run, config_id, 12,
+                             {'submitted': start + 10 * i,
+                              'started': start + 10 * i + 1,
+                              'finished': start + 10 * i + 10},
+                             {'loss': loss, 'info': {}} if loss is not None
+                             else None,
+                             None if loss is not None else 'Traceback')
+
+    def test_best_losses(self):
+        store = ResultStore(os.path.join(self.make_directory(), 'results.db'))
+        self.add_run(store, 'bohb', 0, [3., 1., None])
+        self.add_run(store, 'bohb', 1, [2., 0.5], start=5000.)
+        self.add_run(store, 'hyperband', 0, [4., 2.])
+
+        best = store.best_losses()
+        self.assertEqual([(b['optimizer'], b['num_runs'], b['mean'], b['min'])
+                          for b in best],
+                         [('bohb', 2, 0.75, 0.5), ('hyperband', 1, 2., 2.)])
+        # the first result of every run finished after 10 seconds
+        best = store.best_losses(time=15, optimizer='bohb', per_run=True)
+        self.assertEqual([(b['run_id'], b['loss']) for b in best],
+                         [('0', 3.), ('1', 2.)])
+        self.assertEqual(store.best_losses(budget=6), [])
+        self.assertEqual([r['num_results'] for r in store.runs()], [3, 2, 2])
+
+    def test_export(self):
+        output_dir, (inc_value, inc_cfg, result) = self.run_fmin()
+        store = ResultStore(os.path.join(self.make_directory(), 'results.db'))
+        num_results = store.import_directory(output_dir, 'exp', 'bohb', 0)
+        self.assertEqual(num_results, len(result.get_all_runs()))
+        self.assertEqual(store.best_losses(budget=12)[0]['min'], inc_value)
+
+        export_dir = self.make_directory()
+        store.export(export_dir, 'exp', 'bohb', 0)
+        exported = hpres.logged_results_to_HBS_result(export_dir)
+        self.assertEqual(
+            sorted((r.config_id, r.budget, r.loss)
+                   for r in exported.get_all_runs()),
+            sorted((r.config_id, r.budget, r.loss)
+                   for r in result.get_all_runs()))
+        self.assertEqual(exported.get_id2config_mapping(),
+                         result.get_id2config_mapping())
+        with self.assertRaises(KeyError):
+            store.export(export_dir, 'exp', 'bohb', 1)
+
+    def test_fmin(self):
+        db = os.path.join(self.make_directory(), 'results.db')
+        output_dir, (inc_value, inc_cfg, result) = self.run_fmin(result_db=db)
+        store = ResultStore(db)
+        runs = store.runs()
+        self.assertEqual([(r['experiment'], r['optimizer'], r['num_results'])
+                          for r in runs],
+                         [(os.path.basename(output_dir), 'bohb',
+                           len(result.get_all_runs()))])
+        self.assertEqual(store.best_losses(budget=12)[0]['min'], inc_value)
+
+    def test_concurrent_writers(self):
+        db = os.path.join(self.make_directory(), 'results.db')
+
+        def write(optimizer):
+            # every thread has its own connection, like separate masters
+            store = ResultStore(db)
+            self.add_run(store, optimizer, 0, [float(i) for i in range(50)])
+            store.close()
+
+        threads = [threading.Thread(target=write, args=(optimizer,))
+                   for optimizer in ['bohb', 'hyperband', 'random_search']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([r['num_results'] for r in ResultStore(db).runs()],
+                         [50] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
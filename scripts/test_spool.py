@@ -0,0 +1,117 @@
+import atexit
+import json
+import os
+import unittest
+
+import hpbandster.core.nameserver as hpns
+import hpbandster.core.result as hpres
+from hpbandster.core.dispatcher import Job
+
+from scripts.FMin import FMinWorker
+from scripts.checkpoint import CheckpointMaster
+from scripts.optimizers import get_optimizer_class
+from scripts.spool import SpoolingResultLogger
+from scripts.testing import FMinTestCase
+
+
+def make_job(i, budget=3.):
+    job = Job((0, 0, i), config={'w': i % 2}, budget=budget)
+    job.timestamps = {'submitted': 1. * i, 'started': i + .1,
+                      'finished': i + .5}
+    job.result = {'loss': float(i), 'info': {}}
+    return job
+
+
+class TestSpool(FMinTestCase):
+    def log(self, logger, jobs):
+        for job in jobs:
+            logger.new_config(job.id, job.kwargs['config'],
+                              {'model_based_pick': False})
+            logger(job)
+
+    @staticmethod
+    def read_log(directory, name):
+        with open(os.path.join(directory, name)) as f:
+            return [json.loads(line) for line in f]
+
+    def crash(self, logger):
+        # stops the logger without flushing
+        logger.closed.set()
+        logger.thread.join()
+        for f in logger.spool_files.values():
+            f.close()
+        atexit.unregister(logger.close)
+
+    def test_flush(self):
+        shared, local = self.make_directory(), self.make_directory()
+        logger = SpoolingResultLogger(shared, local, flush_interval=3600)
+        self.log(logger, [make_job(i) for i in range(5)])
+        self.assertEqual(self.read_log(shared, 'results.json'), [])
+
+        logger.flush()
+        self.assertEqual(len(self.read_log(shared, 'configs.json')), 5)
+        self.assertEqual([r[3]['loss'] for r
+                          in self.read_log(shared, 'results.json')],
+                         [0., 1., 2., 3., 4.])
+        self.log(logger, [make_job(i) for i in range(5, 8)])
+        logger.close()
+        self.assertFalse(os.path.exists(logger.spool_directory))
+        result = hpres.logged_results_to_HBS_result(shared)
+        self.assertEqual(len(result.get_all_runs()), 8)
+        self.assertEqual(logger.num_flushes, 2)
+
+    def test_recover(self):
+        shared, local = self.make_directory(), self.make_directory()
+        logger = SpoolingResultLogger(shared, local, overwrite=True,
+                                      flush_interval=3600)
+        self.log(logger, [make_job(i) for i in range(3)])
+        logger.flush()
+        self.log(logger, [make_job(i) for i in range(3, 6)])
+        self.crash(logger)
+        # an interrupted flush and an incomplete entry in the spool
+        with open(os.path.join(shared, 'results.json'), 'a') as f:
+            f.write('[[0, 0, 3], 3.0, {"submitted"')
+        with open(logger.spool_fns['results'], 'a') as f:
+            f.write('[[0, 0, 6], 3.0')
+
+        resumed = SpoolingResultLogger(shared, local, resume=True,
+                                       flush_interval=3600)
+        self.assertEqual([r[0][2] for r
+                          in self.read_log(shared, 'results.json')],
+                         list(range(6)))
+        self.log(resumed, [make_job(6)])
+        resumed.close()
+        self.assertEqual(len(self.read_log(shared, 'results.json')), 7)
+        self.assertEqual(len(self.read_log(shared, 'configs.json')), 7)
+
+    def test_checkpoint(self):
+        shared, local = self.make_directory(), self.make_directory()
+        ns = hpns.NameServer(run_id='spool', working_directory=shared)
+        ns_host, ns_port = ns.start()
+        worker = FMinWorker(func=self.opt_func, func_args=(self.X, self.y),
+                            nameserver=ns_host, nameserver_port=ns_port,
+                            run_id='spool')
+        worker.run(background=True)
+        logger = SpoolingResultLogger(shared, local, overwrite=True,
+                                      flush_interval=3600)
+        optimizer = get_optimizer_class('bohb', [CheckpointMaster])
+        opt = optimizer(configspace=self.cs, run_id='spool', eta=2,
+                        min_budget=3, max_budget=12, nameserver=ns_host,
+                        nameserver_port=ns_port, working_directory=shared,
+                        result_logger=logger, checkpoint_interval=0)
+        try:
+            result = opt.run(n_iterations=2)
+        finally:
+            opt.shutdown(shutdown_workers=True)
+            ns.shutdown()
+
+        # the checkpoints flushed the spool, without closing the logger
+        self.assertGreater(logger.num_flushes, 1)
+        logged = hpres.logged_results_to_HBS_result(shared)
+        self.assertEqual(len(logged.get_all_runs()),
+                         len(result.get_all_runs()))
+        logger.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+
+from scripts.studies import SharedPool, StudyServer
+from scripts.testing import FMinTestCase
+
+
+class TestSharedPool(unittest.TestCase):
+    def run_tasks(self, pool, tasks):
+        # queues the tasks while the single thread of the pool is blocked,
+        # and returns the order in which they ran
+        order, gate = [], threading.Event()
+        blocker = threading.Thread(target=pool.evaluate,
+                                   args=('blocker', gate.wait))
+        blocker.start()
+        time.sleep(0.1)
+        threads = []
+        for study, name in tasks:
+            thread = threading.Thread(target=pool.evaluate, args=(
+                study, lambda name=name: order.append(name)))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.01)
+        gate.set()
+        for thread in threads + [blocker]:
+            thread.join()
+        return order
+
+    def test_scheduling(self):
+        pool = SharedPool(1, scheduling='priority')
+        pool.register('blocker')
+        pool.register('low', priority=0)
+        pool.register('high', priority=1)
+        pool.start()
+        self.addCleanup(pool.shutdown)
+        order = self.run_tasks(pool, [('low', 'l1'), ('low', 'l2'),
+                                      ('high', 'h1'), ('high', 'h2')])
+        self.assertEqual(order, ['h1', 'h2', 'l1', 'l2'])
+
+        stats = pool.unregister('high')
+        self.assertEqual(stats['num_evaluations'], 2)
+        self.assertGreater(stats['queue_wait'], 0)
+
+    def test_fair_share(self):
+        pool = SharedPool(1)
+        pool.register('blocker')
+        pool.register('a')
+        pool.register('b')
+        pool.start()
+        self.addCleanup(pool.shutdown)
+        # the queued evaluations of the two studies take turns
+        order = self.run_tasks(pool, [('a', 'a1'), ('a', 'a2'), ('a', 'a3'),
+                                      ('b', 'b1'), ('b', 'b2')])
+        self.assertEqual(order, ['a1', 'b1', 'a2', 'b2', 'a3'])
+
+    def test_errors(self):
+        pool = SharedPool(1)
+        pool.register('study')
+        pool.start()
+        with self.assertRaises(ZeroDivisionError):
+            pool.evaluate('study', lambda: 1 / 0)
+        pool.shutdown()
+        with self.assertRaises(RuntimeError):
+            pool.evaluate('study', lambda: None)
+        with self.assertRaises(ValueError):
+            SharedPool(1, scheduling='lottery')
+
+
+class TestStudyServer(FMinTestCase):
+    def test_studies(self):
+        running, most = [0], [0]
+        lock = threading.Lock()
+
+        def opt_func(x, y, w, budget):
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return self.opt_func(x, y, w, budget)
+
+        server = StudyServer(num_workers=2)
+        try:
+            studies = [server.submit(opt_func, self.cs,
+                                     func_args=(self.X, self.y),
+                                     output_dir=self.make_directory(),
+                                     min_budget=3, max_budget=12)
+                       for _ in range(3)]
+            results = [study.result(timeout=60) for study in studies]
+        finally:
+            server.shutdown()
+
+        # all studies shared the two workers of the pool
+        self.assertLessEqual(most[0], 2)
+        for inc_value, inc_cfg, result in results:
+            # The studies sample from the same configuration space at once,
+            # so which configurations each one sees isn't deterministic.
+            self.assertEqual(inc_value, min(run.loss for run
+                                            in result.get_all_runs()
+                                            if run.budget == 12))
+            stats = result.HB_config['shared_pool']
+            self.assertEqual(stats['num_evaluations'],
+                             len(result.get_all_runs()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import unittest
+
+import numpy as np
+
+from scripts.forkserver import ForkServer
+from scripts.subsets import DataSubsets, budget_schedule
+from scripts.testing import FMinTestCase
+
+
+FUNCTIONS = '''
+def num_samples(x, y, budget):
+    return len(x)
+'''
+
+
+def full_data_func(x, y, w, budget):
+    # the subset of the budget is all the function gets
+    return np.mean((y - w * x) ** 2)
+
+
+class TestSubsets(FMinTestCase):
+    def test_budget_schedule(self):
+        np.testing.assert_allclose(budget_schedule(3, 12, 2), [3, 6, 12])
+        np.testing.assert_allclose(budget_schedule(1, 9, 3), [1, 3, 9])
+
+    def test_subsets(self):
+        # sorted by class, as the first samples of many datasets are
+        x = np.arange(500)
+        y = np.repeat([0, 1, 2], [300, 150, 50])
+        subsets = DataSubsets((x, y, 'kernel'), budget_schedule(1, 9, 3),
+                              stratify=1, seed=1)
+        previous = set()
+        for budget in [1, 3, 9]:
+            x_sub, y_sub, kernel = subsets.args(budget)
+            self.assertEqual(kernel, 'kernel')
+            self.assertEqual(len(x_sub), subsets.size(budget))
+            # views of the permuted arrays, whose rows still belong together
+            self.assertTrue(np.shares_memory(x_sub, subsets.func_args[0]))
+            np.testing.assert_array_equal(y_sub, y[x_sub])
+            # stratified, nested and shuffled
+            np.testing.assert_allclose(np.bincount(y_sub) / len(y_sub),
+                                       [0.6, 0.3, 0.1], atol=0.02)
+            self.assertTrue(previous <= set(x_sub))
+            self.assertFalse(np.all(np.diff(x_sub) > 0))
+            previous = set(x_sub)
+        self.assertEqual(subsets.size(1), 56)
+        self.assertEqual(previous, set(x))
+
+        # float labels are stratified by quantile bins
+        subsets = DataSubsets((self.X, self.y), [25, 100], stratify=1, seed=1)
+        _, y_sub = subsets.args(25)
+        self.assertEqual(len(y_sub), 25)
+        # two or three of the ten samples of every decile
+        deciles = np.quantile(self.y, np.linspace(0, 1, 11))[1:-1]
+        counts = np.bincount(np.digitize(y_sub, deciles), minlength=10)
+        self.assertTrue(np.all((counts >= 2) & (counts <= 3)))
+
+        with self.assertRaises(ValueError):
+            DataSubsets(('kernel',), [1, 2])
+
+    def test_fmin(self):
+        _, (inc_best, inc_best_cfg, result) = self.run_fmin(
+            opt_func=full_data_func, data_subsets=True)
+        self.assertEqual(inc_best_cfg['w'], 1)
+        sizes = {r.budget: r.info['num_samples']
+                 for r in result.get_all_runs()}
+        self.assertEqual(sizes, {3: 25, 6: 50, 12: 100})
+
+        with self.assertRaises(ValueError):
+            self.run_fmin(stratify=1)
+
+    def test_fork_server(self):
+        func_file = os.path.join(self.make_directory(), 'functions.py')
+        with open(func_file, 'w') as f:
+            f.write(FUNCTIONS)
+        subsets = DataSubsets((self.X, self.y), budget_schedule(3, 12, 2))
+        with ForkServer(func_file, func_name='num_samples',
+                        func_args=subsets) as server:
+            self.assertEqual(server.evaluate({}, 3)[0], 25)
+            self.assertEqual(server.evaluate({}, 12)[0], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
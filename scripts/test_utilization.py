@@ -0,0 +1,35 @@
+import unittest
+
+from scripts.testing import FMinTestCase
+from scripts.utilization import analyze_runs, assign_workers, load_runs
+
+
+class TestUtilization(FMinTestCase):
+    def test_analyze_runs(self):
+        runs = [{'config_id': (0, 0, i), 'budget': 1, 'submitted': s,
+                 'started': s, 'finished': e, 'worker': None}
+                for i, (s, e) in enumerate([(0, 2), (0, 1), (1, 2), (2, 4)])]
+        # two workers suffice for the four jobs
+        self.assertEqual(len(set(r['worker'] for r in assign_workers(
+            [dict(r) for r in runs]))), 2)
+        analysis = analyze_runs(runs, num_workers=3)
+        self.assertAlmostEqual(analysis['busy_fraction'], 6. / 12)
+        self.assertAlmostEqual(analysis['saturated_fraction'], 0)
+        self.assertAlmostEqual(analyze_runs(runs)['saturated_fraction'], .5)
+        # the single job of the last two seconds is the tail of the rung
+        self.assertAlmostEqual(analysis['rung_tail_idle_time'], 4)
+
+    def test_logged_workers(self):
+        output_dir, _ = self.run_fmin(num_workers=2)
+        runs = load_runs(output_dir)
+
+        # the workers of fmin are logged with the results
+        analysis = analyze_runs(runs)
+        self.assertLessEqual(len(analysis['workers']), 2)
+        self.assertEqual(sum(w['num_jobs'] for w in
+                             analysis['workers'].values()), len(runs))
+        self.assertGreaterEqual(analysis['queue_wait']['mean'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Shared fixtures of the tests of the ``scripts`` modules.
+"""
+
+import logging
+import tempfile
+import unittest
+
+import numpy as np
+import ConfigSpace as CS
+
+from scripts.FMin import fmin
+
+
+class FMinTestCase(unittest.TestCase):
+    """
+    Test case with the toy problem of the fmin tests: fitting ``y = w * x``
+    to noisy samples of ``y = x``, with ``w`` in {0, 1}. The number of samples
+    used is the budget, the best configuration is ``w = 1``.
+    """
+
+    def setUp(self):
+        logging.basicConfig(level=logging.ERROR)
+        np.random.seed(123)
+
+        self.X = np.random.uniform(-5, 5, 100)
+        self.y = np.random.normal(self.X, 1)
+
+        self.cs = CS.ConfigurationSpace()
+        self.cs.add_hyperparameter(CS.CategoricalHyperparameter('w', [0, 1]))
+        self.cs.seed(123)
+
+    @staticmethod
+    def opt_func(x, y, w, budget):
+        return np.mean((y[:int(budget)] - w * x[:int(budget)]) ** 2)
+
+    def make_directory(self):
+        """
+        Temporary directory, removed after the test.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+    def run_fmin(self, opt_func=None, **kwargs):
+        """
+        Runs fmin on the toy problem with budgets from 3 to 12.
+
+        Args:
+            opt_func (callable, optional): replaces :meth:`opt_func`.
+            **kwargs: further arguments of fmin. ``output_dir`` defaults to
+                a temporary directory.
+
+        Returns:
+            str, tuple - the output directory and the return value of fmin
+        """
+        kwargs.setdefault('output_dir', self.make_directory())
+        kwargs.setdefault('func_args', (self.X, self.y))
+        kwargs.setdefault('min_budget', 3)
+        kwargs.setdefault('max_budget', 12)
+        return kwargs['output_dir'], fmin(opt_func or self.opt_func, self.cs,
+                                          **kwargs)
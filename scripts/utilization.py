@@ -0,0 +1,328 @@
+"""
+Post-hoc analysis of how busy the workers of a run were.
+
+Every result logged by HpBandSter's json result logger has the time it was
+submitted, started and finished. From these, this module computes for one or
+many run directories
+
+- the busy and idle fraction of every worker between the start and the end
+  of the run
+- how long all workers were busy at the same time
+- how long the jobs waited between submission and start
+- the idle time at the end of every rung, while the last jobs of the rung
+  were running and successive halving had nothing else to dispatch
+- a Gantt chart of the jobs on the workers
+
+Results of :class:`scripts.FMin.FMinWorker` record the worker that ran them.
+For other workers, the jobs are assigned to as few workers as their time
+stamps allow. As long as the workers were never idle while a job was waiting,
+this is the number of workers of the run.
+
+How to read the numbers: HpBandSter's master submits a job only once a
+worker is free, so the queue wait is close to zero and only shows the
+dispatch latency. Whether more workers would help shows in the idle time
+instead. The master samples a new configuration for every free worker until
+the rung is full, so while all workers are busy (the saturated fraction) there
+would have been work for more of them as well. If most of the idle time is
+at the end of the rungs, more workers would idle as well, and packing the
+jobs by cost (:mod:`scripts.packing`) or more configurations per rung help
+more.
+
+Usage::
+
+    python utilization.py NEMO_OUTPUT/BC_* --gantt gantt
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+_repo_root = str(Path(__file__).resolve().parents[1])
+if _repo_root not in sys.path:
+    sys.path.append(_repo_root)
+
+import numpy as np
+import hpbandster.core.result as hpres
+
+from scripts.packing import idle_time, schedule_report
+
+
+def load_runs(directory):
+    """
+    Jobs logged to the run directory ``directory``.
+
+    Returns:
+        list of dict - one per job with 'config_id', 'budget', 'submitted',
+            'started', 'finished' and 'worker' (None if not logged)
+    """
+    result = hpres.logged_results_to_HBS_result(str(directory))
+    runs = []
+    for run in result.get_all_runs():
+        info = run.info if isinstance(run.info, dict) else {}
+        runs.append({'config_id': run.config_id, 'budget': run.budget,
+                     'submitted': run.time_stamps['submitted'],
+                     'started': run.time_stamps['started'],
+                     'finished': run.time_stamps['finished'],
+                     'worker': info.get('worker')})
+    return runs
+
+
+def assign_workers(runs):
+    """
+    Sets the 'worker' of every job without one.
+
+    Jobs are assigned in the order they started to the worker that became
+    free last before, which needs as few workers as possible.
+    """
+    free_at = {}
+    for r in runs:
+        if r['worker'] is not None:
+            free_at[r['worker']] = max(free_at.get(r['worker'], -np.inf),
+                                       r['finished'])
+    num_inferred = 0
+    for r in sorted(runs, key=lambda r: r['started']):
+        if r['worker'] is not None:
+            continue
+        free = [w for w, t in free_at.items()
+                if t <= r['started'] and str(w).startswith('worker_')]
+        if free:
+            worker = max(free, key=lambda w: free_at[w])
+        else:
+            worker = 'worker_%i' % num_inferred
+            num_inferred += 1
+        r['worker'] = worker
+        free_at[worker] = r['finished']
+    return runs
+
+
+def saturated_time(intervals, start, end, num_workers):
+    """
+    Time between ``start`` and ``end``, in which at least ``num_workers``
+    jobs ran at once.
+    """
+    events = []
+    for s, e in intervals:
+        s, e = max(s, start), min(e, end)
+        if e > s:
+            events.extend([(s, 1), (e, -1)])
+    events.sort()
+
+    saturated, running, last = 0., 0, start
+    for t, delta in events:
+        if running >= num_workers:
+            saturated += t - last
+        running += delta
+        last = t
+    return saturated
+
+
+def rung_tails(runs):
+    """
+    Time windows from the start of the last job to the end of every rung.
+    Iterations run concurrently, so overlapping windows are merged.
+
+    Returns:
+        list of (float, float) - disjoint windows, sorted by their start
+    """
+    rungs = {}
+    for r in runs:
+        rung = rungs.setdefault((r['config_id'][0], r['budget']),
+                                [-np.inf, -np.inf])
+        rung[0] = max(rung[0], r['started'])
+        rung[1] = max(rung[1], r['finished'])
+
+    windows = []
+    for start, end in sorted(rungs.values()):
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def analyze_runs(runs, num_workers=None):
+    """
+    Utilization of the workers of one run.
+
+    Args:
+        runs (list of dict): jobs as returned by :func:`load_runs`.
+        num_workers (int, optional): number of workers that were allocated.
+            Workers that never ran a job count as idle all the time. Defaults
+            to the workers that ran jobs.
+
+    Returns:
+        dict with
+            - ``start``, ``end``, ``makespan``: first submission and last
+              result, relative to the first submission
+            - ``num_workers``, ``busy_fraction``, ``idle_fraction``
+            - ``saturated_fraction``: fraction of the makespan, in which all
+              workers were busy
+            - ``workers``: worker -> 'num_jobs', 'busy_time', 'busy_fraction'
+              and 'idle_fraction'
+            - ``queue_wait``: 'mean', 'median', 'max' and 'total' seconds
+              between submission and start
+            - ``rung_tail_idle_time``: idle worker time at the end of the
+              rungs, and ``rung_tail_idle_fraction``, its share of all idle
+              time
+            - ``schedule``: the :func:`scripts.packing.schedule_report`
+    """
+    runs = assign_workers([dict(r) for r in runs])
+    start = min(r['submitted'] for r in runs)
+    end = max(r['finished'] for r in runs)
+    makespan = end - start
+
+    workers = {}
+    for r in runs:
+        stats = workers.setdefault(r['worker'], {'num_jobs': 0,
+                                                 'busy_time': 0.})
+        stats['num_jobs'] += 1
+        stats['busy_time'] += r['finished'] - r['started']
+    for stats in workers.values():
+        stats['busy_fraction'] = (stats['busy_time'] / makespan
+                                  if makespan > 0 else 1.)
+        stats['idle_fraction'] = 1. - stats['busy_fraction']
+
+    num_workers = max(num_workers or 0, len(workers))
+    intervals = [(r['started'], r['finished']) for r in runs]
+    idle = idle_time(intervals, start, end, num_workers)
+    capacity = num_workers * makespan
+
+    schedule = schedule_report(runs, num_workers)
+    tail_idle = sum(idle_time(intervals, s, e, num_workers)
+                    for s, e in rung_tails(runs))
+
+    waits = np.array([r['started'] - r['submitted'] for r in runs])
+    return {'start': 0., 'end': makespan, 'makespan': makespan,
+            'num_workers': num_workers,
+            'busy_fraction': 1. - idle / capacity if capacity > 0 else 1.,
+            'idle_fraction': idle / capacity if capacity > 0 else 0.,
+            'saturated_fraction': (saturated_time(intervals, start, end,
+                                                  num_workers) / makespan
+                                   if makespan > 0 else 1.),
+            'workers': workers,
+            'queue_wait': {'mean': float(waits.mean()),
+                           'median': float(np.median(waits)),
+                           'max': float(waits.max()),
+                           'total': float(waits.sum())},
+            'rung_tail_idle_time': tail_idle,
+            'rung_tail_idle_fraction': tail_idle / idle if idle > 0 else 0.,
+            'schedule': schedule}
+
+
+def analyze_directories(directories, num_workers=None):
+    """
+    :func:`analyze_runs` for every run directory, plus the totals over all.
+
+    Returns:
+        dict - directory -> analysis, and 'total' with the summed
+            'makespan', busy and idle worker time, 'busy_fraction' and
+            'rung_tail_idle_fraction'
+    """
+    report = {}
+    busy, idle, tail_idle, makespan = 0., 0., 0., 0.
+    for directory in directories:
+        analysis = analyze_runs(load_runs(directory), num_workers)
+        report[str(directory)] = analysis
+        capacity = analysis['num_workers'] * analysis['makespan']
+        busy += analysis['busy_fraction'] * capacity
+        idle += analysis['idle_fraction'] * capacity
+        tail_idle += analysis['rung_tail_idle_time']
+        makespan += analysis['makespan']
+    report['total'] = {
+        'makespan': makespan, 'busy_time': busy, 'idle_time': idle,
+        'busy_fraction': busy / (busy + idle) if busy + idle > 0 else 1.,
+        'rung_tail_idle_fraction': tail_idle / idle if idle > 0 else 0.}
+    return report
+
+
+def plot_gantt(runs, filename=None, title=None):
+    """
+    Gantt chart of the jobs of a run, one row per worker and one color per
+    budget.
+
+    Args:
+        runs (list of dict): jobs as returned by :func:`load_runs`.
+        filename (str, optional): file the chart is saved to. It is shown
+            if None.
+        title (str, optional): title of the chart.
+    """
+    import matplotlib
+    if filename is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    runs = assign_workers([dict(r) for r in runs])
+    start = min(r['submitted'] for r in runs)
+    workers = sorted(set(r['worker'] for r in runs), key=str)
+    budgets = sorted(set(r['budget'] for r in runs))
+    colors = plt.cm.viridis(np.linspace(0, 0.9, len(budgets)))
+
+    fig, ax = plt.subplots(figsize=(12, 1 + 0.4 * len(workers)))
+    for budget, color in zip(budgets, colors):
+        for i, worker in enumerate(workers):
+            bars = [(r['started'] - start, r['finished'] - r['started'])
+                    for r in runs
+                    if r['worker'] == worker and r['budget'] == budget]
+            if bars:
+                ax.broken_barh(bars, (i - 0.4, 0.8), facecolors=color,
+                               edgecolor='white', linewidth=0.5)
+        ax.plot([], [], color=color, linewidth=8, label='budget %g' % budget)
+
+    ax.set_yticks(range(len(workers)))
+    ax.set_yticklabels([str(w) for w in workers])
+    ax.set_xlabel('time since the first submission [s]')
+    ax.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    if title is not None:
+        ax.set_title(title)
+    fig.tight_layout()
+
+    if filename is None:
+        plt.show()
+    else:
+        fig.savefig(filename)
+        plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Worker utilization of '
+                                                 'HpBandSter runs')
+    parser.add_argument('directories', help='Run directories with '
+                                            'results.json and configs.json',
+                        type=str, nargs='+')
+    parser.add_argument('--num_workers', help='Number of allocated workers. '
+                                              'Defaults to the workers that '
+                                              'ran jobs',
+                        type=int, default=None)
+    parser.add_argument('--output', help='Json file for the full report',
+                        type=str, default=None)
+    parser.add_argument('--gantt', help='Directory for a Gantt chart per run',
+                        type=str, default=None)
+    args = parser.parse_args()
+
+    report = analyze_directories(args.directories, args.num_workers)
+    print('{:30s} {:>8s} {:>10s} {:>7s} {:>10s} {:>9s}'.format(
+        'run', 'workers', 'makespan', 'busy', 'saturated', 'tail idle'))
+    for directory in args.directories:
+        analysis = report[str(directory)]
+        print('{:30s} {:8d} {:9.0f}s {:7.1%} {:10.1%} {:9.1%}'.format(
+            str(directory)[-30:], analysis['num_workers'],
+            analysis['makespan'], analysis['busy_fraction'],
+            analysis['saturated_fraction'],
+            analysis['rung_tail_idle_fraction']))
+    total = report['total']
+    print('{:30s} {:8s} {:9.0f}s {:7.1%} {:10s} {:9.1%}'.format(
+        'total', '', total['makespan'], total['busy_fraction'], '',
+        total['rung_tail_idle_fraction']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    if args.gantt is not None:
+        os.makedirs(args.gantt, exist_ok=True)
+        for directory in args.directories:
+            name = os.path.basename(os.path.normpath(directory))
+            plot_gantt(load_runs(directory),
+                       os.path.join(args.gantt, '%s.png' % name), title=name)
+        print('Gantt charts are stored to {}'.format(args.gantt))